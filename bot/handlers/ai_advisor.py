@@ -1,6 +1,9 @@
-from datetime import datetime
+import time
+import asyncio
+from contextlib import aclosing
 
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
@@ -8,14 +11,50 @@ from loguru import logger
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config import settings
 from bot.keyboards.main import get_cancel_keyboard, get_main_menu
 from bot.states.call_states import AIInsightStates
-from models.database import Manager, CallSession
-from services.ai_advisor import generate_ai_notification
-from services.datanewton_api import datanewton_api
+from models.database import Manager
+from services.ai_advisor import collect_hint_inputs, generate_ai_notification, stream_ai_notification
+from services.reminders import telegram_limiter
 
 router = Router()
 
+STREAM_CURSOR = " ▌"
+
+
+async def _edit_hint(message: Message, text: str, final: bool) -> bool:
+    """Правка сообщения с подсказкой через общий лимит бота. False — Telegram попросил подождать."""
+    await telegram_limiter.acquire()
+    try:
+        await message.edit_text(text if final else text + STREAM_CURSOR)
+    except TelegramRetryAfter as e:
+        if not final:
+            return False
+        await asyncio.sleep(e.retry_after)
+        await message.edit_text(text)
+    except TelegramBadRequest as e:
+        # "message is not modified" — текст не изменился, это не ошибка
+        if "not modified" not in str(e):
+            raise
+    return True
+
+
+async def _deliver_streaming(message: Message, inputs: dict) -> None:
+    """Показывать подсказку по мере генерации: правка не чаще раза в ai_hint_stream_edit_interval секунд."""
+    text = shown = ""
+    next_edit = time.monotonic() + settings.ai_hint_stream_first_edit_delay
+    async with aclosing(stream_ai_notification(**inputs)) as stream:
+        async for text in stream:
+            now = time.monotonic()
+            if now >= next_edit and text.strip() and text != shown:
+                if await _edit_hint(message, text, final=False):
+                    shown = text
+                    next_edit = now + settings.ai_hint_stream_edit_interval
+                else:
+                    next_edit = now + max(settings.ai_hint_stream_edit_interval, 5.0)
+    await _edit_hint(message, text, final=True)
+
 
 @router.message(Command("ai_hint"))
 async def ai_hint_start(message: Message, state: FSMContext, session: AsyncSession):
@@ -58,15 +97,7 @@ async def ai_hint_process_inn(message: Message, state: FSMContext, session: Asyn
     manager_id = data.get("manager_id")
 
     try:
-        result = await session.execute(
-            select(CallSession)
-            .where(
-                CallSession.manager_id == manager_id,
-                CallSession.company_inn == inn,
-            )
-            .order_by(CallSession.created_at.asc())
-        )
-        sessions = result.scalars().all()
+        inputs = await collect_hint_inputs(session, manager_id, inn)
     except Exception as e:
         logger.error(f"[ai_hint] DB error while loading sessions: {e}")
         await message.answer(
@@ -76,7 +107,7 @@ async def ai_hint_process_inn(message: Message, state: FSMContext, session: Asyn
         await state.clear()
         return
 
-    if not sessions:
+    if inputs is None:
         await message.answer(
             "ℹ️ По этому ИНН пока нет истории звонков.\n"
             "Сначала создайте хотя бы один звонок через 'Новый звонок' или 'Повторный звонок'.",
@@ -85,78 +116,14 @@ async def ai_hint_process_inn(message: Message, state: FSMContext, session: Asyn
         await state.clear()
         return
 
-    last_call = sessions[-1]
-    all_comments = [s.comment for s in sessions if s.comment]
-    last_comment = last_call.comment or "Комментарий отсутствует"
-    last_call_date = last_call.created_at
-    company_name = last_call.company_name or "Не указано"
-
-    # Пытаемся получить дополнительные данные по компании (ОКВЭД, регион, финансы, арбитражи)
-    okved_code = None
-    okved_name = None
-    region = None
-    revenue = None
-    revenue_previous = None
-    net_profit = None
-    capital = None
-    assets = None
-    debit = None
-    credit = None
-    gov_contracts = None
-    arbitration_open_count = None
-    arbitration_open_sum = None
-    arbitration_last_doc_date = None
-    try:
-        company_data = await datanewton_api.get_full_company_data(inn)
-        if company_data:
-            okved_code = company_data.get("okved")
-            okved_name = company_data.get("okved_name")
-            region = company_data.get("region")
-            revenue = company_data.get("revenue")
-            revenue_previous = company_data.get("revenue_previous")
-            net_profit = company_data.get("net_profit")
-            capital = company_data.get("capital")
-            assets = company_data.get("assets")
-            debit = company_data.get("debit")
-            credit = company_data.get("credit")
-            gov_contracts = company_data.get("gov_contracts")
-            arbitration_open_count = company_data.get("arbitration_open_count")
-            arbitration_open_sum = company_data.get("arbitration_open_sum")
-            arbitration_last_doc_date = company_data.get("arbitration_last_doc_date")
-            if company_data.get("name"):
-                company_name = company_data["name"]
-    except Exception as e:
-        logger.warning(f"[ai_hint] DataNewton lookup failed: {e}")
-
-    # В качестве планируемой даты звонка берём next_call_date, если есть, иначе сегодня
-    planned_call_date: datetime | None = last_call.next_call_date or datetime.now()
-
+    # Подсказки на сегодня обычно подготовлены заранее (services/hint_prewarm.py) и отдаются из кэша
     waiting_msg = await message.answer("🧠 Генерирую инфоповоды для звонка, подождите пару секунд...")
 
-    text = await generate_ai_notification(
-        inn=inn,
-        company_name=company_name,
-        last_comment=last_comment,
-        last_call_date=last_call_date,
-        all_comments=all_comments,
-        okved_code=okved_code,
-        okved_name=okved_name,
-        region=region,
-        revenue=revenue,
-        revenue_previous=revenue_previous,
-        net_profit=net_profit,
-        capital=capital,
-        assets=assets,
-        debit=debit,
-        credit=credit,
-        gov_contracts=gov_contracts,
-        arbitration_open_count=arbitration_open_count,
-        arbitration_open_sum=arbitration_open_sum,
-        arbitration_last_doc_date=arbitration_last_doc_date,
-        planned_call_date=planned_call_date,
-    )
-
-    await waiting_msg.edit_text(text)
+    if settings.ai_hint_streaming:
+        await _deliver_streaming(waiting_msg, inputs)
+    else:
+        text = await generate_ai_notification(**inputs)
+        await waiting_msg.edit_text(text)
     await state.clear()
 
 
@@ -1,7 +1,7 @@
-import csv
-import io
+import time
+import asyncio
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator
 
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InlineKeyboardButton, InlineKeyboardMarkup
@@ -12,8 +12,13 @@ from loguru import logger
 
 from bot.states.call_states import AdminStates
 from bot.keyboards.main import get_cancel_keyboard, get_admin_menu
+from config import settings
 from models.database import Manager
+from services.csv_stream import iter_csv_rows, iter_chunks
+from services.datanewton_api import datanewton_api
 from services.google_sheets import get_google_sheets_service
+from services.supervisor_queue import supervisor_queue
+from services.sheet_sync import sync_manager_sheet
 
 router = Router()
 
@@ -38,6 +43,186 @@ def _format_imported_comments(row):
     return "\n---\n".join(comments) if comments else ""
 
 
+def _row_to_call_data(row: List[str]) -> Dict[str, Any]:
+    """Строка CSV -> данные звонка (формат add_new_call / сводной таблицы)."""
+    return {
+        'company_name': row[0].strip(),
+        'inn': row[1].strip(),
+        'contact_name': row[2].strip() if len(row) > 2 else '',
+        'phone': row[3].strip() if len(row) > 3 else '',
+        'first_call_date': row[4].strip() if len(row) > 4 else datetime.now().strftime('%d.%m.%y'),
+        'next_call_date': row[5].strip() if len(row) > 5 else '',
+        'comment': _format_imported_comments(row),
+        'revenue': row[9].strip() if len(row) > 9 else '',
+        'revenue_previous': row[10].strip() if len(row) > 10 else '',
+        'capital': row[11].strip() if len(row) > 11 else '',
+        'assets': row[12].strip() if len(row) > 12 else '',
+        'debit': row[13].strip() if len(row) > 13 else '',
+        'credit': row[14].strip() if len(row) > 14 else '',
+        'region': row[15].strip() if len(row) > 15 else '',
+        'okved': row[16].strip() if len(row) > 16 else '',
+        'okved_main': row[17].strip() if len(row) > 17 else '',
+        'gov_contracts': row[18].strip() if len(row) > 18 else '',
+        'arbitration': row[19].strip() if len(row) > 19 else '',
+        'bankruptcy': row[20].strip() if len(row) > 20 else '',
+        'email': row[22].strip() if len(row) > 22 else '',
+    }
+
+
+def _validate_row(row: List[str]) -> Optional[str]:
+    """Причина, по которой строку нельзя импортировать, или None."""
+    # Минимум 7 колонок
+    if len(row) < 7:
+        return "меньше 7 колонок"
+    inn = row[1].strip()
+    if not (inn.isdigit() and len(inn) in (10, 12)):
+        return f"некорректный ИНН '{inn}'"
+    return None
+
+
+async def _document_chunks(bot, file_path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Содержимое файла Telegram кусками, без загрузки целиком в память."""
+    if bot.session.api.is_local:
+        # Локальный Bot API сервер: файл уже лежит на диске
+        with open(bot.session.api.wrap_local_file.to_local(file_path), 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+        return
+    url = bot.session.api.file_url(bot.token, file_path)
+    async for chunk in bot.session.stream_content(url=url, chunk_size=chunk_size, raise_for_status=True):
+        yield chunk
+
+
+async def _write_chunk(google_sheets_service, sheet_id: str, manager_name: str, calls: List[Dict[str, Any]]) -> int:
+    """Пакетная запись: один append в лист менеджера + одна пачка в сводную таблицу. Возвращает число строк."""
+    if not calls:
+        return 0
+    try:
+        written = await google_sheets_service.add_new_calls(sheet_id, calls)
+    except Exception as e:
+        logger.error(f"Error writing CSV chunk of {len(calls)} rows: {e}")
+        return 0
+    call_date = google_sheets_service.now_str()
+    try:
+        await google_sheets_service.apply_supervisor_updates([
+            {'manager_name': manager_name, 'call_data': call_data, 'call_date': call_date}
+            for call_data in calls
+        ])
+    except Exception as e:
+        # Сводная таблица догонит через очередь write-behind
+        logger.warning(f"Supervisor bulk update failed, falling back to queue: {e}")
+        # Та же call_date: повтор узнает уже записанную часть пачки и не задублирует её
+        for call_data in calls:
+            await supervisor_queue.enqueue(manager_name, call_data, call_date=call_date)
+    return written
+
+
+# Поле строки импорта <- поле get_full_company_data (заполняются только пустые ячейки CSV)
+ENRICH_FIELDS = {
+    'company_name': 'name',
+    'revenue': 'revenue',
+    'revenue_previous': 'revenue_previous',
+    'net_profit': 'net_profit',
+    'capital': 'capital',
+    'assets': 'assets',
+    'debit': 'debit',
+    'credit': 'credit',
+    'region': 'region',
+    'okved': 'okved',
+    'okved_main': 'okved',
+    'gov_contracts': 'gov_contracts',
+    'okpd_name': 'okpd_name',
+    'email': 'email',
+}
+# Без этих данных строка считается неполной и уходит на обогащение
+ENRICH_REQUIRED = ('revenue', 'okved_main', 'gov_contracts')
+
+
+def new_enrich_stats() -> Dict[str, Any]:
+    return {"requested": 0, "ok": 0, "cached": 0, "not_found": 0, "failed": 0, "seconds": 0.0}
+
+
+async def _enrich_calls(calls: List[Dict[str, Any]], concurrency: int, stats: Dict[str, Any]) -> None:
+    """Дополнить строки без финансов/ОКВЭД/госконтрактов данными DataNewton (на месте).
+
+    Запросы идут пулом из concurrency воркеров; частоту ограничивает лимитер DataNewtonAPI.
+    ИНН, чьи реквизиты уже в кэше, отдаются без обращения к API и считаются отдельно.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for call_data in calls:
+        if any(not call_data.get(field) for field in ENRICH_REQUIRED):
+            queue.put_nowait(call_data)
+    if queue.empty():
+        return
+    stats["requested"] += queue.qsize()
+
+    async def worker():
+        while True:
+            try:
+                call_data = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            inn = call_data['inn']
+            if datanewton_api.is_cached(inn):
+                stats["cached"] += 1
+            try:
+                data = await datanewton_api.get_full_company_data(inn)
+            except Exception as e:
+                logger.warning(f"CSV import: DataNewton failed for INN {inn}: {e}")
+                stats["failed"] += 1
+                continue
+            if not data:
+                stats["not_found"] += 1
+                continue
+            for target, source in ENRICH_FIELDS.items():
+                if not call_data.get(target) and data.get(source) not in (None, ''):
+                    call_data[target] = data[source]
+            stats["ok"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    stats["seconds"] += time.perf_counter() - started
+
+
+def _enrich_report(stats: Dict[str, Any]) -> str:
+    rate = f"{stats['requested'] / stats['seconds']:.1f}/с" if stats["seconds"] else "—"
+    return (
+        f"Обогащение DataNewton: {stats['ok']} из {stats['requested']} за {stats['seconds']:.1f} с ({rate}), "
+        f"из кэша: {stats['cached']}, не найдено: {stats['not_found']}, ошибок: {stats['failed']}\n"
+    )
+
+
+def _csv_file_keyboard(enrich: bool) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text=f"🔎 Дополнить из DataNewton: {'вкл' if enrich else 'выкл'}",
+            callback_data="csv_enrich_toggle"
+        )],
+        [InlineKeyboardButton(text="🔙 Отмена", callback_data="cancel")],
+    ])
+
+
+class ImportProgress:
+    """Прогресс импорта в одном сообщении Telegram (правки не чаще раза в interval секунд)."""
+
+    def __init__(self, message: Message, interval: float = 2.0):
+        self.message = message
+        self.interval = interval
+        self._last_edit = 0.0
+        self._last_text = ""
+
+    async def update(self, text: str, force: bool = False) -> None:
+        now = time.monotonic()
+        if text == self._last_text or (not force and now - self._last_edit < self.interval):
+            return
+        try:
+            await self.message.edit_text(text)
+            self._last_edit = now
+            self._last_text = text
+        except Exception as e:
+            logger.debug(f"CSV import progress not updated: {e}")
+
+
 @router.callback_query(F.data == "import_csv")
 async def start_csv_import(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Начать процесс импорта CSV"""
@@ -94,7 +279,8 @@ async def select_csv_manager(callback: CallbackQuery, state: FSMContext, session
     await state.update_data(
         csv_manager_id=manager.id,
         csv_manager_name=manager.full_name,
-        csv_manager_sheet_id=manager.google_sheet_id
+        csv_manager_sheet_id=manager.google_sheet_id,
+        csv_enrich=settings.csv_import_enrich_default
     )
     await state.set_state(AdminStates.waiting_for_csv_file)
     
@@ -108,13 +294,23 @@ async def select_csv_manager(callback: CallbackQuery, state: FSMContext, session
         "5. Дата первого звонка (ДД.ММ.ГГГГ)\n"
         "6. Дата звонка будущая (ДД.ММ.ГГГГ)\n"
         "7. Комментарий 1\n\n"
-        "📝 Формат: UTF-8, разделитель - запятая или точка с запятой",
+        "📝 Формат: UTF-8 или Windows-1251, разделитель - запятая или точка с запятой\n"
+        "🔎 Строки без финансов, ОКВЭД и госконтрактов можно дополнить из DataNewton",
         parse_mode="Markdown",
-        reply_markup=get_cancel_keyboard()
+        reply_markup=_csv_file_keyboard(settings.csv_import_enrich_default)
     )
     await callback.answer()
 
 
+@router.callback_query(AdminStates.waiting_for_csv_file, F.data == "csv_enrich_toggle")
+async def toggle_csv_enrich(callback: CallbackQuery, state: FSMContext):
+    """Включить/выключить обогащение строк данными DataNewton при импорте"""
+    enrich = not (await state.get_data()).get('csv_enrich', False)
+    await state.update_data(csv_enrich=enrich)
+    await callback.message.edit_reply_markup(reply_markup=_csv_file_keyboard(enrich))
+    await callback.answer("Обогащение включено" if enrich else "Обогащение выключено")
+
+
 @router.message(AdminStates.waiting_for_csv_file, F.document)
 async def process_csv_file(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка CSV файла"""
@@ -128,96 +324,87 @@ async def process_csv_file(message: Message, state: FSMContext, session: AsyncSe
         )
         return
     
-    await message.answer("⏳ Обрабатываю файл...")
+    # Получаем данные из состояния
+    state_data = await state.get_data()
+    manager_name = state_data['csv_manager_name']
+    sheet_id = state_data['csv_manager_sheet_id']
+    enrich = state_data.get('csv_enrich', False)
+    
+    # Проверяем наличие таблицы у менеджера
+    if not sheet_id:
+        await message.answer(
+            "❌ У менеджера нет привязанной таблицы Google Sheets",
+            reply_markup=get_admin_menu()
+        )
+        await state.clear()
+        return
+    
+    progress = ImportProgress(await message.answer("⏳ Обрабатываю файл..."))
     
     try:
-        # Скачиваем файл
+        google_sheets_service = get_google_sheets_service()
         file_info = await message.bot.get_file(document.file_id)
-        file_content = await message.bot.download_file(file_info.file_path)
-        
-        # Читаем содержимое как текст
-        content = file_content.read().decode('utf-8-sig')  # utf-8-sig убирает BOM
         
-        # Определяем разделитель
-        delimiter = ';' if ';' in content.split('\n')[0] else ','
+        # Файл читается потоково: скачивание, декодирование и разбор идут кусками,
+        # в таблицы уходят пачки по csv_import_chunk_rows строк
+        parse_stats: Dict[str, Any] = {}
+        rows = iter_csv_rows(_document_chunks(message.bot, file_info.file_path), parse_stats)
+        seen_inns = set(await google_sheets_service.existing_inns(sheet_id))
+        total_bytes = document.file_size or 0
         
-        # Парсим CSV
-        csv_reader = csv.reader(io.StringIO(content), delimiter=delimiter)
-        rows = list(csv_reader)
-        
-        if len(rows) < 2:  # Минимум заголовок + 1 строка данных
-            await message.answer(
-                "❌ Файл пустой или содержит только заголовки",
-                reply_markup=get_admin_menu()
+        row_count = 0
+        success_count = 0
+        error_count = 0
+        duplicate_count = 0
+        enrich_stats = new_enrich_stats()
+        async for batch in iter_chunks(rows, max(1, settings.csv_import_chunk_rows)):
+            calls: List[Dict[str, Any]] = []
+            for row in batch:
+                row_count += 1
+                # Первая строка — заголовок, если похожа на него (как минимум 7 колонок)
+                if row_count == 1 and len(row) >= 7:
+                    continue
+                if not any(cell.strip() for cell in row):
+                    continue
+                reason = _validate_row(row)
+                if reason:
+                    logger.warning(f"Row {row_count} skipped: {reason}: {row}")
+                    error_count += 1
+                    continue
+                call_data = _row_to_call_data(row)
+                # Дубликаты: уже есть в листе менеджера или повторяются в самом файле
+                if call_data['inn'] in seen_inns:
+                    duplicate_count += 1
+                    continue
+                seen_inns.add(call_data['inn'])
+                calls.append(call_data)
+            
+            if enrich and calls:
+                # Между разбором и записью: строки уходят в таблицу уже полными, одной пачкой
+                await progress.update(f"🔎 Дополняю данные из DataNewton: {len(calls)} строк (обработано {row_count})...")
+                await _enrich_calls(calls, settings.csv_import_enrich_concurrency, enrich_stats)
+            written = await _write_chunk(google_sheets_service, sheet_id, manager_name, calls)
+            success_count += written
+            error_count += len(calls) - written
+            percent = f" ({min(100, parse_stats['bytes_read'] * 100 // total_bytes)}%)" if total_bytes else ""
+            await progress.update(
+                f"⏳ Обработано строк: {row_count}{percent}\n"
+                f"Записано: {success_count}, дубликатов: {duplicate_count}, ошибок: {error_count}"
             )
-            await state.clear()
-            return
-        
-        # Пропускаем заголовок и обрабатываем данные
-        data_rows = rows[1:] if len(rows[0]) >= 7 else rows  # Если первая строка похожа на заголовок
-        
-        # Получаем данные из состояния
-        state_data = await state.get_data()
-        manager_name = state_data['csv_manager_name']
-        sheet_id = state_data['csv_manager_sheet_id']
         
-        # Проверяем наличие таблицы у менеджера
-        if not sheet_id:
+        if success_count + duplicate_count + error_count == 0:
+            await progress.update("❌ Файл пустой или содержит только заголовки", force=True)
             await message.answer(
-                "❌ У менеджера нет привязанной таблицы Google Sheets",
+                "❌ Файл пустой или содержит только заголовки",
                 reply_markup=get_admin_menu()
             )
             await state.clear()
             return
-        
-        # Обрабатываем строки
-        google_sheets_service = get_google_sheets_service()
-        success_count = 0
-        error_count = 0
-        
-        for i, row in enumerate(data_rows, 1):
-            try:
-                # Минимум 7 колонок
-                if len(row) < 7:
-                    logger.warning(f"Row {i} has less than 7 columns: {row}")
-                    error_count += 1
-                    continue
-                
-                # Подготавливаем данные
-                call_data = {
-                    'company_name': row[0].strip(),
-                    'inn': row[1].strip(),
-                    'contact_name': row[2].strip() if len(row) > 2 else '',
-                    'phone': row[3].strip() if len(row) > 3 else '',
-                    'first_call_date': row[4].strip() if len(row) > 4 else datetime.now().strftime('%d.%m.%y'),
-                    'next_call_date': row[5].strip() if len(row) > 5 else '',
-                    'comment': _format_imported_comments(row),
-                    'revenue': row[9].strip() if len(row) > 9 else '',
-                    'revenue_previous': row[10].strip() if len(row) > 10 else '',
-                    'capital': row[11].strip() if len(row) > 11 else '',
-                    'assets': row[12].strip() if len(row) > 12 else '',
-                    'debit': row[13].strip() if len(row) > 13 else '',
-                    'credit': row[14].strip() if len(row) > 14 else '',
-                    'region': row[15].strip() if len(row) > 15 else '',
-                    'okved': row[16].strip() if len(row) > 16 else '',
-                    'okved_main': row[17].strip() if len(row) > 17 else '',
-                    'gov_contracts': row[18].strip() if len(row) > 18 else '',
-                    'arbitration': row[19].strip() if len(row) > 19 else '',
-                    'bankruptcy': row[20].strip() if len(row) > 20 else '',
-                    'email': row[22].strip() if len(row) > 22 else '',
-                }
-                
-                # Добавляем в таблицу менеджера
-                await google_sheets_service.add_new_call(sheet_id, call_data)
-                
-                # Добавляем в сводную таблицу
-                await google_sheets_service.update_supervisor_sheet(manager_name, call_data)
-                
-                success_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error processing row {i}: {e}")
-                error_count += 1
+        logger.info(
+            f"CSV import for {manager_name}: {row_count} rows, {parse_stats.get('bytes_read', 0)} bytes, "
+            f"encoding={parse_stats.get('encoding')} delimiter={parse_stats.get('delimiter')!r}"
+        )
+        await progress.update(f"✅ Обработано строк: {row_count}, записано: {success_count}", force=True)
         
         # Отправляем результат
         result_message = (
@@ -226,8 +413,13 @@ async def process_csv_file(message: Message, state: FSMContext, session: AsyncSe
             f"Успешно импортировано: {success_count} записей\n"
         )
         
+        if duplicate_count > 0:
+            result_message += f"Пропущено дубликатов ИНН: {duplicate_count}\n"
         if error_count > 0:
             result_message += f"Ошибок: {error_count} записей\n"
+        if enrich:
+            result_message += _enrich_report(enrich_stats)
+            logger.info(f"CSV import enrichment: {enrich_stats}, DataNewton: {datanewton_api.cache_stats()}")
         
         result_message += f"\n[Открыть таблицу менеджера](https://docs.google.com/spreadsheets/d/{sheet_id})"
         
@@ -238,6 +430,13 @@ async def process_csv_file(message: Message, state: FSMContext, session: AsyncSe
             disable_web_page_preview=True
         )
         
+        # Новые компании сразу попадают в зеркало листа и план звонков менеджера
+        if success_count and state_data.get('csv_manager_id'):
+            try:
+                await sync_manager_sheet(state_data['csv_manager_id'], sheet_id, force=True)
+            except Exception as e:
+                logger.warning(f"Sheet sync after CSV import failed: {e}")
+        
     except Exception as e:
         logger.error(f"Error processing CSV: {e}")
         await message.answer(
@@ -14,8 +14,10 @@ from bot.keyboards.main import (
 )
 from bot.states.call_states import NewCallStates
 from models.database import Manager, CallSession
+from models.agenda import upsert_agenda, history_comment
 from services.datanewton_api import datanewton_api
 from services.google_sheets import get_google_sheets_service
+from services.supervisor_queue import supervisor_queue
 
 router = Router()
 
@@ -230,6 +232,17 @@ async def save_new_call(message: Message, state: FSMContext, session: AsyncSessi
     )
     
     session.add(call_session)
+    # План звонков в БД (для "Звонки на сегодня" и утренней рассылки)
+    await upsert_agenda(
+        session,
+        data['manager_id'],
+        data['inn'],
+        data.get('next_call_date'),
+        comment=history_comment(data['comment']),
+        company_name=data.get('company_data', {}).get('name', 'Не указано'),
+        contact_name=data['contact_name'],
+        phone=data.get('phone', ''),
+    )
     await session.commit()
     
     # Подготавливаем данные для Google Sheets
@@ -269,7 +282,7 @@ async def save_new_call(message: Message, state: FSMContext, session: AsyncSessi
         
         if success:
             # Обновляем сводную таблицу руководителя
-            await google_sheets_service.update_supervisor_sheet(
+            await supervisor_queue.enqueue(
                 data['manager_name'], 
                 sheet_data
             )
@@ -14,9 +14,13 @@ from bot.keyboards.main import (
 )
 from bot.states.call_states import RepeatCallStates
 from models.database import Manager, CallSession
+from models.call_history import get_last_call
+from models.agenda import upsert_agenda, history_comment
+from models.sheet_mirror import get_mirror_row, latest_history_entry, row_to_call
 from services.google_sheets import get_google_sheets_service
+from services.supervisor_queue import supervisor_queue
 from services.datanewton_api import datanewton_api
-from services.ai_advisor import generate_ai_notification
+from services.ai_advisor import collect_hint_inputs, generate_ai_notification
 from config import settings
 
 router = Router()
@@ -76,13 +80,10 @@ async def process_repeat_inn(message: Message, state: FSMContext, session: Async
         data = await state.get_data()
         manager_id = data['manager_id']
         logger.info(f"[repeat_call] searching existing call manager_id={manager_id} inn={inn}")
-        result = await session.execute(
-            select(CallSession).where(
-                CallSession.manager_id == manager_id,
-                CallSession.company_inn == inn
-            ).order_by(CallSession.created_at.desc())
-        )
-        existing_call = result.scalars().first()
+        existing_call = await get_last_call(session, manager_id, inn)
+        mirror_row = None
+        if existing_call is None and data.get('manager_sheet_id'):
+            mirror_row = await get_mirror_row(session, data['manager_sheet_id'], inn)
     except Exception as e:
         logger.error(f"[repeat_call] DB error while searching existing call: {e}")
         await message.answer(
@@ -111,6 +112,25 @@ async def process_repeat_inn(message: Message, state: FSMContext, session: Async
             parse_mode="Markdown",
             reply_markup=get_cancel_keyboard()
         )
+    elif mirror_row is not None:
+        # Компании нет в истории бота (импорт CSV или ручная правка листа) — берём данные из зеркала листа
+        company = row_to_call(mirror_row)
+        logger.info(f"[repeat_call] found company '{company['company_name']}' in sheet mirror for inn={inn}")
+        # Текст из листа как есть: без Markdown (символы * _ [ в ячейках) и только последняя запись истории
+        await message.answer(
+            f"✅ Найдена компания в вашей таблице:\n\n"
+            f"{company['company_name']}\n"
+            f"ИНН: {inn}\n"
+            f"Контакт: {company['contact_name']}\n"
+            f"Последний комментарий: {latest_history_entry(company['last_comment']) or 'нет'}\n\n"
+            f"💬 Введите комментарий по результатам повторного звонка:",
+            reply_markup=get_cancel_keyboard()
+        )
+        await state.update_data(
+            inn=inn,
+            company_name=company['company_name'] or "Не указано"
+        )
+        await state.set_state(RepeatCallStates.waiting_for_comment)
     else:
         logger.info(f"[repeat_call] no company found for inn={inn} manager_id={data.get('manager_id')}")
         # Разрешаем продолжить, даже если компания не найдена в локальной базе
@@ -189,6 +209,15 @@ async def save_repeat_call(message: Message, state: FSMContext, session: AsyncSe
     )
     
     session.add(call_session)
+    # План звонков в БД (для "Звонки на сегодня" и утренней рассылки)
+    await upsert_agenda(
+        session,
+        data['manager_id'],
+        data['inn'],
+        data.get('next_call_date'),
+        comment=history_comment(data['comment']),
+        company_name=data['company_name'],
+    )
     await session.commit()
     
     # Обновляем данные в Google Sheets
@@ -241,7 +270,7 @@ async def save_repeat_call(message: Message, state: FSMContext, session: AsyncSe
                 'comment': update_data['comment'],
                 'next_call_date': update_data['next_call_date']
             }
-            await google_sheets_service.update_supervisor_sheet(
+            await supervisor_queue.enqueue(
                 data['manager_name'],
                 supervisor_data
             )
@@ -263,41 +292,12 @@ async def save_repeat_call(message: Message, state: FSMContext, session: AsyncSe
         # 3) После успешного сохранения — AI-инфоповод (если есть ключ)
         if settings.openai_api_key:
             try:
-                # История звонков по этому ИНН для этого менеджера
-                hist_result = await session.execute(
-                    select(CallSession)
-                    .where(
-                        CallSession.manager_id == data['manager_id'],
-                        CallSession.company_inn == data['inn'],
-                    )
-                    .order_by(CallSession.created_at.asc())
-                )
-                history = hist_result.scalars().all()
-                all_comments = [s.comment for s in history if s.comment]
-                last_call_date = history[-1].created_at if history else call_session.created_at
-
-                ai_text = await generate_ai_notification(
-                    inn=data['inn'],
-                    company_name=data['company_name'],
-                    last_comment=data['comment'],
-                    last_call_date=last_call_date,
-                    all_comments=all_comments,
-                    okved_code=fresh.get('okved') if fresh else None,
-                    okved_name=fresh.get('okved_name') if fresh else None,
-                    region=fresh.get('region') if fresh else None,
-                    revenue=fresh.get('revenue') if fresh else None,
-                    revenue_previous=fresh.get('revenue_previous') if fresh else None,
-                    net_profit=fresh.get('net_profit') if fresh else None,
-                    capital=fresh.get('capital') if fresh else None,
-                    assets=fresh.get('assets') if fresh else None,
-                    debit=fresh.get('debit') if fresh else None,
-                    credit=fresh.get('credit') if fresh else None,
-                    gov_contracts=fresh.get('gov_contracts') if fresh else None,
-                    arbitration_open_count=fresh.get('arbitration_open_count') if fresh else None,
-                    arbitration_open_sum=fresh.get('arbitration_open_sum') if fresh else None,
-                    arbitration_last_doc_date=fresh.get('arbitration_last_doc_date') if fresh else None,
-                    planned_call_date=call_session.next_call_date or datetime.now(),
-                )
+                # Те же входы, что у /ai_hint: история в бюджете токенов (свежие дословно, старые — сводкой);
+                # данные DataNewton берутся из кэша, прогретого обновлением выше
+                inputs = await collect_hint_inputs(session, data['manager_id'], data['inn'])
+                if inputs is None:
+                    raise ValueError("call history is empty")
+                ai_text = await generate_ai_notification(**inputs)
                 await message.answer(ai_text)
             except Exception as e:
                 logger.warning(f"[repeat_call] AI notification failed: {e}")
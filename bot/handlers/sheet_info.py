@@ -6,7 +6,7 @@ from loguru import logger
 
 from bot.keyboards.main import get_main_menu
 from models.database import Manager
-from services.google_sheets import get_google_sheets_service
+from models.agenda import get_agenda_for_day, agenda_to_call
 
 router = Router()
 
@@ -63,9 +63,8 @@ async def show_today_calls(callback: CallbackQuery, session: AsyncSession):
     await callback.message.edit_text("🔄 Загружаю список звонков...")
     
     try:
-        # Получаем звонки на сегодня из таблицы
-        google_sheets_service = get_google_sheets_service()
-        today_calls = await google_sheets_service.get_today_calls(manager.google_sheet_id)
+        # Звонки на сегодня из плана в БД (синхронизируется с таблицей, см. services/sheet_sync.py)
+        today_calls = [agenda_to_call(item) for item in await get_agenda_for_day(session, manager.id)]
         
         if today_calls:
             message_text = "📅 *Звонки на сегодня:*\n\n"
@@ -0,0 +1,122 @@
+"""
+Режим webhook (BOT_MODE=webhook): aiohttp-приложение, принимающее обновления от Telegram.
+
+При WEBHOOK_WORKERS=N запускается N процессов, воркер i слушает WEBHOOK_PORT + i; перед ними
+ставится локальный reverse proxy, например nginx:
+
+    upstream crmbot { server 127.0.0.1:8080; server 127.0.0.1:8081; server 127.0.0.1:8082; }
+    location /webhook { proxy_pass http://crmbot; }
+
+Воркеры делят БД, FSM (FSM_STORAGE=sql или redis) и бэклог сводной таблицы. Воркер 0 основной:
+он регистрирует webhook в Telegram, запускает планировщик и выгрузку очереди.
+При остановке (SIGTERM) воркер перестаёт принимать обновления (503 — Telegram повторит доставку
+в другой воркер) и дожидается уже начатых не дольше WEBHOOK_DRAIN_TIMEOUT секунд.
+"""
+import signal
+import asyncio
+import multiprocessing
+from typing import Any, Callable, List
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from loguru import logger
+from config import settings
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler с корректной остановкой: дожидается обработки принятых обновлений."""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, drain_timeout: float, **kwargs: Any):
+        super().__init__(dispatcher, bot, **kwargs)
+        self.drain_timeout = drain_timeout
+        self.draining = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503, text="Shutting down")
+        return await super().handle(request)
+
+    def register(self, app: web.Application, /, path: str, **kwargs: Any) -> None:
+        """Маршрут и дренаж на остановке; сессию бота закрывает build_webhook_app после shutdown диспетчера."""
+        app.on_shutdown.append(self._handle_drain)
+        app.router.add_route("POST", path, self.handle, **kwargs)
+
+    async def _handle_drain(self, app: web.Application) -> None:
+        await self.drain()
+
+    async def drain(self) -> None:
+        self.draining = True
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            logger.info(f"Webhook: draining {len(tasks)} updates in progress")
+            _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+            if pending:
+                logger.warning(f"Webhook: {len(pending)} updates not finished in {self.drain_timeout}s, cancelling")
+                for task in pending:
+                    task.cancel()
+
+    async def close(self) -> None:
+        await self.drain()
+        await super().close()
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, **data: Any) -> web.Application:
+    """aiohttp-приложение: POST WEBHOOK_PATH (обновления) и GET /health (для proxy и оркестратора)."""
+    app = web.Application()
+    handler = DrainingRequestHandler(
+        dp,
+        bot,
+        drain_timeout=settings.webhook_drain_timeout,
+        secret_token=settings.webhook_secret or None,
+    )
+    # Порядок важен: на остановке сначала дренаж обновлений, затем shutdown диспетчера (FSM, очередь,
+    # уведомление админов) и только потом закрытие сессии бота
+    handler.register(app, path=settings.webhook_path)
+
+    async def health(request: web.Request) -> web.Response:
+        status = 503 if handler.draining else 200
+        return web.json_response({"in_flight": handler.in_flight, "draining": handler.draining}, status=status)
+
+    app.router.add_get("/health", health)
+    setup_application(app, dp, bot=bot, **data)
+
+    async def close_bot_session(app: web.Application) -> None:
+        await bot.session.close()
+
+    app.on_shutdown.append(close_bot_session)
+    return app
+
+
+def webhook_url() -> str:
+    if not settings.webhook_base_url:
+        raise ValueError("WEBHOOK_BASE_URL is required in webhook mode")
+    return settings.webhook_base_url.rstrip("/") + settings.webhook_path
+
+
+def run_workers(target: Callable[[int], None], workers: int) -> None:
+    """Запустить target(i) в workers процессах и ждать их; SIGTERM/SIGINT передаются воркерам."""
+    if workers <= 1:
+        target(0)
+        return
+    context = multiprocessing.get_context("spawn")
+    processes: List[multiprocessing.Process] = []
+    for index in range(workers):
+        process = context.Process(target=target, args=(index,), name=f"webhook-worker-{index}")
+        process.start()
+        processes.append(process)
+    logger.info(f"Webhook: started {workers} workers on ports {settings.webhook_port}..{settings.webhook_port + workers - 1}")
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()  # SIGTERM -> корректная остановка aiohttp в воркере
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+    logger.info("Webhook: all workers stopped")
@@ -12,16 +12,73 @@ class Settings(BaseSettings):
     google_sheets_credentials_file: str = "credentials.json"
     manager_sheet_template_id: str
     supervisor_sheet_id: str
+    google_sheets_max_workers: int = 8  # потоки для вызовов Sheets API вне event loop
+    google_sheets_index_ttl: int = 600  # секунды до перестроения индекса ИНН -> строка по колонке B
+    google_sheets_batch_get_ranges: int = 150  # диапазонов в одном batchGet (все идут в URL запроса)
+    # Очередь write-behind для сводной таблицы руководителя (бэклог в таблице supervisor_updates)
+    supervisor_write_behind: bool = True
+    supervisor_flush_interval: float = 5.0  # секунд между выгрузками
+    supervisor_flush_max_items: int = 50  # выгрузка раньше срока, если накопилось столько обновлений
+    supervisor_max_attempts: int = 10  # после стольких неудач запись откладывается (failed_at) и не блокирует очередь
+    supervisor_retry_max_delay: float = 300.0  # секунд: предел паузы между повторами после ошибок
+    # Импорт CSV: строк в одном append (и в одной пачке для сводной таблицы)
+    csv_import_chunk_rows: int = 1000
+    csv_import_enrich_default: bool = False  # дополнять строки из DataNewton (переключается в боте)
+    csv_import_enrich_concurrency: int = 8
     
     # DataNewton API
     datanewton_api_key: str
     datanewton_base_url: str = "https://api.datanewton.ru/v1"
+    # Пул HTTP-соединений к DataNewton (одна сессия на процесс)
+    datanewton_pool_limit: int = 20
+    datanewton_pool_limit_per_host: int = 10
+    datanewton_dns_cache_ttl: int = 300  # секунд
+    datanewton_keepalive_timeout: float = 60.0  # секунд
+    datanewton_request_timeout: float = 30.0  # секунд
+    # Параллельные запросы внутри get_full_company_data (False — строго последовательно)
+    datanewton_concurrent_fetch: bool = True
+    # Кэш ответов DataNewton в памяти процесса (LRU + срок жизни по блокам)
+    datanewton_cache_enabled: bool = True
+    datanewton_cache_max_entries: int = 5000
+    datanewton_cache_profile_ttl: int = 3 * 24 * 3600  # реквизиты, ОКВЭД, ОКПД
+    datanewton_cache_contracts_ttl: int = 24 * 3600  # статистика госконтрактов
+    datanewton_cache_arbitration_ttl: int = 6 * 3600  # арбитражные дела
+    datanewton_finance_refresh_month: int = 4  # финансы живут до 1-го числа этого месяца (новая годовая отчётность)
+    # Персистентный кэш сырых ответов в БД (таблица datanewton_responses)
+    datanewton_db_cache_enabled: bool = True
+    # Ограничение частоты запросов (token bucket) и повторы на 429/5xx
+    datanewton_rate_limit_rps: float = 5.0  # 0 — без ограничения
+    datanewton_rate_limit_burst: int = 10
+    datanewton_max_retries: int = 3
+    datanewton_retry_base_delay: float = 0.5  # секунд
+    datanewton_retry_max_delay: float = 30.0  # секунд
     
     # AI / LLM settings (Phase 2)
     # По умолчанию ориентируемся на OpenRouter (OpenAI-совместимый API)
     openai_api_key: str | None = None
     openai_base_url: str | None = None  # например: https://openrouter.ai/api/v1
     openai_model: str = "openai/gpt-4.1-mini"
+    openai_timeout: float = 60.0  # секунд на запрос
+    openai_max_retries: int = 2
+    openai_max_connections: int = 20  # пул HTTP-соединений общего клиента
+    # Кэш AI-инфоповодов (в памяти и в таблице ai_hints) по хэшу входных данных промпта
+    ai_hint_cache_ttl: int = 3 * 24 * 3600  # секунд
+    ai_hint_cache_max_entries: int = 2000
+    # История комментариев в промпте: последние дословно, старые — сводкой (таблица comment_summaries)
+    ai_prompt_recent_comments: int = 10
+    ai_prompt_history_budget_tokens: int = 1500  # на сводку и последние комментарии вместе
+    ai_summary_max_tokens: int = 300  # длина сводки старой истории
+    ai_summary_batch: int = 50  # комментариев за один запрос при дополнении сводки
+    # Отраслевые праздники для AI-инфоповодов: CSV month,day,title,okved (префиксы ОКВЭД через ';')
+    industry_holidays_file: str | None = "data/industry_holidays.csv"
+    # Прогрев подсказок по звонкам на сегодня перед первым напоминанием
+    ai_hint_prewarm_enabled: bool = True
+    ai_hint_prewarm_lead_minutes: int = 30  # за сколько минут до первого напоминания
+    ai_hint_prewarm_concurrency: int = 4  # одновременных запросов к модели
+    # /ai_hint показывает ответ по мере генерации, правя сообщение
+    ai_hint_streaming: bool = True
+    ai_hint_stream_first_edit_delay: float = 0.3  # секунд: копим первые слова, чтобы не править ради одного
+    ai_hint_stream_edit_interval: float = 1.0  # секунд между правками (Telegram: ~1 правка в секунду на чат)
     
     # Database
     database_url: str = "sqlite+aiosqlite:///./crmbot.db"
@@ -33,6 +90,32 @@ class Settings(BaseSettings):
     reminder_time: str = "09:00"  # fallback
     reminder_times: str = "10:00,15:00,17:00"  # comma separated HH:MM
     timezone: str = "Europe/Moscow"
+    reminder_concurrency: int = 10  # одновременных отправок в утренней рассылке
+    reminder_misfire_grace_time: int = 600  # секунд: опоздавший запуск рассылки ещё выполняется
+    # Общий лимит исходящих сообщений бота (Telegram допускает ~30 в секунду)
+    telegram_rate_limit_rps: float = 25.0  # 0 — без ограничения
+    telegram_rate_limit_burst: int = 25
+    # Синхронизация листов менеджеров в БД (зеркало sheet_rows + план звонков call_agenda)
+    sheet_sync_interval_minutes: int = 30
+    sheet_sync_concurrency: int = 4  # листов одновременно
+    
+    # Режим получения обновлений: polling или webhook (aiohttp, см. bot/webhook.py)
+    bot_mode: str = "polling"
+    webhook_base_url: str = ""  # публичный https-адрес, например https://crm-bot.up.railway.app
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""  # X-Telegram-Bot-Api-Secret-Token
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = int(os.getenv("PORT", "8080"))  # воркер i слушает webhook_port + i
+    webhook_workers: int = 1  # процессов за reverse proxy
+    webhook_drain_timeout: float = 25.0  # секунд на обработку принятых обновлений при остановке
+    webhook_max_connections: int = 40  # одновременных соединений от Telegram
+    
+    # Хранилище состояний диалогов (FSM): sql — таблица fsm_states, redis — Redis-совместимый сервер, memory
+    fsm_storage: str = "sql"
+    fsm_flush_interval: float = 0.5  # секунд: запись изменений FSM в БД пачкой (0 — сразу)
+    fsm_cache_size: int = 10000  # диалогов в кэше процесса
+    redis_url: str = "redis://localhost:6379/0"
+    fsm_ttl: int = 0  # секунд хранения состояния в Redis (0 — бессрочно)
     
     class Config:
         env_file = ".env"
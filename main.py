@@ -1,15 +1,28 @@
 import asyncio
 import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from loguru import logger
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
-from models.database import init_db, get_session, Manager
+from models.database import init_db, get_session
 from bot.handlers import start, new_call, repeat_call, admin, utils, sheet_info, csv_import, ai_advisor
-from services.google_sheets import get_google_sheets_service
+from services import google_sheets
+from services.datanewton_api import datanewton_api
+from services.ai_advisor import close_openai_client
+from services.holidays import load_industry_holidays
+from services.supervisor_queue import supervisor_queue
+from services.sheet_sync import sync_all_sheets
+from services.reminders import send_daily_reminders
+from services.hint_prewarm import prewarm_today_hints
+from services.fsm_storage import create_fsm_storage, create_event_isolation
+from bot.webhook import build_webhook_app, run_workers, webhook_url
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.combining import OrTrigger
 
 # Настройка логирования
 logger.remove()
@@ -17,14 +30,30 @@ logger.add(sys.stdout, level="INFO", format="{time} {level} {message}")
 logger.add("logs/bot.log", rotation="1 day", retention="7 days", level="DEBUG")
 
 
-async def on_startup(bot: Bot):
-    """Действия при запуске бота"""
+async def on_startup(bot: Bot, primary: bool = True):
+    """Действия при запуске бота.
+    primary=False — дополнительный воркер webhook: только обработка обновлений,
+    фоновые задачи и уведомления остаются основному процессу.
+    """
     logger.info("Bot starting...")
     
-    # Инициализация базы данных
-    await init_db(settings.database_url_effective)
+    # Инициализация базы данных. Таблицы создаёт только основной процесс: параллельный create_all
+    # из нескольких воркеров гоняется на PostgreSQL. Обновления до остальных воркеров доходят лишь
+    # после set_webhook в основном, то есть уже после создания схемы
+    await init_db(settings.database_url_effective, create_schema=primary)
     logger.info("Database initialized")
     
+    # Общий пул соединений к DataNewton
+    await datanewton_api.start()
+    
+    # Справочник отраслевых праздников — в календарь один раз, дальше поиск без затрат на запрос
+    load_industry_holidays(settings.industry_holidays_file)
+    
+    # Фоновая выгрузка обновлений сводной таблицы (write-behind)
+    await supervisor_queue.start(consumer=primary)
+    if not primary:
+        return
+    
     # Уведомление администраторов о запуске (только тех, кто уже писал боту)
     for admin_id in settings.admin_ids_list:
         try:
@@ -39,48 +68,61 @@ async def on_startup(bot: Bot):
     try:
         scheduler = AsyncIOScheduler(timezone=settings.timezone)
 
-        async def send_daily_reminders():
-            try:
-                google_sheets = get_google_sheets_service()
-                # Получаем список менеджеров и шлём напоминания
-                async for session in get_session():
-                    result = await session.execute(Manager.__table__.select())
-                    rows = result.fetchall()
-                    for row in rows:
-                        sheet_id = row.google_sheet_id if hasattr(row, 'google_sheet_id') else None
-                        chat_id = row.telegram_id if hasattr(row, 'telegram_id') else None
-                        if not sheet_id or not chat_id:
-                            continue
-                        today_calls = await google_sheets.get_today_calls(sheet_id)
-                        if today_calls:
-                            try:
-                                await bot.send_message(
-                                    chat_id,
-                                    f"📅 Напоминание: на сегодня запланировано звонков: {len(today_calls)}"
-                                )
-                            except Exception:
-                                pass
-                    await session.close()
-            except Exception as e:
-                logger.warning(f"Reminder job failed: {e}")
-
-        # Несколько времен напоминаний в день
+        # Все времена напоминаний — одна задача: max_instances=1 не даёт рассылкам наложиться,
+        # а пропущенные запуски (например, после долгой паузы loop) схлопываются в один
+        triggers = []
+        reminder_minutes = []
         for tm in settings.reminder_times_list:
             try:
                 h, m = map(int, tm.split(":"))
-                scheduler.add_job(send_daily_reminders, 'cron', hour=h, minute=m)
+                triggers.append(CronTrigger(hour=h, minute=m, timezone=settings.timezone))
+                reminder_minutes.append(h * 60 + m)
             except Exception:
                 logger.warning(f"Invalid reminder time skipped: {tm}")
+        if triggers:
+            scheduler.add_job(
+                send_daily_reminders, OrTrigger(triggers), args=[bot],
+                id="daily_reminders", max_instances=1, coalesce=True,
+                misfire_grace_time=settings.reminder_misfire_grace_time,
+            )
+        # AI-инфоповоды на сегодня готовятся заранее, до первого (утреннего) напоминания
+        if reminder_minutes and settings.ai_hint_prewarm_enabled and settings.openai_api_key:
+            prewarm_at = max(0, min(reminder_minutes) - settings.ai_hint_prewarm_lead_minutes)
+            scheduler.add_job(
+                prewarm_today_hints,
+                CronTrigger(hour=prewarm_at // 60, minute=prewarm_at % 60, timezone=settings.timezone),
+                id="ai_hint_prewarm", max_instances=1, coalesce=True,
+                misfire_grace_time=settings.reminder_misfire_grace_time,
+            )
+        # Ручные правки листов подтягиваются в БД (зеркало + план звонков) по расписанию; первая синхронизация — сразу
+        scheduler.add_job(
+            sync_all_sheets, 'interval',
+            minutes=max(1, settings.sheet_sync_interval_minutes),
+            next_run_time=datetime.now(ZoneInfo(settings.timezone)),
+            max_instances=1, coalesce=True,
+        )
         scheduler.start()
         logger.info("Scheduler started for daily reminders")
     except Exception as e:
         logger.warning(f"Scheduler not started: {e}")
 
 
-async def on_shutdown(bot: Bot):
+async def on_shutdown(bot: Bot, primary: bool = True):
     """Действия при остановке бота"""
     logger.info("Bot shutting down...")
     
+    await datanewton_api.close()
+    await close_openai_client()
+    
+    # Выгружаем остаток очереди сводной таблицы до остановки пула потоков Sheets
+    await supervisor_queue.stop()
+    
+    if google_sheets.google_sheets_service is not None:
+        google_sheets.google_sheets_service.close()
+    
+    if not primary:
+        return
+    
     # Уведомление администраторов об остановке
     for admin_id in settings.admin_ids_list:
         try:
@@ -121,12 +163,11 @@ def setup_middlewares(dp: Dispatcher):
     dp.callback_query.middleware(db_session_middleware)
 
 
-async def main():
-    """Основная функция запуска бота"""
-    # Инициализация бота и диспетчера
-    bot = Bot(token=settings.bot_token)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми роутерами и middleware (общий для polling и webhook)"""
+    # Диалоги переживают рестарт (FSM в БД или Redis, см. services/fsm_storage.py)
+    storage = create_fsm_storage()
+    dp = Dispatcher(storage=storage, events_isolation=create_event_isolation(storage))
     
     # Регистрация роутеров
     dp.include_router(start.router)
@@ -142,6 +183,14 @@ async def main():
     
     # Настройка middleware
     setup_middlewares(dp)
+    return dp
+
+
+async def main():
+    """Основная функция запуска бота (long polling)"""
+    # Инициализация бота и диспетчера
+    bot = Bot(token=settings.bot_token)
+    dp = create_dispatcher()
     
     # Настройка команд
     await setup_bot_commands(bot)
@@ -149,6 +198,8 @@ async def main():
     # Запуск бота
     try:
         await on_startup(bot)
+        # После работы в режиме webhook getUpdates недоступен, пока webhook не снят
+        await bot.delete_webhook()
         logger.info("Starting polling...")
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
@@ -156,8 +207,46 @@ async def main():
         await bot.session.close()
 
 
+def run_webhook_worker(index: int = 0) -> None:
+    """Процесс webhook (BOT_MODE=webhook); воркер 0 — основной, см. bot/webhook.py"""
+    primary = index == 0
+    bot = Bot(token=settings.bot_token)
+    dp = create_dispatcher()
+
+    async def startup(bot: Bot):
+        await on_startup(bot, primary=primary)
+        if primary:
+            await setup_bot_commands(bot)
+            await bot.set_webhook(
+                webhook_url(),
+                secret_token=settings.webhook_secret or None,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=settings.webhook_max_connections,
+            )
+            logger.info(f"Webhook set: {webhook_url()}")
+
+    async def shutdown(bot: Bot):
+        # Webhook не снимаем: пока бот перезапускается, Telegram копит обновления и повторит доставку
+        await on_shutdown(bot, primary=primary)
+
+    dp.startup.register(startup)
+    dp.shutdown.register(shutdown)
+    app = build_webhook_app(dp, bot)
+    logger.info(f"Webhook worker {index} listening on {settings.webhook_host}:{settings.webhook_port + index}")
+    web.run_app(
+        app,
+        host=settings.webhook_host,
+        port=settings.webhook_port + index,
+        shutdown_timeout=settings.webhook_drain_timeout,
+        print=None,
+    )
+
+
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if settings.bot_mode == "webhook":
+            run_workers(run_webhook_worker, settings.webhook_workers)
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
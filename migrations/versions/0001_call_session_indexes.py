@@ -0,0 +1,44 @@
+"""Индексы call_sessions: история по (manager_id, company_inn, created_at) и next_call_date
+
+Таблицы по-прежнему создаёт init_db (Base.metadata.create_all) — для новой БД индексы
+появятся вместе с таблицей, поэтому миграция создаёт только недостающие.
+
+Revision ID: 0001_call_session_indexes
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001_call_session_indexes"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_call_sessions_manager_inn_created", ["manager_id", "company_inn", "created_at"]),
+    ("ix_call_sessions_next_call_date", ["next_call_date"]),
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table("call_sessions"):
+        return
+    existing = {index["name"] for index in inspector.get_indexes("call_sessions")}
+    for name, columns in INDEXES:
+        if name in existing:
+            continue
+        if bind.dialect.name == "postgresql":
+            # На большой таблице строим индекс без блокировки записи
+            with op.get_context().autocommit_block():
+                op.create_index(name, "call_sessions", columns, postgresql_concurrently=True)
+        else:
+            op.create_index(name, "call_sessions", columns)
+
+
+def downgrade() -> None:
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name="call_sessions")
@@ -0,0 +1,160 @@
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from models.database import CallAgenda, Manager
+
+
+# Форматы дат в колонке E листа и в ответах менеджеров
+DATE_FORMATS = ("%d.%m.%y", "%d.%m.%Y", "%Y-%m-%d")
+
+
+def today_local() -> date:
+    """Сегодняшняя дата в часовом поясе из настроек."""
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo(settings.timezone)).date()
+    except Exception:
+        return datetime.now().date()
+
+
+def parse_call_date(value: Any) -> Optional[date]:
+    """Дата звонка из строки листа/бота ('25.12.24', '25.12.2024') или datetime. Пустое/неразборчивое -> None."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def history_comment(comment: str) -> str:
+    """Комментарий в формате истории листа: '[дд.мм.гг] текст'."""
+    return f"[{today_local().strftime('%d.%m.%y')}] {comment}" if comment else ""
+
+
+async def upsert_agenda(
+    session: AsyncSession,
+    manager_id: int,
+    inn: str,
+    next_call_date: Any,
+    comment: Optional[str] = None,
+    source: str = "bot",
+    **fields: Any,
+) -> CallAgenda:
+    """Записать дату следующего звонка по компании (commit делает вызывающий).
+
+    comment добавляется в начало истории (как в листе); fields — company_name/contact_name/phone,
+    пустые значения не затирают уже известные.
+    """
+    result = await session.execute(
+        select(CallAgenda).where(CallAgenda.manager_id == manager_id, CallAgenda.company_inn == inn)
+    )
+    item = result.scalar_one_or_none()
+    if item is None:
+        item = CallAgenda(manager_id=manager_id, company_inn=inn)
+        session.add(item)
+    item.next_call_date = parse_call_date(next_call_date)
+    if comment:
+        item.last_comment = f"{comment}\n---\n{item.last_comment}" if item.last_comment else comment
+    for name, value in fields.items():
+        if value:
+            setattr(item, name, value)
+    item.source = source
+    item.updated_at = datetime.utcnow()
+    return item
+
+
+async def get_agenda_for_day(session: AsyncSession, manager_id: int, day: Optional[date] = None) -> List[CallAgenda]:
+    """Звонки менеджера на день (по индексу next_call_date + manager_id)."""
+    result = await session.execute(
+        select(CallAgenda)
+        .where(CallAgenda.next_call_date == (day or today_local()), CallAgenda.manager_id == manager_id)
+        .order_by(CallAgenda.company_name)
+    )
+    return list(result.scalars().all())
+
+
+async def count_agenda_by_manager(session: AsyncSession, day: Optional[date] = None) -> List[Any]:
+    """Число звонков на день по всем менеджерам одним запросом: строки (manager_id, telegram_id, google_sheet_id, calls)."""
+    result = await session.execute(
+        select(Manager.id, Manager.telegram_id, Manager.google_sheet_id, func.count(CallAgenda.id))
+        .join(CallAgenda, CallAgenda.manager_id == Manager.id)
+        .where(CallAgenda.next_call_date == (day or today_local()))
+        .group_by(Manager.id, Manager.telegram_id, Manager.google_sheet_id)
+    )
+    return list(result.all())
+
+
+async def list_agenda_for_day(session: AsyncSession, day: Optional[date] = None) -> List[Any]:
+    """Все звонки на день по всем менеджерам: строки (manager_id, company_inn)."""
+    result = await session.execute(
+        select(CallAgenda.manager_id, CallAgenda.company_inn)
+        .where(CallAgenda.next_call_date == (day or today_local()))
+        .order_by(CallAgenda.manager_id)
+    )
+    return list(result.all())
+
+
+def agenda_to_call(item: CallAgenda) -> Dict[str, Any]:
+    """Звонок в формате для вывода в боте (show_today_calls)."""
+    return {
+        'company_name': item.company_name or '',
+        'inn': item.company_inn,
+        'contact_name': item.contact_name or '',
+        'phone': item.phone or '',
+        'last_comment': item.last_comment or '',
+    }
+
+
+async def replace_from_sheet(
+    session: AsyncSession,
+    manager_id: int,
+    rows: Iterable[Dict[str, Any]],
+    synced_before: datetime,
+) -> int:
+    """Синхронизировать план менеджера со строками листа (commit делает вызывающий).
+
+    Лист — источник истины для даты и истории (удалённые из листа компании удаляются из плана),
+    но записи, изменённые ботом после начала чтения листа (updated_at >= synced_before),
+    не трогаются: они свежее прочитанного. Возвращает число изменённых записей.
+    """
+    result = await session.execute(select(CallAgenda).where(CallAgenda.manager_id == manager_id))
+    existing = {item.company_inn: item for item in result.scalars().all()}
+    changed = 0
+    seen = set()
+    for row in rows:
+        inn = row['inn']
+        seen.add(inn)
+        item = existing.get(inn)
+        if item is not None and item.updated_at >= synced_before:
+            continue
+        values = {
+            'company_name': row.get('company_name') or None,
+            'contact_name': row.get('contact_name') or None,
+            'phone': row.get('phone') or None,
+            'last_comment': row.get('last_comment') or None,
+            'next_call_date': parse_call_date(row.get('next_call_date')),
+        }
+        if item is None:
+            item = CallAgenda(manager_id=manager_id, company_inn=inn)
+            session.add(item)
+            existing[inn] = item
+        elif all(getattr(item, name) == value for name, value in values.items()):
+            continue
+        for name, value in values.items():
+            setattr(item, name, value)
+        item.source = "sheet"
+        item.updated_at = datetime.utcnow()
+        changed += 1
+    for inn, item in existing.items():
+        if inn not in seen and item.updated_at < synced_before:
+            await session.delete(item)
+            changed += 1
+    return changed
@@ -0,0 +1,35 @@
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.database import CallSession
+
+
+# Запросы по истории звонков. Все фильтруют по (manager_id, company_inn) и сортируют по created_at,
+# поэтому обслуживаются индексом ix_call_sessions_manager_inn_created без сортировки в памяти.
+
+
+async def get_last_call(session: AsyncSession, manager_id: int, inn: str) -> Optional[CallSession]:
+    """Последний звонок менеджера по компании."""
+    result = await session.execute(
+        select(CallSession)
+        .where(
+            CallSession.manager_id == manager_id,
+            CallSession.company_inn == inn,
+        )
+        .order_by(CallSession.created_at.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+async def get_call_history(session: AsyncSession, manager_id: int, inn: str) -> List[CallSession]:
+    """Все звонки менеджера по компании в хронологическом порядке."""
+    result = await session.execute(
+        select(CallSession)
+        .where(
+            CallSession.manager_id == manager_id,
+            CallSession.company_inn == inn,
+        )
+        .order_by(CallSession.created_at.asc())
+    )
+    return list(result.scalars().all())
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Date, DateTime, Boolean, ForeignKey, LargeBinary, Text, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
@@ -23,6 +23,12 @@ class Manager(Base):
 
 class CallSession(Base):
     __tablename__ = "call_sessions"
+    __table_args__ = (
+        # История звонков менеджера по компании (repeat_call, ai_advisor): поиск + сортировка по индексу
+        Index("ix_call_sessions_manager_inn_created", "manager_id", "company_inn", "created_at"),
+        # Звонки на дату (напоминания, "звонки на сегодня")
+        Index("ix_call_sessions_next_call_date", "next_call_date"),
+    )
     
     id = Column(Integer, primary_key=True)
     manager_id = Column(Integer, ForeignKey("managers.id"))
@@ -39,18 +45,151 @@ class CallSession(Base):
     manager = relationship("Manager", back_populates="sessions")
 
 
+class CallAgenda(Base):
+    """Текущий план звонков: одна строка на компанию менеджера с датой следующего звонка.
+
+    Обновляется при сохранении звонка в боте и синхронизируется с листом менеджера
+    (services/sheet_sync.py), поэтому "звонки на сегодня" отвечаются одним запросом к БД.
+    """
+    __tablename__ = "call_agenda"
+    __table_args__ = (
+        UniqueConstraint("manager_id", "company_inn", name="uq_call_agenda_manager_inn"),
+        Index("ix_call_agenda_next_call_date_manager", "next_call_date", "manager_id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    manager_id = Column(Integer, ForeignKey("managers.id"), nullable=False)
+    company_inn = Column(String, nullable=False)
+    company_name = Column(String)
+    contact_name = Column(String)
+    phone = Column(String)
+    last_comment = Column(Text)  # история комментариев (свежие сверху), как в колонке F листа
+    next_call_date = Column(Date)
+    source = Column(String, default="bot")  # bot | sheet — откуда пришло последнее изменение
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SheetRow(Base):
+    """Зеркало строки листа менеджера (A:Q) — читается локально вместо Sheets API.
+
+    Заполняется фоновой синхронизацией (services/sheet_sync.py): строка перезаписывается,
+    только если изменился хэш её значений.
+    """
+    __tablename__ = "sheet_rows"
+    __table_args__ = (
+        UniqueConstraint("sheet_id", "inn", name="uq_sheet_rows_sheet_inn"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    sheet_id = Column(String, nullable=False)
+    inn = Column(String, nullable=False)
+    row_number = Column(Integer, nullable=False)  # номер строки в листе на момент синхронизации
+    row_hash = Column(String(40), nullable=False)
+    data = Column(Text, nullable=False)  # JSON-список значений A:Q
+    synced_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # когда строка последний раз менялась
+
+
+class SheetSyncState(Base):
+    """Водяной знак синхронизации листа: до какого момента зеркало sheet_rows актуально."""
+    __tablename__ = "sheet_sync_state"
+    
+    sheet_id = Column(String, primary_key=True)
+    manager_id = Column(Integer, ForeignKey("managers.id"))
+    modified_time = Column(String)  # modifiedTime таблицы из Drive на момент последнего чтения
+    last_synced_at = Column(DateTime)  # зеркало соответствует листу на этот момент
+    last_changed_at = Column(DateTime)  # последняя синхронизация, нашедшая изменения
+    row_count = Column(Integer, default=0)
+    last_error = Column(Text)
+
+
+class DataNewtonResponse(Base):
+    """Сырые ответы DataNewton (сжатый JSON) — переживают рестарты и позволяют перепарсить данные без API."""
+    __tablename__ = "datanewton_responses"
+    __table_args__ = (
+        UniqueConstraint("endpoint", "query_key", name="uq_datanewton_endpoint_query"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    endpoint = Column(String, nullable=False)  # counterparty, finance, governmentContractsStat, ...
+    query_key = Column(String, nullable=False)  # параметры запроса без API-ключа: "inn=...&type=ALL"
+    inn = Column(String, index=True)
+    ogrn = Column(String)
+    payload = Column(LargeBinary, nullable=False)  # zlib(текст ответа)
+    fetched_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SupervisorUpdate(Base):
+    """Очередь write-behind для сводной таблицы: запись удаляется после успешной выгрузки в Google Sheets."""
+    __tablename__ = "supervisor_updates"
+    
+    id = Column(Integer, primary_key=True)  # порядок применения
+    manager_name = Column(String, nullable=False)
+    inn = Column(String, index=True)
+    call_date = Column(String, nullable=False)  # дата звонка в формате листа (дд.мм.гг)
+    payload = Column(Text, nullable=False)  # JSON call_data
+    attempts = Column(Integer, default=0, nullable=False)
+    failed_at = Column(DateTime)  # не выгрузилась за supervisor_max_attempts попыток — отложена (dead letter)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AiHint(Base):
+    """Сгенерированные AI-инфоповоды по хэшу входных данных промпта (services/ai_advisor.py)."""
+    __tablename__ = "ai_hints"
+    
+    id = Column(Integer, primary_key=True)
+    prompt_hash = Column(String(64), unique=True, nullable=False)  # sha256 модели, параметров и сообщений
+    inn = Column(String, index=True)
+    model = Column(String)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class CommentSummary(Base):
+    """Сводка старой истории комментариев по компании для промпта AI (services/hint_context.py).
+
+    Покрывает summarized_count самых старых комментариев и дополняется по мере роста истории.
+    """
+    __tablename__ = "comment_summaries"
+    __table_args__ = (
+        UniqueConstraint("manager_id", "company_inn", name="uq_comment_summaries_manager_inn"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    manager_id = Column(Integer, ForeignKey("managers.id"), nullable=False)
+    company_inn = Column(String, nullable=False)
+    summary = Column(Text, nullable=False)
+    summarized_count = Column(Integer, nullable=False, default=0)
+    source_hash = Column(String(40), nullable=False)  # sha1 свёрнутых комментариев: правка старых — пересборка
+    model = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class FsmRecord(Base):
+    """Состояние диалога aiogram (FSM) — переживает рестарты и общее для нескольких процессов бота."""
+    __tablename__ = "fsm_states"
+    
+    key = Column(String, primary_key=True)  # bot_id:chat_id:user_id:thread_id:destiny
+    state = Column(String)
+    data = Column(Text, nullable=False, default="{}")  # JSON
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 # Настройка асинхронной базы данных
 async_engine = None
 AsyncSessionLocal = None
 
 
-async def init_db(database_url: str):
+async def init_db(database_url: str, create_schema: bool = True):
+    """Движок и фабрика сессий; create_schema=False — таблицы создаёт другой процесс (основной воркер webhook)."""
     global async_engine, AsyncSessionLocal
     
     # URL уже содержит правильный драйвер, не нужно менять
     async_engine = create_async_engine(database_url, echo=False)
     AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
     
+    if not create_schema:
+        return
+    
     # Создаем таблицы
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -0,0 +1,101 @@
+import json
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.database import SheetRow
+
+
+def _normalize(values: Sequence[Any]) -> List[str]:
+    """Значения строки как их отдаёт Sheets API: строки без хвостовых пустых ячеек."""
+    cells = ["" if value is None else str(value) for value in values]
+    while cells and not cells[-1]:
+        cells.pop()
+    return cells
+
+
+def row_hash(values: Sequence[Any]) -> str:
+    return hashlib.sha1("\x1f".join(_normalize(values)).encode("utf-8")).hexdigest()
+
+
+async def apply_snapshot(
+    session: AsyncSession,
+    sheet_id: str,
+    rows: Sequence[Tuple[int, Sequence[Any]]],
+    synced_at: datetime,
+) -> Dict[str, int]:
+    """Сверить зеркало листа со снимком (номер строки, значения) и записать только отличия (commit — у вызывающего).
+
+    Изменённой считается строка с другим хэшем значений; сдвиг строки в листе (удалили строку выше)
+    обновляет только row_number. ИНН, которых больше нет в листе, удаляются из зеркала.
+    При повторе ИНН в листе берётся первая строка — как в индексе ИНН -> строка.
+    """
+    result = await session.execute(select(SheetRow).where(SheetRow.sheet_id == sheet_id))
+    existing = {item.inn: item for item in result.scalars().all()}
+    stats = {"inserted": 0, "updated": 0, "moved": 0, "deleted": 0, "unchanged": 0}
+    seen = set()
+    for row_number, values in rows:
+        inn = str(values[1]).strip()
+        if inn in seen:
+            continue
+        seen.add(inn)
+        digest = row_hash(values)
+        item = existing.get(inn)
+        if item is None:
+            session.add(SheetRow(
+                sheet_id=sheet_id, inn=inn, row_number=row_number, row_hash=digest,
+                data=json.dumps(_normalize(values), ensure_ascii=False), synced_at=synced_at,
+            ))
+            stats["inserted"] += 1
+        elif item.row_hash != digest:
+            item.row_number = row_number
+            item.row_hash = digest
+            item.data = json.dumps(_normalize(values), ensure_ascii=False)
+            item.synced_at = synced_at
+            stats["updated"] += 1
+        elif item.row_number != row_number:
+            item.row_number = row_number
+            stats["moved"] += 1
+        else:
+            stats["unchanged"] += 1
+    for inn, item in existing.items():
+        if inn not in seen:
+            await session.delete(item)
+            stats["deleted"] += 1
+    return stats
+
+
+def row_values(item: SheetRow) -> List[str]:
+    return json.loads(item.data)
+
+
+def values_to_call(values: Sequence[Any]) -> Dict[str, Any]:
+    """Поля листа менеджера A:F в формате call_data."""
+    cells = _normalize(values) + [""] * 6
+    return {
+        'company_name': cells[0],
+        'inn': cells[1].strip(),
+        'contact_name': cells[2],
+        'phone': cells[3],
+        'next_call_date': cells[4],  # E
+        'last_comment': cells[5],  # F
+    }
+
+
+def row_to_call(item: SheetRow) -> Dict[str, Any]:
+    return values_to_call(row_values(item))
+
+
+async def get_mirror_row(session: AsyncSession, sheet_id: str, inn: str) -> Optional[SheetRow]:
+    """Строка листа по ИНН из зеркала (без обращения к Sheets API)."""
+    result = await session.execute(
+        select(SheetRow).where(SheetRow.sheet_id == sheet_id, SheetRow.inn == inn)
+    )
+    return result.scalar_one_or_none()
+
+
+def latest_history_entry(history: str, max_chars: int = 500) -> str:
+    """Последняя запись истории из колонки F (новые сверху, разделитель ---), обрезанная до max_chars."""
+    entry = (history or "").split("\n---\n", 1)[0].strip()
+    return entry if len(entry) <= max_chars else entry[: max_chars - 1].rstrip() + "…"
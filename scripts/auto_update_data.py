@@ -91,10 +91,8 @@ async def update_dynamic_data(sheet_id: str, columns: List[str]):
             await sheets.update_specific_columns(sheet_id, inn, updates)
             updated_count += 1
             logger.info(f"Updated row {i} for INN {inn}")
-        
-        # Небольшая задержка чтобы не перегрузить API
-        await asyncio.sleep(0.5)
     
+    await datanewton_api.close()
     logger.info(f"Обновлено {updated_count} строк из {len(values) - 1}")
 
 
@@ -1,7 +1,11 @@
 import os
 import sys
+import json
+import time
 import asyncio
+import argparse
 import re
+from typing import Any, Dict, List
 from loguru import logger
 
 # Ensure project root on sys.path
@@ -11,77 +15,147 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 from models.database import init_db, get_session, Manager
-from services.google_sheets import get_google_sheets_service
+from config import settings
+from services.google_sheets import GoogleSheetsService, get_google_sheets_service
 from services.datanewton_api import datanewton_api
 
+# Google рекомендует держать тело запроса в пределах ~2 МБ
+DEFAULT_CHUNK_BYTES = 1_500_000
+DEFAULT_CONCURRENCY = 8
+
 
 def only_digits(text: str) -> str:
     return re.sub(r"\D", "", text or "")
 
 
-async def refresh_manager_sheet(sheet_id: str) -> int:
+def new_stats() -> Dict[str, Any]:
+    """Счётчики по стадиям конвейера: чтение листа -> запросы DataNewton -> запись в лист."""
+    return {
+        "read_rows": 0, "read_seconds": 0.0,
+        "fetch_ok": 0, "fetch_empty": 0, "fetch_failed": 0, "fetch_seconds": 0.0,
+        "write_requests": 0, "write_cells": 0, "write_seconds": 0.0,
+    }
+
+
+def build_updates(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Карта колонка -> значение для строки листа (колонки — по актуальной схеме MANAGER_HEADERS)."""
+    return GoogleSheetsService.datanewton_column_updates(data)
+
+
+def chunk_value_ranges(data: List[Dict[str, Any]], max_bytes: int) -> List[List[Dict[str, Any]]]:
+    """Разбить список ValueRange на пачки так, чтобы тело batchUpdate не превышало max_bytes."""
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    size = 0
+    for item in data:
+        item_size = len(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+        if current and size + item_size > max_bytes:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += item_size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def refresh_manager_sheet(
+    sheet_id: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    stats: Dict[str, Any] | None = None,
+) -> int:
+    """Конвейерное обновление листа: одно чтение, пул воркеров для DataNewton, пакетная запись."""
     gs = get_google_sheets_service()
+    stats = stats if stats is not None else new_stats()
     # Ensure headers structure
-    await gs._ensure_headers(sheet_id)
-
-    # Read all values
-    result = gs.service.spreadsheets().values().get(
-        spreadsheetId=sheet_id,
-        range='A:AZ'
-    ).execute()
-    values = result.get('values', [])
-    if len(values) <= 1:
+    await gs.ensure_headers(sheet_id)
+
+    # 1) Read the INN column once
+    started = time.perf_counter()
+    sheet_rows = await gs.read_sheet_rows(sheet_id, last_col='B')
+    stats["read_seconds"] += time.perf_counter() - started
+
+    rows = []
+    for i, row in sheet_rows:
+        inn = only_digits(row[1])
+        if inn:
+            rows.append((i, inn))
+    stats["read_rows"] += len(rows)
+    if not rows:
         return 0
 
-    updated = 0
-    # Iterate rows starting from 2
-    for i, row in enumerate(values[1:], start=2):
-        inn = only_digits(row[1] if len(row) > 1 else "")
-        if not inn:
-            continue
-        try:
-            data = await datanewton_api.get_full_company_data(inn)
-        except Exception as e:
-            logger.warning(f"INN {inn}: fetch error: {e}")
-            continue
-        if not data:
-            continue
-
-        # Build updates map (column letter -> value)
-        updates = {
-            'G': data.get('revenue', ''),
-            'H': data.get('revenue_previous', ''),
-            'I': data.get('capital', ''),
-            'J': data.get('assets', ''),
-            'K': data.get('debit', ''),
-            'L': data.get('credit', ''),
-            'M': data.get('region', ''),
-            'N': data.get('okved', ''),
-            'O': data.get('okved', ''),
-            'P': data.get('gov_contracts', ''),
-            'Q': data.get('arbitration_open_count', ''),
-            'R': data.get('arbitration_open_sum', ''),
-            'S': data.get('arbitration_last_doc_date', ''),
-            'U': data.get('okpd', ''),
-            'V': data.get('okpd_name', ''),
-            'W': data.get('okved_name', ''),
-        }
+    # 2) Fetch companies with a bounded worker pool
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in rows:
+        queue.put_nowait(item)
+    row_updates: Dict[int, Dict[str, Any]] = {}
+
+    async def worker():
+        while True:
+            try:
+                row_num, inn = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                data = await datanewton_api.get_full_company_data(inn)
+            except Exception as e:
+                logger.warning(f"INN {inn}: fetch error: {e}")
+                stats["fetch_failed"] += 1
+                continue
+            if not data:
+                stats["fetch_empty"] += 1
+                continue
+            stats["fetch_ok"] += 1
+            row_updates[row_num] = build_updates(data)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    stats["fetch_seconds"] += time.perf_counter() - started
+
+    # 3) Collect results into batchUpdate requests (chunked by body size)
+    data = []
+    for row_num in sorted(row_updates):
+        for col_letter, value in row_updates[row_num].items():
+            data.append({'range': f'{col_letter}{row_num}', 'values': [[value]]})
+
+    started = time.perf_counter()
+    for chunk in chunk_value_ranges(data, chunk_bytes):
         try:
-            ok = await gs.update_specific_columns(sheet_id, inn, updates)
-            if ok:
-                updated += 1
+            await gs.batch_update_cells(sheet_id, chunk)
+            stats["write_requests"] += 1
+            stats["write_cells"] += len(chunk)
         except Exception as e:
-            logger.warning(f"INN {inn}: sheet update error: {e}")
-
-        # Optional: small delay to be gentle on API
-        await asyncio.sleep(0.1)
-
-    return updated
-
-
-async def run():
-    await init_db("sqlite+aiosqlite:///./crmbot.db")
+            logger.warning(f"Sheet {sheet_id}: batch update error: {e}")
+    stats["write_seconds"] += time.perf_counter() - started
+
+    return len(row_updates)
+
+
+def log_stats(stats: Dict[str, Any]) -> None:
+    def rate(count, seconds):
+        return f"{count / seconds:.1f}/s" if seconds else "n/a"
+
+    fetched = stats["fetch_ok"] + stats["fetch_empty"] + stats["fetch_failed"]
+    logger.info(
+        f"Read:  {stats['read_rows']} rows in {stats['read_seconds']:.1f}s "
+        f"({rate(stats['read_rows'], stats['read_seconds'])})"
+    )
+    logger.info(
+        f"Fetch: {fetched} INNs in {stats['fetch_seconds']:.1f}s ({rate(fetched, stats['fetch_seconds'])}), "
+        f"ok={stats['fetch_ok']} empty={stats['fetch_empty']} failed={stats['fetch_failed']}"
+    )
+    logger.info(
+        f"Write: {stats['write_cells']} cells in {stats['write_requests']} requests, "
+        f"{stats['write_seconds']:.1f}s ({rate(stats['write_cells'], stats['write_seconds'])})"
+    )
+    logger.info(f"DataNewton: {datanewton_api.cache_stats()}")
+
+
+async def run(concurrency: int = DEFAULT_CONCURRENCY, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+    await init_db(settings.database_url_effective)
     total_updated = 0
+    stats = new_stats()
     async for session in get_session():
         try:
             result = await session.execute(Manager.__table__.select())
@@ -91,16 +165,21 @@ async def run():
                 if not sheet_id:
                     continue
                 logger.info(f"Refreshing sheet {sheet_id} ...")
-                count = await refresh_manager_sheet(sheet_id)
+                count = await refresh_manager_sheet(sheet_id, concurrency, chunk_bytes, stats)
                 total_updated += count
                 logger.info(f"Sheet {sheet_id}: updated {count} rows")
         finally:
             await session.close()
+    log_stats(stats)
+    await datanewton_api.close()
     logger.info(f"Batch refresh completed: total rows updated = {total_updated}")
 
 
 if __name__ == "__main__":
-    asyncio.run(run())
-
-
-
+    parser = argparse.ArgumentParser(description="Refresh DataNewton data in all manager sheets")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Parallel DataNewton lookups (the client rate limit still applies)")
+    parser.add_argument("--chunk-bytes", type=int, default=DEFAULT_CHUNK_BYTES,
+                        help="Max approximate body size of one values.batchUpdate request")
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.chunk_bytes))
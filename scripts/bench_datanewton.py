@@ -0,0 +1,153 @@
+"""
+Бенчмарк DataNewtonAPI против локального стаб-сервера.
+
+Поднимает aiohttp-сервер, имитирующий эндпоинты DataNewton (с настраиваемой задержкой),
+и замеряет время get_full_company_data в двух режимах:
+    fresh  - новая сессия (и новые TCP-соединения) на каждый вызов, как было раньше
+    pooled - одна общая сессия с keep-alive пулом
+
+Использование:
+    python scripts/bench_datanewton.py --calls 50 --latency-ms 30
+    python scripts/bench_datanewton.py --calls 50 --latency-ms 30 --sequential
+    python scripts/bench_datanewton.py --calls 50 --latency-ms 30 --cache
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from typing import Dict, List
+
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# Минимальные переменные окружения, чтобы config.Settings загрузился без .env
+for _name in ("BOT_TOKEN", "MANAGER_SHEET_TEMPLATE_ID", "SUPERVISOR_SHEET_ID", "DATANEWTON_API_KEY"):
+    os.environ.setdefault(_name, "bench")
+
+from aiohttp import web
+from loguru import logger
+
+from config import settings
+from services.datanewton_api import DataNewtonAPI
+
+
+COUNTERPARTY = {
+    "inn": "7700000000",
+    "ogrn": "1027700000000",
+    "company": {
+        "company_names": {"short_name": "ООО \"СТАБ\"", "full_name": "ОБЩЕСТВО \"СТАБ\""},
+        "okveds": [{"code": "41.20", "value": "Строительство зданий", "main": True}],
+        "managers": [{"fio": "Иванов Иван Иванович"}],
+        "address": {"line_address": "г. Москва", "region": {"name": "Москва"}},
+        "status": {"status_rus_short": "Действует"},
+    },
+    "workers_count": {"2023": 42},
+    "negative_lists": {},
+}
+FINANCE = {
+    "fin_results": {"indicators": [
+        {"code": "2110", "name": "Выручка", "sum": {"2024": 1000, "2023": 900}},
+        {"code": "2400", "name": "Чистая прибыль", "sum": {"2024": 100}},
+    ]},
+    "balances": {"indicators": [
+        {"code": "1150", "name": "Основные средства", "sum": {"2024": 50}},
+        {"code": "1300", "name": "Капитал и резервы", "sum": {"2024": 70}},
+    ]},
+}
+GOV_STAT = {"suppliers_stat": {"stat": [{"sum": 5000, "okpd2_code": "41.20.40", "okpd2_name": "Работы строительные"}]}}
+OKPD_LIST = {"data": [{"okpd2_code": "41.20.40", "okpd2_name": "Работы строительные"}]}
+ARBITRATION = {"total_cases": 1, "data": [{"sum": 12345, "last_document_date": 1700000000000}]}
+
+PAYLOADS: Dict[str, dict] = {
+    "counterparty": COUNTERPARTY,
+    "finance": FINANCE,
+    "governmentContractsStat": GOV_STAT,
+    "okpdList": OKPD_LIST,
+    "arbitration-cases": ARBITRATION,
+}
+
+
+def make_stub_app(latency_ms: float = 0.0) -> web.Application:
+    """Собрать приложение-стаб. В app['stats'] копятся счётчики запросов и новых соединений."""
+    app = web.Application()
+    stats = {"requests": 0, "connections": set()}
+    app["stats"] = stats
+
+    async def handler(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        stats["connections"].add(id(request.transport))
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return web.json_response(PAYLOADS[request.match_info["endpoint"]])
+
+    app.router.add_get("/v1/{endpoint}", handler)
+    return app
+
+
+async def start_stub(latency_ms: float = 0.0, port: int = 0):
+    """Запустить стаб на localhost. Возвращает (runner, base_url, stats)."""
+    app = make_stub_app(latency_ms)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    real_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{real_port}/v1", app["stats"]
+
+
+def _report(name: str, timings: List[float], stats: dict) -> None:
+    timings_ms = sorted(t * 1000 for t in timings)
+    p95 = timings_ms[max(0, int(len(timings_ms) * 0.95) - 1)]
+    print(
+        f"{name:>7}: calls={len(timings_ms)} mean={statistics.mean(timings_ms):.1f}ms "
+        f"p50={statistics.median(timings_ms):.1f}ms p95={p95:.1f}ms "
+        f"requests={stats['requests']} connections={len(stats['connections'])}"
+    )
+
+
+async def bench(calls: int, latency_ms: float, sequential: bool = False, cache: bool = False) -> None:
+    logger.remove()
+    settings.datanewton_concurrent_fetch = not sequential
+    # По умолчанию кэш выключен, чтобы мерить сетевой путь; с --cache видно эффект повторных запросов
+    settings.datanewton_cache_enabled = cache
+    # Лимитер выключен: меряем накладные расходы клиента, а не настроенный RPS
+    settings.datanewton_rate_limit_rps = 0
+    runner, base_url, stats = await start_stub(latency_ms)
+    try:
+        for mode in ("fresh", "pooled"):
+            stats["requests"] = 0
+            stats["connections"].clear()
+            api = DataNewtonAPI()
+            api.base_url = base_url
+            timings: List[float] = []
+            for _ in range(calls):
+                started = time.perf_counter()
+                await api.get_full_company_data(COUNTERPARTY["inn"])
+                timings.append(time.perf_counter() - started)
+                if mode == "fresh":
+                    # Закрываем пул после каждого вызова — как при сессии на каждый запрос
+                    await api.close()
+            await api.close()
+            _report(mode, timings, stats)
+            if cache:
+                print(f"{'':>7}  cache={api.cache_stats()}")
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DataNewtonAPI against a local stub server")
+    parser.add_argument("--calls", type=int, default=50, help="Number of get_full_company_data calls per mode")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial server latency per request")
+    parser.add_argument("--sequential", action="store_true", help="Disable concurrent fan-out in get_full_company_data")
+    parser.add_argument("--cache", action="store_true", help="Enable the in-memory response cache")
+    args = parser.parse_args()
+    asyncio.run(bench(args.calls, args.latency_ms, args.sequential, args.cache))
+
+
+if __name__ == "__main__":
+    main()
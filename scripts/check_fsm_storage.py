@@ -0,0 +1,149 @@
+"""
+Проверка и замер FSM-хранилищ (services/fsm_storage.py).
+
+Для каждого бэкенда прогоняет проверку контракта aiogram BaseStorage (state/data/update/clear),
+проверяет, что диалог переживает пересоздание хранилища (рестарт), и замеряет задержку операций
+на типичном шаге диалога: get_state -> update_data -> set_state.
+
+Бэкенды:
+    memory     - aiogram MemoryStorage (для сравнения)
+    sql        - SQLAlchemyStorage на отдельной SQLite БД (--db-url)
+    redis      - aiogram RedisStorage на --redis-url (любой Redis-совместимый сервер)
+    fakeredis  - RedisStorage поверх fakeredis (локальная замена Redis, pip install fakeredis)
+
+Использование:
+    python scripts/check_fsm_storage.py
+    python scripts/check_fsm_storage.py --backend sql fakeredis --dialogs 500 --steps 10
+    python scripts/check_fsm_storage.py --backend redis --redis-url redis://localhost:6379/15
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import tempfile
+from typing import Callable, Dict, List
+
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+for _name in ("BOT_TOKEN", "MANAGER_SHEET_TEMPLATE_ID", "SUPERVISOR_SHEET_ID", "DATANEWTON_API_KEY"):
+    os.environ.setdefault(_name, "bench")
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from models.database import init_db
+from services.fsm_storage import SQLAlchemyStorage, _dumps
+
+BOT_ID = 42
+
+
+def make_factory(backend: str, args) -> Callable[[], BaseStorage]:
+    """Фабрика хранилища: повторный вызов = то же хранилище после рестарта процесса."""
+    if backend == "memory":
+        storage = MemoryStorage()
+        return lambda: storage
+    if backend == "sql":
+        return lambda: SQLAlchemyStorage(flush_interval=args.flush_interval)
+    from aiogram.fsm.storage.redis import RedisStorage
+    if backend == "fakeredis":
+        import fakeredis
+        server = fakeredis.FakeServer()
+        return lambda: RedisStorage(redis=fakeredis.FakeAsyncRedis(server=server), json_dumps=_dumps)
+    return lambda: RedisStorage.from_url(args.redis_url, json_dumps=_dumps)
+
+
+async def check_contract(factory: Callable[[], BaseStorage], restart_survives: bool) -> None:
+    key = StorageKey(bot_id=BOT_ID, chat_id=1, user_id=1)
+    storage = factory()
+    assert await storage.get_state(key) is None
+    assert await storage.get_data(key) == {}
+    await storage.set_state(key, "NewCallStates:waiting_for_inn")
+    await storage.update_data(key, {"inn": "7707083893", "manager_id": 5})
+    data = await storage.get_data(key)
+    data["mutated"] = True  # хранилище не должно отдавать внутренний объект
+    assert await storage.get_data(key) == {"inn": "7707083893", "manager_id": 5}
+    await storage.update_data(key, {"comment": "перезвонить"})
+    await storage.close()
+
+    storage = factory()
+    if restart_survives:
+        assert await storage.get_state(key) == "NewCallStates:waiting_for_inn", "state lost on restart"
+        assert (await storage.get_data(key))["comment"] == "перезвонить", "data lost on restart"
+    await storage.set_state(key, None)
+    await storage.set_data(key, {})
+    await storage.close()
+
+    storage = factory()
+    assert await storage.get_state(key) is None
+    assert await storage.get_data(key) == {}
+    await storage.close()
+
+
+async def dialog(storage: BaseStorage, chat_id: int, steps: int, timings: Dict[str, List[float]]) -> None:
+    key = StorageKey(bot_id=BOT_ID, chat_id=chat_id, user_id=chat_id)
+    for step in range(steps):
+        started = time.perf_counter()
+        await storage.get_state(key)
+        timings["get_state"].append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await storage.update_data(key, {f"field_{step}": "x" * 40})
+        timings["update_data"].append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await storage.set_state(key, f"States:step_{step}")
+        timings["set_state"].append(time.perf_counter() - started)
+        await asyncio.sleep(0)
+    await storage.set_state(key, None)
+    await storage.set_data(key, {})
+
+
+async def measure(factory: Callable[[], BaseStorage], dialogs: int, steps: int) -> None:
+    storage = factory()
+    timings: Dict[str, List[float]] = {"get_state": [], "update_data": [], "set_state": []}
+    started = time.perf_counter()
+    await asyncio.gather(*[dialog(storage, 1000 + i, steps, timings) for i in range(dialogs)])
+    await storage.close()
+    total = time.perf_counter() - started
+    for op, values in timings.items():
+        values.sort()
+        p95 = values[max(0, int(len(values) * 0.95) - 1)] * 1000
+        print(f"    {op:>11}: p50={statistics.median(values) * 1000:.3f}ms p95={p95:.3f}ms")
+    extra = ""
+    if isinstance(storage, SQLAlchemyStorage):
+        extra = f", cache hits={storage.hits} misses={storage.misses}, DB flushes={storage.flushes}"
+    print(f"    total: {dialogs * steps} steps in {total:.2f}s{extra}")
+
+
+async def main_async(args) -> None:
+    if "sql" in args.backend:
+        if args.db_url.startswith("sqlite") and os.path.exists(args.db_path):
+            os.remove(args.db_path)
+        await init_db(args.db_url)
+    for backend in args.backend:
+        print(f"[{backend}]")
+        factory = make_factory(backend, args)
+        await check_contract(factory, restart_survives=backend != "memory")
+        print("    contract: ok" + ("" if backend == "memory" else ", survives restart"))
+        await measure(factory, args.dialogs, args.steps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark FSM storages")
+    parser.add_argument("--backend", nargs="+", default=["memory", "sql"],
+                        choices=["memory", "sql", "redis", "fakeredis"])
+    parser.add_argument("--db-path", default=os.path.join(tempfile.gettempdir(), "check_fsm_storage.db"), help="SQLite file for the sql backend (recreated)")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    parser.add_argument("--dialogs", type=int, default=200, help="Concurrent dialogs")
+    parser.add_argument("--steps", type=int, default=8, help="Steps per dialog")
+    args = parser.parse_args()
+    args.db_url = f"sqlite+aiosqlite:///{args.db_path}"
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Локальный фейковый OpenAI-совместимый сервер для проверки AI-советника без внешнего API.
+
+Поддерживает POST /v1/chat/completions (обычный ответ и stream=true в формате SSE) и GET /stats
+(число запросов). Ответ детерминирован: заголовок по ИНН из промпта + три инфоповода.
+
+Использование:
+    python scripts/fake_openai_server.py --port 8700 --latency 1.5
+    # в .env бота:  OPENAI_API_KEY=fake  OPENAI_BASE_URL=http://127.0.0.1:8700/v1
+
+    python scripts/fake_openai_server.py --check   # прогнать services.ai_advisor против сервера
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from aiohttp import web
+
+
+def make_answer(messages) -> str:
+    user = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+    inn = re.search(r"ИНН: (\d+)", user)
+    name = re.search(r"Компания: (.+)", user)
+    return (
+        "Звонок сегодня\n"
+        f"ИНН: {inn.group(1) if inn else 'неизвестно'}\n"
+        f"Название: {name.group(1) if name else 'неизвестно'}\n\n"
+        "Инфоповоды для звонка:\n"
+        "1. Отраслевой инфоповод (фейковый сервер).\n"
+        "2. Праздничный инфоповод (фейковый сервер).\n"
+        "3. Анализ истории общения (фейковый сервер)."
+    )
+
+
+def build_app(latency: float) -> web.Application:
+    app = web.Application()
+    stats = app["stats"] = {"requests": 0}
+
+    async def completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        stats["requests"] += 1
+        answer = make_answer(body.get("messages", []))
+        created = int(time.time())
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return web.json_response({
+                "id": f"chatcmpl-fake-{stats['requests']}",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+        # Потоковый ответ: кусочки текста равномерно в течение latency секунд
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        pieces = re.findall(r"\S+\s*", answer)
+        for i, piece in enumerate(pieces):
+            chunk = {
+                "id": f"chatcmpl-fake-{stats['requests']}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await asyncio.sleep(latency / max(1, len(pieces)))
+        done = {"id": "done", "object": "chat.completion.chunk", "created": created, "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        await response.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app.router.add_post("/v1/chat/completions", completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+async def check(args) -> None:
+    """Проверка services.ai_advisor: переиспользование клиента, кэш по хэшу промпта, объединение запросов, поток."""
+    os.environ.update({"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": f"http://127.0.0.1:{args.port}/v1"})
+    for name in ("BOT_TOKEN", "MANAGER_SHEET_TEMPLATE_ID", "SUPERVISOR_SHEET_ID", "DATANEWTON_API_KEY"):
+        os.environ.setdefault(name, "bench")
+    from models.database import init_db
+    from services import ai_advisor
+
+    app = build_app(args.latency)
+    stats = app["stats"]
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    await init_db(f"sqlite+aiosqlite:///{args.db_path}")
+
+    company = dict(
+        inn="7707083893", company_name="ООО Проверка", last_comment="Просили перезвонить",
+        last_call_date=None, all_comments=["[01.10.26] Просили перезвонить"],
+        okved_code="62.01", okved_name="Разработка ПО", region="Москва", revenue="1000",
+    )
+
+    async def timed(label: str, **overrides) -> None:
+        started = time.perf_counter()
+        await ai_advisor.generate_ai_notification(**{**company, **overrides})
+        print(f"  {label:<28} {(time.perf_counter() - started) * 1000:8.1f}ms  requests={stats['requests']}")
+
+    await timed("first call")
+    await timed("same inputs (memory cache)")
+    ai_advisor.hint_cache.clear()
+    await timed("same inputs (DB cache)")
+    await timed("new comment", all_comments=company["all_comments"] + ["[17.10.26] Ждут КП"])
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        ai_advisor.generate_ai_notification(**{**company, "inn": "7702070139"}) for _ in range(20)
+    ])
+    print(f"  {'20 parallel, same inputs':<28} {(time.perf_counter() - started) * 1000:8.1f}ms  requests={stats['requests']}")
+    started = time.perf_counter()
+    first = None
+    async for _ in ai_advisor.stream_ai_notification(**{**company, "inn": "7703000000"}):
+        first = first or time.perf_counter() - started
+    print(f"  {'streamed, new inputs':<28} {(time.perf_counter() - started) * 1000:8.1f}ms  requests={stats['requests']}"
+          f"  first text after {first * 1000:.1f}ms")
+    await timed("same inputs after stream", inn="7703000000")
+    print(f"  client reused: {ai_advisor._get_openai_client() is ai_advisor._get_openai_client()}, "
+          f"cache: {ai_advisor.hint_cache.stats()}")
+    await ai_advisor.close_openai_client()
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds per completion")
+    parser.add_argument("--check", action="store_true", help="Run services.ai_advisor against the server and exit")
+    parser.add_argument("--db-path", default="./fake_openai_check.db", help="SQLite file for --check (recreated)")
+    args = parser.parse_args()
+    if args.check:
+        asyncio.run(check(args))
+    else:
+        web.run_app(build_app(args.latency), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
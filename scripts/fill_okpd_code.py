@@ -59,9 +59,6 @@ async def fill_okpd_for_sheet(gs: GoogleSheetsService, api: DataNewtonAPI, sheet
                 else:
                     logger.warning(f"Row {row_num}: No OKPD found for INN {inn}")
                 
-                # Небольшая задержка, чтобы не перегружать API
-                await asyncio.sleep(0.5)
-                
             except Exception as e:
                 logger.error(f"Row {row_num}: Error fetching data for INN {inn}: {e}")
                 continue
@@ -110,6 +107,7 @@ async def main():
         logger.info("Filling supervisor sheet...")
         await fill_okpd_for_sheet(gs, api, settings.supervisor_sheet_id, "Supervisor Sheet")
     
+    await api.close()
     logger.info("🎉 All sheets filled!")
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+"""
+Нагрузочный тест GoogleSheetsService: N менеджеров одновременно сохраняют звонок.
+
+Sheets API заменён фейком, у которого каждый .execute() блокирует поток на --latency-ms
+(как настоящий синхронный googleapiclient). Сравниваются два режима:
+    inline   - .execute() прямо в event loop (как было раньше)
+    executor - .execute() в пуле потоков GoogleSheetsService
+
+Для каждого режима печатаются p50/p95 задержки хендлера (add_new_call + update_supervisor_sheet),
+считая от общего момента прихода всех апдейтов — так в inline-режиме учитывается и ожидание
+за чужими блокирующими вызовами, — и рядом задержка event loop (p95/max), которую увидел бы
+любой другой апдейт.
+
+Использование:
+    python scripts/load_test_sheets.py --managers 20 --latency-ms 300
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from typing import List
+
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+for _name in ("BOT_TOKEN", "MANAGER_SHEET_TEMPLATE_ID", "SUPERVISOR_SHEET_ID", "DATANEWTON_API_KEY"):
+    os.environ.setdefault(_name, "loadtest")
+
+from loguru import logger
+
+from services.google_sheets import GoogleSheetsService
+
+
+class FakeRequest:
+    def __init__(self, result, latency: float):
+        self._result = result
+        self._latency = latency
+
+    def execute(self):
+        time.sleep(self._latency)
+        return self._result
+
+
+class FakeValues:
+    def __init__(self, latency: float, rows: int):
+        self._latency = latency
+        self._values = [["Наименование компании", "ИНН"]] + [[f"Компания {i}", str(7700000000 + i)] for i in range(rows)]
+
+    def get(self, range: str = "", **kwargs):
+        if range == "B:B":
+            values = [row[1:2] for row in self._values]
+        elif range[:1] == "A" and range[1:2].isdigit():
+            # Точечное чтение строки A{n}:X{n}
+            row = int(range[1:].split(":")[0])
+            values = self._values[row - 1:row]
+        else:
+            values = self._values
+        return FakeRequest({"values": values}, self._latency)
+
+    def update(self, **kwargs):
+        return FakeRequest({}, self._latency)
+
+    def append(self, **kwargs):
+        row = len(self._values) + 1
+        return FakeRequest({"updates": {"updatedRange": f"Sheet1!A{row}:R{row}"}}, self._latency)
+
+    def batchUpdate(self, **kwargs):
+        return FakeRequest({}, self._latency)
+
+
+class FakeSpreadsheets:
+    def __init__(self, latency: float, rows: int):
+        self._latency = latency
+        self._values = FakeValues(latency, rows)
+
+    def values(self):
+        return self._values
+
+    def get(self, **kwargs):
+        return FakeRequest({"sheets": [{"properties": {"sheetId": 0}}]}, self._latency)
+
+    def batchUpdate(self, **kwargs):
+        return FakeRequest({}, self._latency)
+
+
+class FakeService:
+    def __init__(self, latency: float, rows: int):
+        self._spreadsheets = FakeSpreadsheets(latency, rows)
+
+    def spreadsheets(self):
+        return self._spreadsheets
+
+
+def make_service(latency: float, rows: int, inline: bool) -> GoogleSheetsService:
+    class LoadTestSheetsService(GoogleSheetsService):
+        def _initialize_service(self):
+            self._service_factory = lambda: FakeService(latency, rows)
+
+        async def _run(self, func, *args, **kwargs):
+            if inline:
+                return func(*args, **kwargs)
+            return await super()._run(func, *args, **kwargs)
+
+    return LoadTestSheetsService()
+
+
+def _pct(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, int(round(len(ordered) * q)) - 1)]
+
+
+async def run_mode(managers: int, latency: float, rows: int, inline: bool) -> None:
+    gs = make_service(latency, rows, inline)
+    call_data = {"company_name": "ООО Тест", "inn": "7700000001", "comment": "нагрузочный тест", "next_call_date": ""}
+
+    async def save(i: int, arrived: float) -> float:
+        # Задержка от прихода апдейта, а не от старта своей корутины: иначе время,
+        # проведённое в очереди за блокирующими вызовами других хендлеров, не попадает в замер
+        await gs.add_new_call(f"sheet-{i}", call_data)
+        await gs.update_supervisor_sheet(f"Менеджер {i}", call_data)
+        return time.perf_counter() - arrived
+
+    stalls: List[float] = []
+    done = asyncio.Event()
+
+    async def probe():
+        # Имитация других апдейтов: насколько позже запланированного просыпается корутина
+        while not done.is_set():
+            expected = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            stalls.append(max(0.0, time.perf_counter() - expected))
+
+    probe_task = asyncio.create_task(probe())
+    arrived = time.perf_counter()
+    timings = await asyncio.gather(*(save(i, arrived) for i in range(managers)))
+    total = time.perf_counter() - arrived
+    done.set()
+    await probe_task
+    gs.close()
+
+    ms = [t * 1000 for t in timings]
+    lag = [s * 1000 for s in stalls] or [0.0]
+    print(
+        f"{'inline' if inline else 'executor':>8}: managers={managers} total={total:.2f}s "
+        f"latency p50={statistics.median(ms):.0f}ms p95={_pct(ms, 0.95):.0f}ms "
+        f"loop lag p95={_pct(lag, 0.95):.0f}ms max={max(lag):.0f}ms"
+    )
+
+
+async def main_async(managers: int, latency_ms: float, rows: int) -> None:
+    logger.remove()
+    for inline in (True, False):
+        await run_mode(managers, latency_ms / 1000, rows, inline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test GoogleSheetsService with concurrent saves")
+    parser.add_argument("--managers", type=int, default=20, help="Concurrent managers saving a call")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Blocking latency of each Sheets call")
+    parser.add_argument("--rows", type=int, default=500, help="Rows returned by full-range reads")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.managers, args.latency_ms, args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Нагрузочный тест режима webhook (bot/webhook.py): шлёт синтетические обновления Telegram
+(/start, /id, /help от разных пользователей) и печатает updates/sec и перцентили задержек.
+
+Режимы:
+    локальный (по умолчанию) - поднимает в процессе настоящий диспетчер со всеми роутерами,
+        middleware и FSM-хранилищем на отдельной SQLite БД; вызовы Bot API подменены фейковой
+        сессией с задержкой --api-latency. Кроме задержки ответа webhook (ack) измеряется
+        полная обработка: от отправки обновления до ответа бота пользователю (e2e).
+    --url - обстрел уже запущенного развёртывания (например, N воркеров за nginx); только ack.
+        Бот ответит настоящим пользователям с синтетическими id, поэтому только для тестового бота.
+
+Использование:
+    python scripts/load_test_webhook.py
+    python scripts/load_test_webhook.py --updates 5000 --concurrency 100 --api-latency 0.05
+    python scripts/load_test_webhook.py --url http://127.0.0.1:8080/webhook --secret s3cr3t
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("BOT_TOKEN", "123456:LoadTestLoadTestLoadTestLoadTest")
+for _name in ("MANAGER_SHEET_TEMPLATE_ID", "SUPERVISOR_SHEET_ID", "DATANEWTON_API_KEY"):
+    os.environ.setdefault(_name, "bench")
+
+import aiohttp
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message
+from loguru import logger
+
+COMMANDS = ("/start", "/id", "/help")
+FIRST_CHAT_ID = 10_000_000
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети: отвечает через latency секунд и запоминает время ответа в каждый чат."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.answered: Dict[int, float] = {}
+
+    async def make_request(self, bot: Bot, method: Any, timeout: Optional[int] = None) -> Any:
+        await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            self.answered.setdefault(int(method.chat_id), time.perf_counter())
+            return Message(
+                message_id=1,
+                date=datetime.now(),
+                chat=Chat(id=int(method.chat_id), type="private"),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def make_update(update_id: int, chat_id: int) -> Dict[str, Any]:
+    user = {"id": chat_id, "is_bot": False, "first_name": "Load", "username": f"load{chat_id}"}
+    text = COMMANDS[update_id % len(COMMANDS)]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Load"},
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+        },
+    }
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "n=0"
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))] * 1000
+    return (f"n={len(values)} p50={statistics.median(values) * 1000:.1f}ms "
+            f"p95={pick(0.95):.1f}ms p99={pick(0.99):.1f}ms max={values[-1] * 1000:.1f}ms")
+
+
+async def fire(url: str, secret: str, updates: int, concurrency: int) -> Dict[str, Any]:
+    """Отправить updates обновлений не более чем concurrency одновременно."""
+    sent_at: Dict[int, float] = {}
+    acks: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(updates):
+        queue.put_nowait(i)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+
+    async def worker(http: aiohttp.ClientSession) -> None:
+        nonlocal errors
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            chat_id = FIRST_CHAT_ID + i
+            started = time.perf_counter()
+            sent_at[chat_id] = started
+            try:
+                async with http.post(url, json=make_update(i + 1, chat_id), headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            acks.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        await asyncio.gather(*[worker(http) for _ in range(concurrency)])
+    return {"sent_at": sent_at, "acks": acks, "errors": errors, "seconds": time.perf_counter() - started}
+
+
+async def run_local(args) -> None:
+    from aiohttp import web
+    from config import settings
+    from models.database import init_db
+    from bot.webhook import build_webhook_app
+    import main as bot_main
+
+    # Логи бота в консоль только с WARNING, чтобы не мешать замеру
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    await init_db(f"sqlite+aiosqlite:///{args.db_path}")
+
+    session = FakeSession(args.api_latency)
+    bot = Bot(token=settings.bot_token, session=session)
+    dp = bot_main.create_dispatcher()
+    runner = web.AppRunner(build_webhook_app(dp, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    url = f"http://127.0.0.1:{args.port}{settings.webhook_path}"
+    try:
+        result = await fire(url, settings.webhook_secret, args.updates, args.concurrency)
+        # Ждём, пока бот ответит на всё принятое
+        deadline = time.perf_counter() + 60
+        while len(session.answered) < len(result["acks"]) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        processed_in = max(session.answered.values(), default=time.perf_counter()) - min(result["sent_at"].values())
+    finally:
+        await runner.cleanup()  # заодно проверяет дренаж и закрытие FSM
+
+    e2e = [session.answered[chat] - sent for chat, sent in result["sent_at"].items() if chat in session.answered]
+    report(result)
+    print(f"processed: {len(session.answered)}/{args.updates} in {processed_in:.2f}s "
+          f"({len(session.answered) / processed_in:.0f} updates/sec)")
+    print(f"e2e:  {percentiles(e2e)}")
+
+
+def report(result: Dict[str, Any]) -> None:
+    acks = result["acks"]
+    print(f"accepted: {len(acks)} in {result['seconds']:.2f}s ({len(acks) / result['seconds']:.0f} updates/sec), "
+          f"errors: {result['errors']}")
+    print(f"ack:  {percentiles(acks)}")
+
+
+async def main_async(args) -> None:
+    if args.url:
+        report(await fire(args.url, args.secret, args.updates, args.concurrency))
+    else:
+        await run_local(args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the webhook entry point")
+    parser.add_argument("--url", help="Webhook URL of a running deployment (default: local in-process app)")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""), help="X-Telegram-Bot-Api-Secret-Token")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50, help="Parallel HTTP connections")
+    parser.add_argument("--api-latency", type=float, default=0.03, help="Fake Bot API latency, seconds (local mode)")
+    parser.add_argument("--port", type=int, default=18080, help="Port for the local app")
+    parser.add_argument("--db-path", default="./load_test_webhook.db", help="SQLite file for the local app (recreated)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Перепарсить сохранённые ответы DataNewton (таблица datanewton_responses) без обращения к API.
+
+Полезно после изменения логики _extract_company_data / get_finance_data:
+весь конвейер get_full_company_data прогоняется на сохранённых payload'ах.
+
+Использование:
+    python scripts/replay_datanewton_cache.py                 # все ИНН из кэша
+    python scripts/replay_datanewton_cache.py 7707083893 ...  # только указанные ИНН
+"""
+import os
+import sys
+import json
+import asyncio
+
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from loguru import logger
+from sqlalchemy import select
+
+from config import settings
+from models import database
+from models.database import init_db, DataNewtonResponse
+from services.datanewton_api import datanewton_api
+
+
+async def run(inns):
+    await init_db(settings.database_url_effective)
+    if not inns:
+        async with database.AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DataNewtonResponse.inn)
+                .where(DataNewtonResponse.endpoint == "counterparty")
+                .distinct()
+            )
+            inns = [inn for inn in result.scalars().all() if inn]
+    logger.info(f"Replaying {len(inns)} INNs from stored DataNewton responses")
+
+    datanewton_api.replay_only = True
+    for inn in inns:
+        data = await datanewton_api.get_full_company_data(inn)
+        print(json.dumps({"inn": inn, "data": data}, ensure_ascii=False))
+    await datanewton_api.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(sys.argv[1:]))
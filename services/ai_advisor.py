@@ -1,71 +1,186 @@
+import json
 import asyncio
-from datetime import datetime, date
-from typing import List, Optional
+import hashlib
+from datetime import datetime, date, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+import httpx
 from loguru import logger
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
+from models import database
+from models.database import AiHint
+from models.call_history import get_call_history
+from services.datanewton_api import datanewton_api
+from services.hint_context import build_comment_context, clip_to_tokens
+from services.holidays import get_near_holidays
+from services.ttl_cache import TTLCache
 
+_client: Optional[AsyncOpenAI] = None
 
-def _get_openai_client() -> Optional[OpenAI]:
-    """Создаём клиента OpenAI/OpenRouter, если задан ключ. Иначе возвращаем None (модуль будет неактивен)."""
+
+def _get_openai_client() -> Optional[AsyncOpenAI]:
+    """Общий AsyncOpenAI на процесс (пул соединений httpx), если задан ключ. Иначе None (модуль неактивен)."""
+    global _client
+    if _client is not None:
+        return _client
     api_key = settings.openai_api_key
     if not api_key:
         logger.warning("OPENAI_API_KEY is not configured; AI advisor is disabled")
         return None
-    # Если указан кастомный base_url (например, OpenRouter) — используем его
-    if settings.openai_base_url:
-        return OpenAI(api_key=api_key, base_url=settings.openai_base_url)
-    return OpenAI(api_key=api_key)
-
-
-# Статический список праздников (минимальный набор для MVP)
-class Holiday:
-    def __init__(self, month: int, day: int, title: str, tags: Optional[List[str]] = None):
-        self.month = month
-        self.day = day
-        self.title = title
-        self.tags = tags or []
-
-    def date_for_year(self, year: int) -> date:
-        return date(year, self.month, self.day)
-
-
-HOLIDAYS: List[Holiday] = [
-    # Гос праздники
-    Holiday(1, 1, "Новый год"),
-    Holiday(2, 23, "День защитника Отечества"),
-    Holiday(3, 8, "Международный женский день"),
-    Holiday(5, 1, "Праздник Весны и Труда"),
-    Holiday(5, 9, "День Победы"),
-    Holiday(6, 12, "День России"),
-    Holiday(11, 4, "День народного единства"),
-    # Отраслевые (минимальный набор примеров)
-    Holiday(8, 12, "День строителя", tags=["строительство"]),
-    Holiday(8, 2, "День железнодорожника", tags=["транспорт", "жд"]),
-]
-
-
-def get_near_holidays(target: date, window_days: int = 7) -> List[str]:
-    """Вернуть список праздников в окне +/- window_days от заданной даты."""
-    res: List[str] = []
-    year = target.year
-    for h in HOLIDAYS:
-        h_date = h.date_for_year(year)
-        delta = abs((h_date - target).days)
-        if delta <= window_days:
-            res.append(f"{h.title} ({h_date.strftime('%d.%m')})")
-    return res
-
-
-async def generate_ai_notification(
+    # Если указан кастомный base_url (например, OpenRouter или локальный фейковый сервер) — используем его
+    _client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=settings.openai_base_url or None,
+        timeout=settings.openai_timeout,
+        max_retries=settings.openai_max_retries,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_connections,
+            ),
+        ),
+    )
+    return _client
+
+
+async def close_openai_client() -> None:
+    """Закрыть пул соединений (при остановке бота)."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+# Кэш готовых инфоповодов: ключ — хэш всех входных данных промпта (модель, ИНН, история комментариев,
+# показатели, плановая дата, праздники). Изменилось что-то из этого — другой ключ и новая генерация.
+hint_cache = TTLCache(maxsize=settings.ai_hint_cache_max_entries)
+_inflight: Dict[str, "asyncio.Future[str]"] = {}
+# Счётчики с момента запуска: запросов к API и ошибок генерации (для логов прогрева)
+hint_stats = {"generated": 0, "failed": 0}
+
+HINT_TEMPERATURE = 0.6
+HINT_MAX_TOKENS = 600
+
+
+def hint_key(messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    payload = json.dumps(
+        [settings.openai_model, temperature, max_tokens, messages],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _load_hint(key: str) -> Optional[str]:
+    if database.AsyncSessionLocal is None:
+        return None
+    try:
+        async with database.AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(AiHint.text).where(
+                    AiHint.prompt_hash == key,
+                    AiHint.created_at >= datetime.utcnow() - timedelta(seconds=settings.ai_hint_cache_ttl),
+                )
+            )
+            return result.scalar_one_or_none()
+    except Exception as e:
+        logger.warning(f"AI hint DB cache read failed: {e}")
+        return None
+
+
+async def _store_hint(key: str, inn: str, text: str) -> None:
+    if database.AsyncSessionLocal is None:
+        return
+    try:
+        async with database.AsyncSessionLocal() as session:
+            result = await session.execute(select(AiHint).where(AiHint.prompt_hash == key))
+            row = result.scalar_one_or_none()
+            if row is None:
+                row = AiHint(prompt_hash=key)
+                session.add(row)
+            row.inn = inn
+            row.model = settings.openai_model
+            row.text = text
+            row.created_at = datetime.utcnow()
+            await session.commit()
+    except Exception as e:
+        logger.warning(f"AI hint DB cache write failed: {e}")
+
+
+async def _generate_cached(
+    client: AsyncOpenAI, inn: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int
+) -> str:
+    """Ответ модели через кэши: память -> БД -> API. Одинаковые параллельные запросы объединяются в один."""
+    key = hint_key(messages, temperature, max_tokens)
+    cached = hint_cache.get(key)
+    if cached is not None:
+        return cached
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    async def load_or_generate() -> str:
+        text = await _load_hint(key)
+        if text is None:
+            completion = await client.chat.completions.create(
+                model=settings.openai_model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            text = completion.choices[0].message.content.strip()
+            hint_stats["generated"] += 1
+            await _store_hint(key, inn, text)
+        hint_cache.set(key, text, ttl=settings.ai_hint_cache_ttl)
+        return text
+
+    task = asyncio.ensure_future(load_or_generate())
+    _inflight[key] = task
+
+    def _done(t: asyncio.Future) -> None:
+        _inflight.pop(key, None)
+        if not t.cancelled():
+            t.exception()
+
+    task.add_done_callback(_done)
+    return await asyncio.shield(task)
+
+
+def _fallback_text(inn: str, company_name: str, last_call_date: Optional[datetime], last_comment: str, points: List[str]) -> str:
+    last_call_str = last_call_date.strftime("%d.%m.%y") if last_call_date else "неизвестно"
+    return (
+        f"Звонок сегодня\n"
+        f"ИНН: {inn}\n"
+        f"Название: {company_name}\n"
+        f"Последний звонок: {last_call_str} — {last_comment}\n\n"
+        f"Инфоповоды для звонка:\n"
+        + "\n".join(f"{i}. {point}" for i, point in enumerate(points, 1))
+    )
+
+
+def _offline_text(inputs: Dict[str, Any]) -> str:
+    """Фоллбек: простой текст без нейросети."""
+    return _fallback_text(
+        inputs["inn"], inputs["company_name"], inputs.get("last_call_date"), inputs["last_comment"],
+        [
+            "Новости отрасли и региона — модуль AI пока не подключён.",
+            "Праздники ±7 дней — модуль AI пока не подключён.",
+            "Анализ истории общения — модуль AI пока не подключён.",
+        ],
+    )
+
+
+def _hint_prompt(
     *,
     inn: str,
     company_name: str,
     last_comment: str,
     last_call_date: Optional[datetime],
     all_comments: List[str],
+    history_summary: str | None = None,
     okved_code: str | None,
     okved_name: str | None,
     region: str | None,
@@ -81,29 +196,11 @@ async def generate_ai_notification(
     arbitration_open_sum: str | None = None,
     arbitration_last_doc_date: str | None = None,
     planned_call_date: Optional[datetime] = None,
-) -> str:
-    """
-    Сгенерировать полный текст уведомления в формате, который просил заказчик.
-    """
-    client = _get_openai_client()
-    if client is None:
-        # Фоллбек: простой текст без нейросети
-        logger.warning("AI notification requested, but OpenAI client is not configured")
-        last_call_str = last_call_date.strftime("%d.%m.%y") if last_call_date else "неизвестно"
-        return (
-            f"Звонок сегодня\n"
-            f"ИНН: {inn}\n"
-            f"Название: {company_name}\n"
-            f"Последний звонок: {last_call_str} — {last_comment}\n\n"
-            f"Инфоповоды для звонка:\n"
-            f"1. Новости отрасли и региона — модуль AI пока не подключён.\n"
-            f"2. Праздники ±7 дней — модуль AI пока не подключён.\n"
-            f"3. Анализ истории общения — модуль AI пока не подключён."
-        )
-
+) -> Tuple[List[Dict[str, str]], str]:
+    """Сообщения для модели и текст-фоллбек на случай ошибки API."""
     # Дата, относительно которой считаем праздники
     base_date = planned_call_date.date() if planned_call_date else date.today()
-    near_holidays = get_near_holidays(base_date)
+    near_holidays = get_near_holidays(base_date, okved_code=okved_code)
 
     all_comments_joined = "\n".join(all_comments) if all_comments else last_comment
     okved_part = f"{okved_code} — {okved_name}" if okved_code or okved_name else "неизвестно"
@@ -174,37 +271,174 @@ async def generate_ai_notification(
         f"\n"
         f"Последний звонок: {last_call_str} — {last_comment}\n"
         f"\n"
-        f"История комментариев (от старых к новым):\n"
+        + (f"Сводка более ранней истории:\n{history_summary}\n\n" if history_summary else "")
+        + f"История комментариев (от старых к новым):\n"
         f"{all_comments_joined}\n"
     )
 
-    def _call_openai() -> str:
-        completion = client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content},
-            ],
-            temperature=0.6,
-            max_tokens=600,
-        )
-        return completion.choices[0].message.content.strip()
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ]
+    fallback = _fallback_text(
+        inn, company_name, last_call_date, last_comment,
+        [
+            "Общий инфоповод на основе ситуации в отрасли и регионе.",
+            f"Праздники около даты звонка: {holidays_text}.",
+            "Сделайте упор на предыдущие договорённости и аккуратно уточните статус.",
+        ],
+    )
+    return messages, fallback
+
+
+async def generate_ai_notification(*, raise_on_error: bool = False, **inputs: Any) -> str:
+    """
+    Сгенерировать полный текст уведомления в формате, который просил заказчик.
+    Аргументы — как у _hint_prompt (их собирает collect_hint_inputs).
+    raise_on_error=True — ошибка API пробрасывается вместо текста-фоллбека (прогрев считает неудачи).
+    """
+    client = _get_openai_client()
+    if client is None:
+        logger.warning("AI notification requested, but OpenAI client is not configured")
+        return _offline_text(inputs)
 
+    messages, fallback = _hint_prompt(**inputs)
     try:
-        content = await asyncio.to_thread(_call_openai)
-        return content
+        return await _generate_cached(client, inputs["inn"], messages, HINT_TEMPERATURE, HINT_MAX_TOKENS)
     except Exception as e:
+        hint_stats["failed"] += 1
         logger.error(f"Error while calling OpenAI for AI notification: {e}")
-        # Фоллбек при ошибке
-        return (
-            f"Звонок сегодня\n"
-            f"ИНН: {inn}\n"
-            f"Название: {company_name}\n"
-            f"Последний звонок: {last_call_str} — {last_comment}\n\n"
-            f"Инфоповоды для звонка:\n"
-            f"1. Общий инфоповод на основе ситуации в отрасли и регионе.\n"
-            f"2. Праздники около даты звонка: {holidays_text}.\n"
-            f"3. Сделайте упор на предыдущие договорённости и аккуратно уточните статус."
+        if raise_on_error:
+            raise
+        return fallback
+
+
+async def stream_ai_notification(**inputs: Any) -> AsyncIterator[str]:
+    """
+    То же, что generate_ai_notification, но по мере генерации: отдаёт накопленный текст после
+    каждого фрагмента ответа, последним — полный текст. Ответ из кэша отдаётся сразу целиком.
+    """
+    client = _get_openai_client()
+    if client is None:
+        logger.warning("AI notification requested, but OpenAI client is not configured")
+        yield _offline_text(inputs)
+        return
+
+    messages, fallback = _hint_prompt(**inputs)
+    key = hint_key(messages, HINT_TEMPERATURE, HINT_MAX_TOKENS)
+    text = hint_cache.get(key)
+    if text is None and key in _inflight:
+        # Та же подсказка уже генерируется (прогрев или другой запрос) — ждём её
+        try:
+            text = await asyncio.shield(_inflight[key])
+        except Exception:
+            text = fallback
+    if text is None:
+        text = await _load_hint(key)
+        if text is not None:
+            hint_cache.set(key, text, ttl=settings.ai_hint_cache_ttl)
+    if text is not None:
+        yield text
+        return
+
+    # Параллельные запросы с тем же промптом дождутся окончания этого потока
+    future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    text = ""
+    try:
+        stream = await client.chat.completions.create(
+            model=settings.openai_model,
+            messages=messages,
+            temperature=HINT_TEMPERATURE,
+            max_tokens=HINT_MAX_TOKENS,
+            stream=True,
         )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                text += chunk.choices[0].delta.content
+                yield text
+        text = text.strip()
+        if not text:
+            raise ValueError("empty completion")
+        hint_stats["generated"] += 1
+        await _store_hint(key, inputs["inn"], text)
+        hint_cache.set(key, text, ttl=settings.ai_hint_cache_ttl)
+        future.set_result(text)
+        yield text
+    except Exception as e:
+        hint_stats["failed"] += 1
+        logger.error(f"Error while streaming OpenAI AI notification: {e}")
+        _fail_inflight(future, e)
+        yield fallback
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+        # Поток закрыли до конца (например, отмена обработки апдейта)
+        _fail_inflight(future, RuntimeError("AI notification stream aborted"))
+
+
+def _fail_inflight(future: "asyncio.Future[str]", error: Exception) -> None:
+    """Завершить future потоковой генерации ошибкой для тех, кто её ждёт.
+    Исключение сразу помечается полученным (как t.exception() в _generate_cached): обычно ждущих нет,
+    и без этого asyncio пишет «Future exception was never retrieved» на каждый неудачный поток.
+    """
+    if future.done():
+        return
+    future.set_exception(error)
+    future.exception()
+
+
+COMPANY_FIELDS = {
+    "okved_code": "okved",
+    "okved_name": "okved_name",
+    "region": "region",
+    "revenue": "revenue",
+    "revenue_previous": "revenue_previous",
+    "net_profit": "net_profit",
+    "capital": "capital",
+    "assets": "assets",
+    "debit": "debit",
+    "credit": "credit",
+    "gov_contracts": "gov_contracts",
+    "arbitration_open_count": "arbitration_open_count",
+    "arbitration_open_sum": "arbitration_open_sum",
+    "arbitration_last_doc_date": "arbitration_last_doc_date",
+}
 
 
+async def collect_hint_inputs(session: AsyncSession, manager_id: int, inn: str) -> Optional[Dict[str, Any]]:
+    """
+    Аргументы generate_ai_notification по компании: история звонков менеджера + данные DataNewton.
+    None — по ИНН нет истории звонков. Общая для /ai_hint и прогрева, чтобы совпадал ключ кэша.
+    """
+    sessions = await get_call_history(session, manager_id, inn)
+    if not sessions:
+        return None
+
+    last_call = sessions[-1]
+    # Длинная история: последние комментарии дословно, старые — сводкой, в пределах бюджета токенов
+    recent, history_summary = await build_comment_context(
+        _get_openai_client(), manager_id, inn, [s.comment for s in sessions if s.comment]
+    )
+    inputs: Dict[str, Any] = {
+        "inn": inn,
+        "company_name": last_call.company_name or "Не указано",
+        "last_comment": clip_to_tokens(last_call.comment or "Комментарий отсутствует", settings.ai_prompt_history_budget_tokens),
+        "last_call_date": last_call.created_at,
+        "all_comments": recent,
+        "history_summary": history_summary,
+        # В качестве планируемой даты звонка берём next_call_date, если есть, иначе сегодня
+        "planned_call_date": last_call.next_call_date or datetime.now(),
+        **{arg: None for arg in COMPANY_FIELDS},
+    }
+    # Дополнительные данные по компании (ОКВЭД, регион, финансы, арбитражи)
+    try:
+        company_data = await datanewton_api.get_full_company_data(inn)
+        if company_data:
+            for arg, field in COMPANY_FIELDS.items():
+                inputs[arg] = company_data.get(field)
+            if company_data.get("name"):
+                inputs["company_name"] = company_data["name"]
+    except Exception as e:
+        logger.warning(f"[ai_hint] DataNewton lookup failed: {e}")
+    return inputs
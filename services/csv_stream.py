@@ -0,0 +1,165 @@
+import csv
+import codecs
+from typing import AsyncIterator, Dict, List, Optional
+
+
+# Сколько байт собрать до определения кодировки и разделителя
+SNIFF_BYTES = 64 * 1024
+DELIMITERS = (';', ',', '\t')
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """Кодировка по первому куску файла: BOM -> utf-8/utf-16, валидный UTF-8 -> utf-8, иначе cp1251 (выгрузки 1С)."""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # final=False: обрезанный на границе куска многобайтный символ не считается ошибкой
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1251'
+
+
+class _StrictDecoder:
+    """Инкрементальный декодер без подмены символов.
+
+    Кодировка выбирается по первому куску, а выгрузка 1С в cp1251 может начинаться с чистого ASCII
+    и попасть в utf-8. Пока весь прочитанный текст ASCII (в обеих кодировках он одинаков), первая
+    ошибка UTF-8 переключает декодер на cp1251. Если ошибка после настоящего UTF-8 или байт не
+    декодируется и в cp1251 — ValueError: импорт останавливается, а не пишет в таблицу «����».
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        # Переключение ещё возможно: определили utf-8 без BOM и не встретили ни одного не-ASCII байта
+        self._may_switch = encoding == 'utf-8'
+        self._offset = 0
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        buffered = self._decoder.getstate()[0]
+        try:
+            text = self._decoder.decode(data, final)
+        except UnicodeDecodeError as e:
+            # e.object — недекодированный хвост прошлого куска + data
+            if not (self._may_switch and e.object[:e.start].isascii()):
+                raise self._error(e, buffered) from e
+            # Всё декодированное ранее — ASCII, поэтому хвост и кусок целиком заново в cp1251
+            self.encoding = 'cp1251'
+            self._decoder = codecs.getincrementaldecoder('cp1251')()
+            self._may_switch = False
+            try:
+                text = self._decoder.decode(e.object, final)
+            except UnicodeDecodeError as e2:
+                raise self._error(e2, buffered) from e2
+        if self._may_switch and not text.isascii():
+            self._may_switch = False
+        self._offset += len(data)
+        return text
+
+    def _error(self, e: UnicodeDecodeError, buffered: bytes) -> ValueError:
+        position = self._offset - len(buffered) + e.start
+        return ValueError(
+            f"Не удалось прочитать файл в кодировке {self.encoding}: байт 0x{e.object[e.start]:02x} "
+            f"на позиции {position}. Сохраните CSV в UTF-8 или Windows-1251"
+        )
+
+
+def sniff_delimiter(first_line: str) -> str:
+    """Разделитель — самый частый из ; , TAB в первой строке (при равенстве приоритет у ;)."""
+    best = max(DELIMITERS, key=first_line.count)
+    return best if first_line.count(best) else ','
+
+
+class _RecordSplitter:
+    """Режет поток текста на целые CSV-записи.
+
+    Запись заканчивается переводом строки, после которого число кавычек чётное —
+    так переводы строк внутри полей в кавычках не разрывают запись.
+    """
+
+    def __init__(self):
+        self._tail = ""
+        self._record: List[str] = []
+        self._quotes = 0
+
+    def feed(self, text: str, final: bool = False) -> List[str]:
+        parts = (self._tail + text).split('\n')
+        self._tail = "" if final else parts.pop()
+        records = []
+        for i, part in enumerate(parts):
+            line = part if final and i == len(parts) - 1 else part + '\n'
+            if not line:
+                continue
+            self._record.append(line)
+            self._quotes += line.count('"')
+            if self._quotes % 2 == 0:
+                records.append("".join(self._record))
+                self._record = []
+                self._quotes = 0
+        if final and self._record:
+            records.append("".join(self._record))
+            self._record = []
+        return records
+
+
+async def iter_csv_rows(
+    chunks: AsyncIterator[bytes],
+    stats: Optional[Dict[str, object]] = None,
+) -> AsyncIterator[List[str]]:
+    """Потоково разобрать CSV из асинхронного источника байтов.
+
+    Кодировка и разделитель определяются по первым SNIFF_BYTES, дальше текст декодируется
+    инкрементально (строго, см. _StrictDecoder) и строки отдаются по мере поступления. В памяти держится только текущий
+    кусок и незавершённая запись, поэтому расход памяти не зависит от размера файла.
+    В stats (если передан) пишутся encoding, delimiter и bytes_read.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault('bytes_read', 0)
+    head = b""
+    source = chunks.__aiter__()
+    exhausted = False
+    while len(head) < SNIFF_BYTES:
+        try:
+            chunk = await source.__anext__()
+        except StopAsyncIteration:
+            exhausted = True
+            break
+        head += chunk
+        stats['bytes_read'] += len(chunk)
+
+    decoder = _StrictDecoder(sniff_encoding(head))
+    splitter = _RecordSplitter()
+    text = decoder.decode(head, final=exhausted)
+    delimiter = sniff_delimiter(text.split('\n', 1)[0])
+    stats['encoding'] = decoder.encoding
+    stats['delimiter'] = delimiter
+
+    for row in csv.reader(splitter.feed(text, final=exhausted), delimiter=delimiter):
+        yield row
+    if exhausted:
+        return
+    del head, text
+
+    async for chunk in source:
+        stats['bytes_read'] += len(chunk)
+        records = splitter.feed(decoder.decode(chunk))
+        stats['encoding'] = decoder.encoding
+        for row in csv.reader(records, delimiter=delimiter):
+            yield row
+    for row in csv.reader(splitter.feed(decoder.decode(b"", final=True), final=True), delimiter=delimiter):
+        yield row
+
+
+async def iter_chunks(rows: AsyncIterator[List[str]], size: int) -> AsyncIterator[List[List[str]]]:
+    """Сгруппировать строки в пачки не больше size."""
+    batch: List[List[str]] = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
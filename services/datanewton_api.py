@@ -1,7 +1,19 @@
+import json
+import time
+import zlib
+import random
+import asyncio
 import aiohttp
-from typing import Optional, Dict, Any
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, Tuple, Hashable
 from loguru import logger
+from sqlalchemy import select
 from config import settings
+from models import database
+from models.database import DataNewtonResponse
+from services.ttl_cache import TTLCache
+from services.rate_limiter import TokenBucket
 
 
 class DataNewtonAPI:
@@ -11,38 +23,274 @@ class DataNewtonAPI:
         self.headers = {
             "Content-Type": "application/json"
         }
+        # Общая сессия с пулом keep-alive соединений (создаётся лениво или в start())
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Кэш успешных ответов по эндпоинту + ИНН/ОГРН, у каждого блока свой срок жизни
+        self.cache = TTLCache(maxsize=settings.datanewton_cache_max_entries)
+        # Режим воспроизведения: отвечаем только сохранёнными в БД ответами (без сети и без учёта TTL)
+        self.replay_only = False
+        # Запросы в полёте (single-flight): одинаковые параллельные запросы ждут один общий результат
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+        # Общий лимит запросов к API для бота и скриптов
+        self.limiter = TokenBucket(settings.datanewton_rate_limit_rps, settings.datanewton_rate_limit_burst)
+        self.retries = 0
+
+    def _build_session(self) -> aiohttp.ClientSession:
+        """Создать сессию с настроенным коннектором: keep-alive, лимит на хост, DNS-кэш."""
+        connector = aiohttp.TCPConnector(
+            limit=settings.datanewton_pool_limit,
+            limit_per_host=settings.datanewton_pool_limit_per_host,
+            ttl_dns_cache=settings.datanewton_dns_cache_ttl,
+            keepalive_timeout=settings.datanewton_keepalive_timeout,
+        )
+        timeout = aiohttp.ClientTimeout(total=settings.datanewton_request_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Вернуть общую сессию, пересоздав её, если она ещё не открыта или уже закрыта."""
+        if self._session is None or self._session.closed:
+            self._session = self._build_session()
+        return self._session
+
+    async def start(self) -> None:
+        """Открыть пул соединений заранее (вызывается при старте бота)."""
+        await self._get_session()
+        logger.info("DataNewton HTTP session opened")
+
+    async def close(self) -> None:
+        """Закрыть пул соединений (вызывается при остановке бота и в конце скриптов)."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("DataNewton HTTP session closed")
+        self._session = None
+        logger.info(f"DataNewton cache stats: {self.cache.stats()}")
+
+    @staticmethod
+    def _cache_key(path: str, params: Dict[str, Any]) -> Hashable:
+        """Ключ кэша: эндпоинт + параметры запроса (ИНН/ОГРН, фильтры) без API-ключа."""
+        items = []
+        for k, v in sorted(params.items()):
+            if k == "key":
+                continue
+            items.append((k, tuple(v) if isinstance(v, list) else v))
+        return (path, tuple(items))
+
+    @staticmethod
+    def _cache_expires_at(path: str, fetched_at: Optional[float] = None) -> Optional[float]:
+        """Срок годности ответа по блоку (относительно момента получения fetched_at, по умолчанию — сейчас):
+        - counterparty/okpdList (реквизиты, ОКВЭД) — дни
+        - finance — до начала следующего отчётного сезона
+        - governmentContractsStat — сутки
+        - arbitration-cases — часы
+        """
+        now = fetched_at if fetched_at is not None else time.time()
+        if path == "finance":
+            fetched = datetime.fromtimestamp(now)
+            refresh = datetime(fetched.year, settings.datanewton_finance_refresh_month, 1)
+            if refresh <= fetched:
+                refresh = refresh.replace(year=fetched.year + 1)
+            return refresh.timestamp()
+        ttl = {
+            "counterparty": settings.datanewton_cache_profile_ttl,
+            "okpdList": settings.datanewton_cache_profile_ttl,
+            "governmentContractsStat": settings.datanewton_cache_contracts_ttl,
+            "arbitration-cases": settings.datanewton_cache_arbitration_ttl,
+        }.get(path)
+        return now + ttl if ttl else None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "coalesced": self.coalesced, "retries": self.retries}
+
+    @staticmethod
+    def _query_key(cache_key: Hashable) -> str:
+        """Строковое представление параметров запроса для хранения в БД."""
+        _, items = cache_key
+        return "&".join(f"{k}={','.join(v) if isinstance(v, tuple) else v}" for k, v in items)
+
+    async def _load_stored(self, path: str, cache_key: Hashable) -> Optional[Tuple[Tuple[int, Any, str], float]]:
+        """Достать сохранённый ответ из БД. Возвращает ((status, data, text), expires_at) или None.
+        В обычном режиме просроченные записи игнорируются, в replay_only — отдаются всегда.
+        """
+        if database.AsyncSessionLocal is None:
+            return None
+        try:
+            async with database.AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(DataNewtonResponse).where(
+                        DataNewtonResponse.endpoint == path,
+                        DataNewtonResponse.query_key == self._query_key(cache_key),
+                    )
+                )
+                row = result.scalar_one_or_none()
+            if row is None:
+                return None
+            fetched_at = row.fetched_at.replace(tzinfo=timezone.utc).timestamp()
+            expires_at = self._cache_expires_at(path, fetched_at)
+            if not self.replay_only and (not expires_at or expires_at <= time.time()):
+                return None
+            text = zlib.decompress(row.payload).decode("utf-8")
+            return (200, json.loads(text), text), expires_at or 0
+        except Exception as e:
+            logger.warning(f"DataNewton DB cache read failed for {path}: {e}")
+            return None
+
+    async def _store(self, path: str, cache_key: Hashable, params: Dict[str, Any], text: str) -> None:
+        """Сохранить сырой ответ в БД (upsert по endpoint + query_key)."""
+        if database.AsyncSessionLocal is None:
+            return
+        try:
+            payload = zlib.compress(text.encode("utf-8"))
+            query_key = self._query_key(cache_key)
+            async with database.AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(DataNewtonResponse).where(
+                        DataNewtonResponse.endpoint == path,
+                        DataNewtonResponse.query_key == query_key,
+                    )
+                )
+                row = result.scalar_one_or_none()
+                if row is None:
+                    row = DataNewtonResponse(endpoint=path, query_key=query_key)
+                    session.add(row)
+                row.inn = params.get("inn")
+                row.ogrn = params.get("ogrn")
+                row.payload = payload
+                row.fetched_at = datetime.utcnow()
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"DataNewton DB cache write failed for {path}: {e}")
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> Tuple[int, Any, str]:
+        """GET-запрос к DataNewton через общую сессию.
+        Возвращает (HTTP статус, распарсенный JSON или None, сырой текст ответа).
+        Порядок: кэш в памяти -> сохранённые ответы в БД -> сеть.
+        Успешные ответы кэшируются в памяти и в БД (см. _cache_expires_at).
+        Одинаковые параллельные запросы (эндпоинт + ИНН/ОГРН) объединяются в один.
+        """
+        cache_key = self._cache_key(path, params)
+        if settings.datanewton_cache_enabled and not self.replay_only:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        task = asyncio.ensure_future(self._load_or_fetch(path, cache_key, params))
+        self._inflight[cache_key] = task
+
+        def _done(t: asyncio.Future) -> None:
+            self._inflight.pop(cache_key, None)
+            # Забираем исключение, даже если все ожидающие были отменены
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_done)
+        # shield: отмена одного из ожидающих не должна обрывать общий запрос для остальных
+        return await asyncio.shield(task)
+
+    async def _load_or_fetch(self, path: str, cache_key: Hashable, params: Dict[str, Any]) -> Tuple[int, Any, str]:
+        """Сохранённый ответ из БД или сетевой запрос; результат кладётся в кэши."""
+        if settings.datanewton_db_cache_enabled or self.replay_only:
+            stored = await self._load_stored(path, cache_key)
+            if stored is not None:
+                response, expires_at = stored
+                if settings.datanewton_cache_enabled and not self.replay_only:
+                    self.cache.set(cache_key, response, expires_at=expires_at)
+                return response
+            if self.replay_only:
+                return 404, None, "not stored"
+
+        status, data, text = await self._fetch(path, params)
+        if status == 200:
+            if settings.datanewton_cache_enabled:
+                expires_at = self._cache_expires_at(path)
+                if expires_at:
+                    self.cache.set(cache_key, (status, data, text), expires_at=expires_at)
+            if settings.datanewton_db_cache_enabled:
+                await self._store(path, cache_key, params, text)
+        return status, data, text
+
+    @staticmethod
+    def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+        """Пауза перед повтором: Retry-After от сервера, иначе экспоненциальный backoff с jitter."""
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.datanewton_retry_max_delay)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(max(delay, 0.0), settings.datanewton_retry_max_delay)
+                except Exception:
+                    pass
+        backoff = min(settings.datanewton_retry_max_delay, settings.datanewton_retry_base_delay * (2 ** attempt))
+        return random.uniform(backoff / 2, backoff)
+
+    async def _fetch(self, path: str, params: Dict[str, Any]) -> Tuple[int, Any, str]:
+        """Сетевой запрос без кэша: с ограничением частоты и повторами на 429/5xx и сетевых ошибках."""
+        url = f"{self.base_url}/{path}"
+        max_retries = settings.datanewton_max_retries
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            session = await self._get_session()
+            try:
+                async with session.get(url, params=params) as response:
+                    text = await response.text()
+                    retryable = response.status == 429 or response.status >= 500
+                    if not retryable or attempt >= max_retries:
+                        data = None
+                        if response.status == 200:
+                            data = await response.json(content_type=None)
+                        return response.status, data, text
+                    delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+                    logger.warning(f"DataNewton {path} HTTP {response.status}, retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= max_retries:
+                    raise
+                delay = self._retry_delay(attempt, None)
+                logger.warning(f"DataNewton {path} request failed ({e!r}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
     
+    def _counterparty_params(self, inn: str) -> Dict[str, Any]:
+        return {
+            "key": self.api_key,
+            "inn": inn,
+            "filters": ["ADDRESS_BLOCK", "MANAGER_BLOCK", "OKVED_BLOCK", "CONTACT_BLOCK", 
+                       "WORKERS_COUNT_BLOCK", "NEGATIVE_LISTS_BLOCK"]
+        }
+
+    def is_cached(self, inn: str) -> bool:
+        """Реквизиты компании уже есть в кэше в памяти (get_full_company_data не пойдёт за ними в сеть)."""
+        return settings.datanewton_cache_enabled and self._cache_key("counterparty", self._counterparty_params(inn)) in self.cache
+
     async def get_company_by_inn(self, inn: str) -> Optional[Dict[str, Any]]:
         """
         Получить данные компании по ИНН
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/counterparty"
-                params = {
-                    "key": self.api_key,
-                    "inn": inn,
-                    "filters": ["ADDRESS_BLOCK", "MANAGER_BLOCK", "OKVED_BLOCK", "CONTACT_BLOCK", 
-                               "WORKERS_COUNT_BLOCK", "NEGATIVE_LISTS_BLOCK"]
-                }
-                
-                logger.info(f"DataNewton request: GET {url} with params: {params}")
+            params = self._counterparty_params(inn)
+            
+            logger.info(f"DataNewton request: GET {self.base_url}/counterparty with params: {params}")
+            
+            status, data, response_text = await self._request("counterparty", params)
+            logger.info(f"DataNewton response status: {status}")
+            
+            if status == 200:
+                logger.info(f"DataNewton data received for INN {inn}")
+                result = self._extract_company_data(data)
+                if result:
+                    logger.info(f"Company found: {result.get('name')}")
+                return result
+            else:
+                logger.error(f"DataNewton API error: {status}, response: {response_text}")
+                return None
                 
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    response_text = await response.text()
-                    logger.info(f"DataNewton response status: {response.status}")
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info(f"DataNewton data received for INN {inn}")
-                        result = self._extract_company_data(data)
-                        if result:
-                            logger.info(f"Company found: {result.get('name')}")
-                        return result
-                    else:
-                        logger.error(f"DataNewton API error: {response.status}, response: {response_text}")
-                        return None
-                        
         except Exception as e:
             logger.error(f"Error fetching company data: {e}")
             return None
@@ -133,145 +381,142 @@ class DataNewtonAPI:
         Берём 2024, fallback 2023.
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/finance"
-                params = {
-                    "key": self.api_key,
-                    "inn": inn
-                }
+            params = {
+                "key": self.api_key,
+                "inn": inn
+            }
+            
+            status, data, _ = await self._request("finance", params)
+            if status == 200:
                 
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        # Логируем что пришло от API
-                        logger.info(f"Finance API response keys: {list(data.keys())}")
-                        
-                        # Если только available_count - значит данных нет в ответе
-                        if "available_count" in data and len(data) == 1:
-                            logger.warning(f"Finance API returns only available_count - data not available on current tariff")
-                            return {"revenue": "", "revenue_previous": "", "assets": "", "debit": "", "credit": ""}
-                        
-                        # Извлекаем выручку из отчетности
-                        revenue = ""
-                        revenue_previous = ""
-                        net_profit = ""
-                        assets = ""
-                        debit = ""
-                        credit = ""
-                        capital_bal = ""
-                        
-                        # Получаем финансовые результаты (строка 2110 - выручка)
-                        fin_results = data.get("fin_results", {})
-                        if fin_results:
-                            indicators = fin_results.get("indicators", [])
-
-                            def extract_year_sums(ind_list, name_keywords, code_values):
-                                """Вернуть (val_2024, val_2023) для нужного показателя."""
-                                val_2024 = ""
-                                val_2023 = ""
-                                for indicator in ind_list:
-                                    indicator_name = (indicator.get("name") or "").lower()
-                                    indicator_code = str(indicator.get("code") or "")
-                                    if indicator_code in code_values or any(k in indicator_name for k in name_keywords):
-                                        sum_data = indicator.get("sum", {}) or {}
-                                        if "2024" in sum_data and sum_data["2024"] not in (None, ""):
-                                            v = sum_data["2024"]
-                                            val_2024 = str(int(v)) if isinstance(v, (int, float)) else str(v)
-                                        if "2023" in sum_data and sum_data["2023"] not in (None, ""):
-                                            v = sum_data["2023"]
-                                            val_2023 = str(int(v)) if isinstance(v, (int, float)) else str(v)
-                                        break
-                                return val_2024, val_2023
-
-                            # Выручка (строка 2110)
-                            revenue, revenue_previous = extract_year_sums(
-                                indicators,
-                                name_keywords=["выручка"],
-                                code_values=["2110"],
-                            )
-                            logger.info(f"Revenue 2024: {revenue}, Revenue 2023: {revenue_previous}")
-
-                            # Чистая прибыль (строка 2400)
-                            net_profit_2024, _ = extract_year_sums(
-                                indicators,
-                                name_keywords=["чистая прибыль"],
-                                code_values=["2400"],
-                            )
-                            net_profit = net_profit_2024
-
-                        # Баланс: основные средства (1150), дебиторка (1230), кредиторка (1520)
-                        balances = data.get("balances", {})
-                        if balances:
-                            # Рекурсивно соберём все узлы с полями name/code/sum из любых вложенных структур
-                            collected: list[dict] = []
-                            def walk(node):
-                                if isinstance(node, dict):
-                                    # Если это узел показателя
-                                    if any(k in node for k in ("name", "code", "sum")):
-                                        collected.append(node)
-                                    # Обойти indicators
-                                    inds = node.get("indicators")
-                                    if isinstance(inds, list):
-                                        for it in inds:
-                                            walk(it)
-                                    # Обойти childrenMap
-                                    ch = node.get("childrenMap")
-                                    if isinstance(ch, dict):
-                                        for _, v in ch.items():
-                                            walk(v)
-                                    # Обойти вложенные объекты (assets/liabilities и др.)
-                                    for k, v in node.items():
-                                        if isinstance(v, (dict, list)) and k not in ("indicators", "childrenMap"):
-                                            walk(v)
-                                elif isinstance(node, list):
-                                    for it in node:
-                                        walk(it)
-                            
-                            walk(balances)
-
-                            def extract_sum_from_nodes(nodes, names_or_codes):
-                                for nd in nodes:
-                                    name = (nd.get("name") or "").lower()
-                                    code = str(nd.get("code") or "")
-                                    if (code in names_or_codes) or any((not key.isdigit()) and (key.lower() in name) for key in names_or_codes):
-                                        sums = nd.get("sum") or {}
-                                        val = sums.get("2024")
-                                        if val is None:
-                                            val = sums.get("2023")
-                                        if isinstance(val, (int, float)):
-                                            return str(int(val))
-                                        if val not in (None, ""):
-                                            return str(val)
-                                return ""
-
-                            assets = extract_sum_from_nodes(collected, ["1150", "Основные средства"])
-                            debit = extract_sum_from_nodes(collected, ["1230", "Дебиторская задолженность"])
-                            credit = extract_sum_from_nodes(collected, ["1520", "Кредиторская задолженность"])
-                            # 1300 Капитал и резервы
-                            capital_bal = extract_sum_from_nodes(collected, ["1300", "Капитал и резервы"])
-                            logger.info(f"Balances parsed (walk): assets={assets}, debit={debit}, credit={credit}")
-                        
-                        return {
-                            "revenue": revenue,
-                            "revenue_previous": revenue_previous,
-                            "net_profit": net_profit,
-                            "capital": capital_bal,
-                            "assets": assets,
-                            "debit": debit,
-                            "credit": credit
-                        }
-                    else:
-                        logger.warning(f"Finance API returned status {response.status}")
-                    return {
-                        "revenue": "",
-                        "revenue_previous": "",
-                        "net_profit": "",
-                        "capital": "",
-                        "assets": "",
-                        "debit": "",
-                        "credit": ""
-                    }
+                # Логируем что пришло от API
+                logger.info(f"Finance API response keys: {list(data.keys())}")
+                
+                # Если только available_count - значит данных нет в ответе
+                if "available_count" in data and len(data) == 1:
+                    logger.warning(f"Finance API returns only available_count - data not available on current tariff")
+                    return {"revenue": "", "revenue_previous": "", "assets": "", "debit": "", "credit": ""}
+                
+                # Извлекаем выручку из отчетности
+                revenue = ""
+                revenue_previous = ""
+                net_profit = ""
+                assets = ""
+                debit = ""
+                credit = ""
+                capital_bal = ""
+                
+                # Получаем финансовые результаты (строка 2110 - выручка)
+                fin_results = data.get("fin_results", {})
+                if fin_results:
+                    indicators = fin_results.get("indicators", [])
+
+                    def extract_year_sums(ind_list, name_keywords, code_values):
+                        """Вернуть (val_2024, val_2023) для нужного показателя."""
+                        val_2024 = ""
+                        val_2023 = ""
+                        for indicator in ind_list:
+                            indicator_name = (indicator.get("name") or "").lower()
+                            indicator_code = str(indicator.get("code") or "")
+                            if indicator_code in code_values or any(k in indicator_name for k in name_keywords):
+                                sum_data = indicator.get("sum", {}) or {}
+                                if "2024" in sum_data and sum_data["2024"] not in (None, ""):
+                                    v = sum_data["2024"]
+                                    val_2024 = str(int(v)) if isinstance(v, (int, float)) else str(v)
+                                if "2023" in sum_data and sum_data["2023"] not in (None, ""):
+                                    v = sum_data["2023"]
+                                    val_2023 = str(int(v)) if isinstance(v, (int, float)) else str(v)
+                                break
+                        return val_2024, val_2023
+
+                    # Выручка (строка 2110)
+                    revenue, revenue_previous = extract_year_sums(
+                        indicators,
+                        name_keywords=["выручка"],
+                        code_values=["2110"],
+                    )
+                    logger.info(f"Revenue 2024: {revenue}, Revenue 2023: {revenue_previous}")
+
+                    # Чистая прибыль (строка 2400)
+                    net_profit_2024, _ = extract_year_sums(
+                        indicators,
+                        name_keywords=["чистая прибыль"],
+                        code_values=["2400"],
+                    )
+                    net_profit = net_profit_2024
+
+                # Баланс: основные средства (1150), дебиторка (1230), кредиторка (1520)
+                balances = data.get("balances", {})
+                if balances:
+                    # Рекурсивно соберём все узлы с полями name/code/sum из любых вложенных структур
+                    collected: list[dict] = []
+                    def walk(node):
+                        if isinstance(node, dict):
+                            # Если это узел показателя
+                            if any(k in node for k in ("name", "code", "sum")):
+                                collected.append(node)
+                            # Обойти indicators
+                            inds = node.get("indicators")
+                            if isinstance(inds, list):
+                                for it in inds:
+                                    walk(it)
+                            # Обойти childrenMap
+                            ch = node.get("childrenMap")
+                            if isinstance(ch, dict):
+                                for _, v in ch.items():
+                                    walk(v)
+                            # Обойти вложенные объекты (assets/liabilities и др.)
+                            for k, v in node.items():
+                                if isinstance(v, (dict, list)) and k not in ("indicators", "childrenMap"):
+                                    walk(v)
+                        elif isinstance(node, list):
+                            for it in node:
+                                walk(it)
+                    
+                    walk(balances)
+
+                    def extract_sum_from_nodes(nodes, names_or_codes):
+                        for nd in nodes:
+                            name = (nd.get("name") or "").lower()
+                            code = str(nd.get("code") or "")
+                            if (code in names_or_codes) or any((not key.isdigit()) and (key.lower() in name) for key in names_or_codes):
+                                sums = nd.get("sum") or {}
+                                val = sums.get("2024")
+                                if val is None:
+                                    val = sums.get("2023")
+                                if isinstance(val, (int, float)):
+                                    return str(int(val))
+                                if val not in (None, ""):
+                                    return str(val)
+                        return ""
+
+                    assets = extract_sum_from_nodes(collected, ["1150", "Основные средства"])
+                    debit = extract_sum_from_nodes(collected, ["1230", "Дебиторская задолженность"])
+                    credit = extract_sum_from_nodes(collected, ["1520", "Кредиторская задолженность"])
+                    # 1300 Капитал и резервы
+                    capital_bal = extract_sum_from_nodes(collected, ["1300", "Капитал и резервы"])
+                    logger.info(f"Balances parsed (walk): assets={assets}, debit={debit}, credit={credit}")
+                
+                return {
+                    "revenue": revenue,
+                    "revenue_previous": revenue_previous,
+                    "net_profit": net_profit,
+                    "capital": capital_bal,
+                    "assets": assets,
+                    "debit": debit,
+                    "credit": credit
+                }
+            else:
+                logger.warning(f"Finance API returned status {status}")
+            return {
+                "revenue": "",
+                "revenue_previous": "",
+                "net_profit": "",
+                "capital": "",
+                "assets": "",
+                "debit": "",
+                "credit": ""
+            }
         except Exception as e:
             logger.error(f"Error fetching finance data: {e}")
             return {
@@ -291,44 +536,40 @@ class DataNewtonAPI:
                 logger.warning("OGRN required for government contracts")
                 return ""
                 
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/governmentContractsStat"
-                params = {
-                    "key": self.api_key,
-                    "ogrn": ogrn,
-                    "type": "ALL"  # Все типы контрактов
-                }
+            params = {
+                "key": self.api_key,
+                "ogrn": ogrn,
+                "type": "ALL"  # Все типы контрактов
+            }
+            
+            logger.info(f"Government contracts request: GET {self.base_url}/governmentContractsStat with params: {params}")
+            
+            status, data, response_text = await self._request("governmentContractsStat", params)
+            logger.info(f"Government contracts response status: {status}")
+            
+            if status == 200:
+                logger.debug(f"Government contracts response keys: {list(data.keys())}")
                 
-                logger.info(f"Government contracts request: GET {url} with params: {params}")
+                # Суммируем все контракты по годам (из suppliers_stat и customers_stat)
+                total_sum = 0
                 
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    response_text = await response.text()
-                    logger.info(f"Government contracts response status: {response.status}")
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.debug(f"Government contracts response keys: {list(data.keys())}")
-                        
-                        # Суммируем все контракты по годам (из suppliers_stat и customers_stat)
-                        total_sum = 0
-                        
-                        # Компания как поставщик
-                        suppliers_stat = data.get("suppliers_stat", {}).get("stat", [])
-                        if suppliers_stat:
-                            total_sum += sum(item.get("sum", 0) for item in suppliers_stat)
-                        
-                        # Компания как заказчик
-                        customers_stat = data.get("customers_stat", {}).get("stat", [])
-                        if customers_stat:
-                            total_sum += sum(item.get("sum", 0) for item in customers_stat)
-                        
-                        if total_sum:
-                            logger.info(f"Total government contracts sum: {total_sum}")
-                            return str(int(total_sum))
-                        return ""
-                    else:
-                        logger.warning(f"Government contracts API returned status {response.status}: {response_text}")
-                        return ""
+                # Компания как поставщик
+                suppliers_stat = data.get("suppliers_stat", {}).get("stat", [])
+                if suppliers_stat:
+                    total_sum += sum(item.get("sum", 0) for item in suppliers_stat)
+                
+                # Компания как заказчик
+                customers_stat = data.get("customers_stat", {}).get("stat", [])
+                if customers_stat:
+                    total_sum += sum(item.get("sum", 0) for item in customers_stat)
+                
+                if total_sum:
+                    logger.info(f"Total government contracts sum: {total_sum}")
+                    return str(int(total_sum))
+                return ""
+            else:
+                logger.warning(f"Government contracts API returned status {status}: {response_text}")
+                return ""
         except Exception as e:
             logger.error(f"Error fetching government contracts: {e}")
             return ""
@@ -338,57 +579,53 @@ class DataNewtonAPI:
         Возвращает dict: { total_sum, top_okpd2_code, top_okpd2_name }
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/governmentContractsStat"
-                params = {"key": self.api_key, "type": "ALL"}
-                if ogrn:
-                    params["ogrn"] = ogrn
-                elif inn:
-                    params["inn"] = inn
-                
-                logger.info(f"GovContractsStat request: GET {url} with params: {params}")
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    raw_text = await response.text()
-                    if response.status != 200:
-                        logger.warning(f"governmentContractsStat HTTP {response.status}: {raw_text}")
-                        return {"total_sum": "", "top_okpd2_code": "", "top_okpd2_name": ""}
-                    data = await response.json()
-
-                    total_sum = 0
-                    suppliers_stat = data.get("suppliers_stat", {}).get("stat", [])
-                    if suppliers_stat:
-                        total_sum += sum(item.get("sum", 0) for item in suppliers_stat)
-                    customers_stat = data.get("customers_stat", {}).get("stat", [])
-                    if customers_stat:
-                        total_sum += sum(item.get("sum", 0) for item in customers_stat)
-                    if not total_sum:
-                        generic = data.get("stat", []) or data.get("data", []) or []
-                        if isinstance(generic, list):
-                            total_sum = sum(item.get("sum", 0) for item in generic if isinstance(item, dict))
-
-                    # Находим топ ОКПД2 по сумме
-                    candidates = []
-                    if suppliers_stat:
-                        candidates.extend(suppliers_stat)
-                    if customers_stat:
-                        candidates.extend(customers_stat)
-                    if not candidates:
-                        candidates = data.get("stat", []) or data.get("data", []) or []
-
-                    best = None
-                    for it in candidates:
-                        if not isinstance(it, dict):
-                            continue
-                        code = it.get("okpd2_code") or it.get("okpd2")
-                        if not code:
-                            continue
-                        s = it.get("sum", 0) or 0
-                        if best is None or s > best.get("sum", 0):
-                            best = {"code": code, "name": it.get("okpd2_name") or it.get("okpd2_title") or "", "sum": s}
-
-                    return {
-                        "total_sum": str(int(total_sum)) if total_sum else "",
-                        "top_okpd2_code": (best or {}).get("code", ""),
+            params = {"key": self.api_key, "type": "ALL"}
+            if ogrn:
+                params["ogrn"] = ogrn
+            elif inn:
+                params["inn"] = inn
+            
+            logger.info(f"GovContractsStat request: GET {self.base_url}/governmentContractsStat with params: {params}")
+            status, data, raw_text = await self._request("governmentContractsStat", params)
+            if status != 200:
+                logger.warning(f"governmentContractsStat HTTP {status}: {raw_text}")
+                return {"total_sum": "", "top_okpd2_code": "", "top_okpd2_name": ""}
+
+            total_sum = 0
+            suppliers_stat = data.get("suppliers_stat", {}).get("stat", [])
+            if suppliers_stat:
+                total_sum += sum(item.get("sum", 0) for item in suppliers_stat)
+            customers_stat = data.get("customers_stat", {}).get("stat", [])
+            if customers_stat:
+                total_sum += sum(item.get("sum", 0) for item in customers_stat)
+            if not total_sum:
+                generic = data.get("stat", []) or data.get("data", []) or []
+                if isinstance(generic, list):
+                    total_sum = sum(item.get("sum", 0) for item in generic if isinstance(item, dict))
+
+            # Находим топ ОКПД2 по сумме
+            candidates = []
+            if suppliers_stat:
+                candidates.extend(suppliers_stat)
+            if customers_stat:
+                candidates.extend(customers_stat)
+            if not candidates:
+                candidates = data.get("stat", []) or data.get("data", []) or []
+
+            best = None
+            for it in candidates:
+                if not isinstance(it, dict):
+                    continue
+                code = it.get("okpd2_code") or it.get("okpd2")
+                if not code:
+                    continue
+                s = it.get("sum", 0) or 0
+                if best is None or s > best.get("sum", 0):
+                    best = {"code": code, "name": it.get("okpd2_name") or it.get("okpd2_title") or "", "sum": s}
+
+            return {
+                "total_sum": str(int(total_sum)) if total_sum else "",
+                "top_okpd2_code": (best or {}).get("code", ""),
                         "top_okpd2_name": (best or {}).get("name", ""),
                     }
         except Exception as e:
@@ -400,26 +637,22 @@ class DataNewtonAPI:
         Документация: /v1/okpdList (inn или ogrн, любой из них).
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/okpdList"
-                params: Dict[str, Any] = {"key": self.api_key}
-                if inn:
-                    params["inn"] = inn
-                if ogrn and "inn" not in params:
-                    params["ogrn"] = ogrn
-                async with session.get(url, headers=self.headers, params=params) as resp:
-                    raw_text = await resp.text()
-                    if resp.status != 200:
-                        logger.warning(f"okpdList HTTP {resp.status}: {raw_text}")
-                        return {"code": "", "name": ""}
-                    data = await resp.json()
-                    items = data.get("data", []) if isinstance(data, dict) else []
-                    if not items:
-                        return {"code": "", "name": ""}
-                    first = items[0] or {}
-                    code = first.get("okpd2_code") or first.get("okpd_code") or ""
-                    name = first.get("okpd2_name") or first.get("okpd_name") or ""
-                    return {"code": code, "name": name}
+            params: Dict[str, Any] = {"key": self.api_key}
+            if inn:
+                params["inn"] = inn
+            if ogrn and "inn" not in params:
+                params["ogrn"] = ogrn
+            status, data, raw_text = await self._request("okpdList", params)
+            if status != 200:
+                logger.warning(f"okpdList HTTP {status}: {raw_text}")
+                return {"code": "", "name": ""}
+            items = data.get("data", []) if isinstance(data, dict) else []
+            if not items:
+                return {"code": "", "name": ""}
+            first = items[0] or {}
+            code = first.get("okpd2_code") or first.get("okpd_code") or ""
+            name = first.get("okpd2_name") or first.get("okpd_name") or ""
+            return {"code": code, "name": name}
         except Exception as e:
             logger.error(f"Error fetching okpdList: {e}")
             return {"code": "", "name": ""}
@@ -427,34 +660,30 @@ class DataNewtonAPI:
     async def get_arbitration_data(self, inn: str) -> str:
         """Получить данные по арбитражным делам (открытые дела)"""
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/arbitration-cases"
-                params = {
-                    "key": self.api_key,
-                    "inn": inn,
-                    "status": "OPEN",  # Открытые дела
-                    "limit": 1000  # Максимум
-                }
-                
-                logger.info(f"Arbitration request: GET {url} with params: {params}")
+            params = {
+                "key": self.api_key,
+                "inn": inn,
+                "status": "OPEN",  # Открытые дела
+                "limit": 1000  # Максимум
+            }
+            
+            logger.info(f"Arbitration request: GET {self.base_url}/arbitration-cases with params: {params}")
+            
+            status, data, response_text = await self._request("arbitration-cases", params)
+            logger.info(f"Arbitration response status: {status}")
+            
+            if status == 200:
+                logger.debug(f"Arbitration response keys: {list(data.keys())}")
                 
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    response_text = await response.text()
-                    logger.info(f"Arbitration response status: {response.status}")
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.debug(f"Arbitration response keys: {list(data.keys())}")
-                        
-                        # Получаем количество дел (используем правильный ключ)
-                        total_cases = data.get("total_cases", 0)
-                        if total_cases:
-                            logger.info(f"Found {total_cases} open arbitration cases for INN {inn}")
-                            return str(total_cases)
-                        return "0"
-                    else:
-                        logger.warning(f"Arbitration API returned status {response.status}: {response_text}")
-                        return ""
+                # Получаем количество дел (используем правильный ключ)
+                total_cases = data.get("total_cases", 0)
+                if total_cases:
+                    logger.info(f"Found {total_cases} open arbitration cases for INN {inn}")
+                    return str(total_cases)
+                return "0"
+            else:
+                logger.warning(f"Arbitration API returned status {status}: {response_text}")
+                return ""
         except Exception as e:
             logger.error(f"Error fetching arbitration data: {e}")
             return ""
@@ -462,115 +691,141 @@ class DataNewtonAPI:
     async def get_arbitration_stats(self, inn: str) -> Dict[str, Any]:
         """Вернуть метрики по арбитражам: open_count, open_sum, last_doc_date (по открытым)."""
         try:
-            async with aiohttp.ClientSession() as session:
-                # Открытые дела
-                url = f"{self.base_url}/arbitration-cases"
-                params_open = {"key": self.api_key, "inn": inn, "status": "OPEN", "limit": 1000, "company_role": "RESPONDENT"}
-                async with session.get(url, headers=self.headers, params=params_open) as resp_open:
-                    data_open = await resp_open.json() if resp_open.status == 200 else {}
-                open_list = data_open.get("data", []) if isinstance(data_open, dict) else []
-                open_count = data_open.get("total_cases", len(open_list)) or 0
-                open_sum = 0
-                last_doc_ts = 0
-                for case in open_list:
-                    try:
-                        s = case.get("sum")
-                        if isinstance(s, (int, float)):
-                            open_sum += s
-                        ts = case.get("last_document_date")
-                        if isinstance(ts, (int, float)):
-                            last_doc_ts = max(last_doc_ts, int(ts))
-                    except Exception:
-                        continue
-
-                # Преобразуем дату
-                last_doc_date = ""
-                if last_doc_ts:
-                    from datetime import datetime
-                    try:
-                        # last_document_date приходит в мс
-                        dt = datetime.fromtimestamp(last_doc_ts / 1000)
-                        last_doc_date = dt.strftime("%d.%m.%y")
-                    except Exception:
-                        last_doc_date = ""
+            # Открытые дела
+            params_open = {"key": self.api_key, "inn": inn, "status": "OPEN", "limit": 1000, "company_role": "RESPONDENT"}
+            status, data_open, _ = await self._request("arbitration-cases", params_open)
+            if status != 200:
+                data_open = {}
+            open_list = data_open.get("data", []) if isinstance(data_open, dict) else []
+            open_count = data_open.get("total_cases", len(open_list)) or 0
+            open_sum = 0
+            last_doc_ts = 0
+            for case in open_list:
+                try:
+                    s = case.get("sum")
+                    if isinstance(s, (int, float)):
+                        open_sum += s
+                    ts = case.get("last_document_date")
+                    if isinstance(ts, (int, float)):
+                        last_doc_ts = max(last_doc_ts, int(ts))
+                except Exception:
+                    continue
 
-                return {
-                    "arbitration_open_count": str(open_count),
-                    "arbitration_open_sum": str(int(open_sum)) if open_sum else "0",
-                    "arbitration_last_doc_date": last_doc_date,
-                }
+            # Преобразуем дату
+            last_doc_date = ""
+            if last_doc_ts:
+                from datetime import datetime
+                try:
+                    # last_document_date приходит в мс
+                    dt = datetime.fromtimestamp(last_doc_ts / 1000)
+                    last_doc_date = dt.strftime("%d.%m.%y")
+                except Exception:
+                    last_doc_date = ""
+
+            return {
+                "arbitration_open_count": str(open_count),
+                "arbitration_open_sum": str(int(open_sum)) if open_sum else "0",
+                "arbitration_last_doc_date": last_doc_date,
+            }
         except Exception as e:
             logger.error(f"Error fetching arbitration stats: {e}")
             return {"arbitration_open_count": "0", "arbitration_open_sum": "0", "arbitration_last_doc_date": ""}
     
-    async def get_full_company_data(self, inn: str) -> Optional[Dict[str, Any]]:
-        """Получить полные данные компании включая финансы и контракты"""
-        # Получаем основную информацию
-        company_data = await self.get_company_by_inn(inn)
-        if not company_data:
-            return None
-        
-        # Параллельно получаем дополнительные данные (может быть недоступно на бесплатном тарифе)
-        try:
-            finance_data = await self.get_finance_data(inn)
-            company_data.update({
-                "revenue": finance_data.get("revenue", ""),
-                "revenue_previous": finance_data.get("revenue_previous", ""),
-                "net_profit": finance_data.get("net_profit", ""),
-                # Капитал и резервы теперь берём из баланса (1300), а не charter_capital
-                "capital": finance_data.get("capital", ""),
-                "assets": finance_data.get("assets", ""),
-                "debit": finance_data.get("debit", ""),
-                "credit": finance_data.get("credit", ""),
-            })
-        except Exception as e:
-            logger.debug(f"Finance data not available: {e}")
-            company_data.update({
-                "revenue": "",
-                "revenue_previous": "",
-                "net_profit": "",
-                "capital": "",
-                "assets": "",
-                "debit": "",
-                "credit": "",
-            })
-        
+    async def _get_contracts_and_okpd(self, inn: str, ogrn: Optional[str]) -> Dict[str, Any]:
+        """Госконтракты + ОКПД (зависит от ОГРН из /counterparty), с фоллбеком на okpdList."""
+        result: Dict[str, Any] = {}
         try:
-            ogrn = company_data.get("ogrn", "")
             stat = await self.get_government_contracts_stat(inn=inn, ogrn=ogrn)
-            company_data["gov_contracts"] = stat.get("total_sum", "")
-            company_data["okpd"] = stat.get("top_okpd2_code", "")
-            company_data["okpd_name"] = stat.get("top_okpd2_name", "")
+            result["gov_contracts"] = stat.get("total_sum", "")
+            result["okpd"] = stat.get("top_okpd2_code", "")
+            result["okpd_name"] = stat.get("top_okpd2_name", "")
         except Exception as e:
             logger.debug(f"Government contracts not available: {e}")
-            company_data["gov_contracts"] = ""
-            company_data["okpd"] = ""
-            company_data["okpd_name"] = ""
+            result["gov_contracts"] = ""
+            result["okpd"] = ""
+            result["okpd_name"] = ""
 
         # Если ОКПД не удалось получить из статистики контрактов — пробуем okpdList
-        if not company_data.get("okpd"):
+        if not result.get("okpd"):
             try:
-                okpd = await self.get_okpd_list(inn=inn, ogrn=company_data.get("ogrn"))
-                company_data["okpd"] = okpd.get("code", "")
-                company_data["okpd_name"] = okpd.get("name", "")
+                okpd = await self.get_okpd_list(inn=inn, ogrn=ogrn)
+                result["okpd"] = okpd.get("code", "")
+                result["okpd_name"] = okpd.get("name", "")
             except Exception as e:
                 logger.debug(f"okpdList not available: {e}")
-        
+        return result
+
+    async def get_full_company_data(self, inn: str) -> Optional[Dict[str, Any]]:
+        """Получить полные данные компании включая финансы и контракты.
+
+        В конкурентном режиме (settings.datanewton_concurrent_fetch) /finance, /arbitration-cases
+        и запросы по контрактам идут параллельно, но только после ответа /counterparty: по ИНН,
+        которого нет в DataNewton, платные запросы не отправляются. Итоговое время ≈ /counterparty
+        плюс самая длинная из остальных цепочек, а не сумма всех запросов.
+        """
+        finance_task: Optional[asyncio.Task] = None
+        arbitration_task: Optional[asyncio.Task] = None
+        contracts_task: Optional[asyncio.Task] = None
+
         try:
-            arb_stats = await self.get_arbitration_stats(inn)
-            company_data.update(arb_stats)
-            # Для обратной совместимости поле arbitration = количество активных
-            company_data["arbitration"] = arb_stats.get("arbitration_open_count", "0")
-        except Exception as e:
-            logger.debug(f"Arbitration data not available: {e}")
-            company_data.update({
-                "arbitration": "0",
-                "arbitration_open_count": "0",
-                "arbitration_open_sum": "0",
-                "arbitration_last_doc_date": "",
-            })
-        
-        return company_data
+            # Получаем основную информацию
+            company_data = await self.get_company_by_inn(inn)
+            if not company_data:
+                return None
+
+            ogrn = company_data.get("ogrn", "")
+            if settings.datanewton_concurrent_fetch:
+                finance_task = asyncio.create_task(self.get_finance_data(inn))
+                arbitration_task = asyncio.create_task(self.get_arbitration_stats(inn))
+                contracts_task = asyncio.create_task(self._get_contracts_and_okpd(inn, ogrn))
+
+            # Дополнительные данные (может быть недоступно на бесплатном тарифе)
+            try:
+                finance_data = await (finance_task or self.get_finance_data(inn))
+                company_data.update({
+                    "revenue": finance_data.get("revenue", ""),
+                    "revenue_previous": finance_data.get("revenue_previous", ""),
+                    "net_profit": finance_data.get("net_profit", ""),
+                    # Капитал и резервы теперь берём из баланса (1300), а не charter_capital
+                    "capital": finance_data.get("capital", ""),
+                    "assets": finance_data.get("assets", ""),
+                    "debit": finance_data.get("debit", ""),
+                    "credit": finance_data.get("credit", ""),
+                })
+            except Exception as e:
+                logger.debug(f"Finance data not available: {e}")
+                company_data.update({
+                    "revenue": "",
+                    "revenue_previous": "",
+                    "net_profit": "",
+                    "capital": "",
+                    "assets": "",
+                    "debit": "",
+                    "credit": "",
+                })
+
+            company_data.update(await (contracts_task or self._get_contracts_and_okpd(inn, ogrn)))
+
+            try:
+                arb_stats = await (arbitration_task or self.get_arbitration_stats(inn))
+                company_data.update(arb_stats)
+                # Для обратной совместимости поле arbitration = количество активных
+                company_data["arbitration"] = arb_stats.get("arbitration_open_count", "0")
+            except Exception as e:
+                logger.debug(f"Arbitration data not available: {e}")
+                company_data.update({
+                    "arbitration": "0",
+                    "arbitration_open_count": "0",
+                    "arbitration_open_sum": "0",
+                    "arbitration_last_doc_date": "",
+                })
+
+            return company_data
+        finally:
+            # Вызов отменён или упал — не оставляем висящих запросов
+            for task in (finance_task, arbitration_task, contracts_task):
+                if task is not None and not task.done():
+                    task.cancel()
     
     async def validate_inn(self, inn: str) -> bool:
         """
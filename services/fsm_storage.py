@@ -0,0 +1,187 @@
+import json
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+from sqlalchemy import select, delete
+from config import settings
+from models import database
+from models.database import FsmRecord
+
+Record = Tuple[Optional[str], Dict[str, Any]]
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    # default=str: даты и прочие не-JSON значения в данных диалога не должны ронять сохранение
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SQLAlchemyStorage(BaseStorage):
+    """FSM-хранилище aiogram в таблице fsm_states.
+
+    Чтение — через кэш в памяти процесса (LRU на cache_size ключей): повторный доступ к диалогу
+    не ходит в БД. Запись — write-behind: изменения копятся в кэше и уходят в БД одной транзакцией
+    не позже чем через flush_interval секунд (0 — сразу), а также при остановке диспетчера (close).
+
+    Кэш рассчитан на то, что обновления одного чата обрабатывает один процесс. При нескольких
+    процессах webhook create_fsm_storage отключает кэш (cache_size=0); быстрее — FSM_STORAGE=redis.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, cache_size: int = 10000):
+        self.flush_interval = flush_interval
+        self.cache_size = max(0, cache_size)  # 0 — без кэша (несколько процессов на одной БД)
+        self._cache: "OrderedDict[str, Record]" = OrderedDict()
+        self._dirty: Dict[str, Record] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    async def _load(self, key: str) -> Record:
+        # Ещё не записанное в БД — самое свежее
+        record = self._dirty.get(key)
+        if record is None:
+            record = self._cache.get(key)
+            if record is not None:
+                self._cache.move_to_end(key)
+        if record is not None:
+            self.hits += 1
+            return record
+        self.misses += 1
+        async with database.AsyncSessionLocal() as session:
+            row = await session.get(FsmRecord, key)
+        record = (row.state, json.loads(row.data)) if row is not None else (None, {})
+        self._remember(key, record)
+        return record
+
+    def _remember(self, key: str, record: Record) -> None:
+        if not self.cache_size:
+            return
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        # Вытесняем только то, что уже записано в БД
+        while len(self._cache) > self.cache_size:
+            oldest = next((k for k in self._cache if k not in self._dirty), None)
+            if oldest is None:
+                break
+            del self._cache[oldest]
+
+    async def _put(self, key: str, record: Record) -> None:
+        self._dirty[key] = record
+        self._remember(key, record)
+        if self.flush_interval <= 0:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"FSM storage flush failed, will retry: {e}")
+            if self._dirty:
+                self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def flush(self) -> int:
+        """Записать накопленные изменения одной транзакцией. Возвращает число ключей."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            batch, self._dirty = self._dirty, {}
+            try:
+                async with database.AsyncSessionLocal() as session:
+                    result = await session.execute(select(FsmRecord).where(FsmRecord.key.in_(list(batch))))
+                    existing = {row.key: row for row in result.scalars().all()}
+                    empty = [key for key, (state, data) in batch.items() if state is None and not data]
+                    if empty:
+                        # state.clear() — запись больше не нужна
+                        await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(empty)))
+                    for key, (state, data) in batch.items():
+                        if key in empty:
+                            continue
+                        row = existing.get(key)
+                        if row is None:
+                            session.add(FsmRecord(key=key, state=state, data=_dumps(data)))
+                        else:
+                            row.state = state
+                            row.data = _dumps(data)
+                            row.updated_at = datetime.utcnow()
+                    await session.commit()
+            except Exception:
+                # Возвращаем несохранённое, не затирая более свежие изменения
+                for key, record in batch.items():
+                    self._dirty.setdefault(key, record)
+                raise
+            self.flushes += 1
+            return len(batch)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self._key(key)
+        _, data = await self._load(k)
+        await self._put(k, (state.state if isinstance(state, State) else state, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = self._key(key)
+        state, _ = await self._load(k)
+        await self._put(k, (state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return data.copy()
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"FSM storage: final flush failed, {len(self._dirty)} dialogs not saved: {e}")
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище FSM по настройке fsm_storage: sql (по умолчанию), redis или memory."""
+    backend = (settings.fsm_storage or "sql").lower()
+    if backend == "redis":
+        # Нужен пакет redis; подходит любой Redis-совместимый сервер (Redis, KeyDB, Valkey, Dragonfly)
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(
+            settings.redis_url,
+            state_ttl=settings.fsm_ttl or None,
+            data_ttl=settings.fsm_ttl or None,
+            json_dumps=_dumps,
+        )
+    if backend == "memory":
+        return MemoryStorage()
+    if settings.bot_mode == "webhook" and settings.webhook_workers > 1:
+        # Обновления одного чата могут прийти в разные процессы: кэш и отложенная запись были бы рассинхронизированы
+        logger.warning("FSM in SQL with several webhook workers: cache disabled, consider FSM_STORAGE=redis")
+        return SQLAlchemyStorage(flush_interval=0, cache_size=0)
+    return SQLAlchemyStorage(
+        flush_interval=settings.fsm_flush_interval,
+        cache_size=settings.fsm_cache_size,
+    )
+
+
+def create_event_isolation(storage: BaseStorage) -> BaseEventIsolation:
+    """Обновления одного чата обрабатываются по очереди: между процессами (Redis) или внутри процесса."""
+    if hasattr(storage, "create_isolation"):
+        return storage.create_isolation()
+    return SimpleEventIsolation()
@@ -1,22 +1,205 @@
 import os
 import json
 import base64
+import hashlib
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple, Set
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from loguru import logger
 from config import settings
 from datetime import datetime
+from services.sheet_index import SheetRowIndex, row_from_updated_range
+
+
+# АКТУАЛЬНАЯ СХЕМА листа менеджера
+MANAGER_HEADERS = [
+    "Наименование компании",  # A
+    "ИНН",  # B
+    "ФИО ЛПР",  # C
+    "Телефон",  # D
+    "Дата звонка будущая",  # E
+    "История звонков (все комментарии)",  # F
+    "Финансы (выручка позапрошлый год) тыс рублей",  # G
+    "Финансы (выручка прошлый год) тыс рублей",  # H
+    "Чистая прибыль за прошлый год (тыс рублей)",  # I
+    "Капитал и резервы за прошлый год (тыс рублей)",  # J
+    "Основные средства за прошлый год (тыс рублей)",  # K
+    "Дебеторская задолженность за прошлый год (тыс рублей)",  # L
+    "Кредиторская задолженность за прошлый год (тыс рублей)",  # M
+    "Госконтракты, сумма заключенных за всё время",  # N
+    "ОКВЭД (основной)",  # O
+    "Наименование ОКПД",  # P
+    "Дата первого звонка",  # Q
+]
+# Колонки листа менеджера, которые заполняются из DataNewton: заголовок -> поле get_full_company_data
+DATANEWTON_COLUMNS = {
+    "Финансы (выручка позапрошлый год) тыс рублей": "revenue_previous",
+    "Финансы (выручка прошлый год) тыс рублей": "revenue",
+    "Чистая прибыль за прошлый год (тыс рублей)": "net_profit",
+    "Капитал и резервы за прошлый год (тыс рублей)": "capital",
+    "Основные средства за прошлый год (тыс рублей)": "assets",
+    "Дебеторская задолженность за прошлый год (тыс рублей)": "debit",
+    "Кредиторская задолженность за прошлый год (тыс рублей)": "credit",
+    "Госконтракты, сумма заключенных за всё время": "gov_contracts",
+    "ОКВЭД (основной)": "okved",
+    "Наименование ОКПД": "okpd_name",
+}
+# Сводная таблица руководителя: та же схема + колонка Менеджер
+SUPERVISOR_HEADERS = MANAGER_HEADERS + [
+    "Менеджер",  # R
+]
+
+
+def _schema_version(headers: List[str]) -> str:
+    """Версия схемы = хэш заголовков: меняется автоматически при любом изменении колонок."""
+    return hashlib.sha1("\x1f".join(headers).encode("utf-8")).hexdigest()[:12]
+
+
+MANAGER_SCHEMA_VERSION = _schema_version(MANAGER_HEADERS)
+SUPERVISOR_SCHEMA_VERSION = _schema_version(SUPERVISOR_HEADERS)
+# Разделитель записей истории в колонке F сводной таблицы
+SUPERVISOR_SEPARATOR = "\n---\n"
 
 
 class GoogleSheetsService:
     def __init__(self):
         self.credentials = None
-        self.service = None
+        # googleapiclient/httplib2 не потокобезопасны — у каждого потока свой экземпляр сервиса
+        self._local = threading.local()
+        self._service_factory: Optional[Callable[[], Any]] = None
+        # Все синхронные вызовы Sheets API выполняются в отдельном ограниченном пуле потоков,
+        # чтобы не блокировать event loop aiogram
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.google_sheets_max_workers,
+            thread_name_prefix="gsheets",
+        )
+        # Индексы ИНН -> строка по каждой таблице, чтобы не скачивать лист целиком ради поиска строки
+        self._row_indexes: Dict[str, SheetRowIndex] = {}
+        self._index_locks: Dict[str, asyncio.Lock] = {}
+        # Таблица -> версия схемы, заголовки которой уже проверены/записаны в этом процессе
+        self._headers_verified: Dict[str, str] = {}
+        self._header_locks: Dict[str, asyncio.Lock] = {}
         self._initialize_service()
     
+    @property
+    def service(self):
+        """Сервис Sheets API для текущего потока (создаётся лениво через _service_factory)."""
+        svc = getattr(self._local, "service", None)
+        if svc is None and self._service_factory is not None:
+            svc = self._service_factory()
+            self._local.service = svc
+        return svc
+
+    @service.setter
+    def service(self, value) -> None:
+        self._local.service = value
+
+    @property
+    def drive(self):
+        """Сервис Drive API для текущего потока (метаданные таблиц)."""
+        svc = getattr(self._local, "drive", None)
+        if svc is None and self.credentials is not None:
+            svc = build('drive', 'v3', credentials=self.credentials, cache_discovery=False)
+            self._local.drive = svc
+        return svc
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        """Выполнить синхронную функцию в пуле потоков Sheets."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _execute(self, request_factory: Callable[[], Any]):
+        """Собрать запрос googleapiclient и выполнить .execute() в пуле потоков.
+        Запрос создаётся внутри рабочего потока, чтобы использовать его собственный HTTP-клиент.
+        """
+        return await self._run(lambda: request_factory().execute())
+
+    def close(self) -> None:
+        """Остановить пул потоков (вызывается при остановке бота)."""
+        self._executor.shutdown(wait=False)
+
+    # --- Индекс строк по ИНН ---
+    async def _get_row_index(self, sheet_id: str, refresh: bool = False) -> SheetRowIndex:
+        """Индекс ИНН -> строка для таблицы. Строится чтением только колонки B."""
+        index = self._row_indexes.get(sheet_id)
+        if index is not None and not refresh and not index.is_stale(settings.google_sheets_index_ttl):
+            return index
+        lock = self._index_locks.setdefault(sheet_id, asyncio.Lock())
+        async with lock:
+            current = self._row_indexes.get(sheet_id)
+            # Пока ждали блокировку, индекс мог перестроить параллельный запрос
+            if current is not None and current is not index:
+                return current
+            result = await self._execute(lambda: self.service.spreadsheets().values().get(
+                spreadsheetId=sheet_id,
+                range='B:B'
+            ))
+            index = SheetRowIndex(result.get('values', []))
+            self._row_indexes[sheet_id] = index
+            logger.debug(f"Row index for {sheet_id} built: {len(index)} INNs, next row {index.next_row}")
+            return index
+
+    def invalidate_row_index(self, sheet_id: str) -> None:
+        """Сбросить индекс таблицы (после массовых правок в обход сервиса)."""
+        self._row_indexes.pop(sheet_id, None)
+
+    async def _locate_rows(
+        self, sheet_id: str, inns: List[str], last_col: str = 'B'
+    ) -> Dict[str, Tuple[int, List[Any]]]:
+        """Найти строки компаний по ИНН.
+
+        Номера строк берутся из индекса и сверяются batchGet по диапазонам A{row}:{last_col}{row}
+        (заодно возвращаются значения строк). Диапазоны передаются в URL, поэтому большие пачки
+        делятся на запросы по google_sheets_batch_get_ranges, иначе GET упрётся в 414 URI Too Long.
+        Если лист правили вручную и строка не совпала или ИНН не найден — индекс перестраивается один раз.
+        Возвращает {ИНН: (номер строки, значения строки)} только для найденных компаний.
+        """
+        pending = list(dict.fromkeys(str(inn or '').strip() for inn in inns))
+        pending = [inn for inn in pending if inn]
+        found: Dict[str, Tuple[int, List[Any]]] = {}
+        if not pending:
+            return found
+        started = time.monotonic()
+        index = await self._get_row_index(sheet_id)
+        while True:
+            candidates = [(inn, index.get(inn)) for inn in pending if index.get(inn) is not None]
+            if candidates:
+                step = max(1, settings.google_sheets_batch_get_ranges)
+                chunks = [candidates[i:i + step] for i in range(0, len(candidates), step)]
+                results = await asyncio.gather(*(self._batch_get_rows(sheet_id, chunk, last_col) for chunk in chunks))
+                for chunk, value_ranges in zip(chunks, results):
+                    for (inn, row), value_range in zip(chunk, value_ranges):
+                        values = (value_range.get('values') or [[]])[0]
+                        if len(values) > 1 and str(values[1]).strip() == inn:
+                            found[inn] = (row, values)
+            pending = [inn for inn in pending if inn not in found]
+            if not pending or index.built_at >= started:
+                # Всё нашли, либо индекс свежий — остальных компаний в листе действительно нет
+                return found
+            index = await self._get_row_index(sheet_id, refresh=True)
+
+    async def _batch_get_rows(
+        self, sheet_id: str, candidates: List[Tuple[str, int]], last_col: str
+    ) -> List[Dict[str, Any]]:
+        """Один batchGet по строкам кандидатов; возвращает valueRanges в порядке candidates."""
+        result = await self._execute(lambda: self.service.spreadsheets().values().batchGet(
+            spreadsheetId=sheet_id,
+            ranges=[f'A{row}:{last_col}{row}' for _, row in candidates]
+        ))
+        return result.get('valueRanges', [])
+
+    async def _locate_row(self, sheet_id: str, inn: str, last_col: str = 'B') -> Tuple[Optional[int], List[Any]]:
+        """Найти строку одной компании (см. _locate_rows). Возвращает (номер строки, значения) или (None, [])."""
+        found = await self._locate_rows(sheet_id, [inn], last_col)
+        return found.get(str(inn or '').strip(), (None, []))
+
     # --- Helpers ---
     @staticmethod
     def _col_letters(start_letter: str, count: int) -> List[str]:
@@ -35,6 +218,15 @@ class GoogleSheetsService:
         start_idx = to_index(start_letter)
         return [to_letter(start_idx + i) for i in range(count)]
         
+    @classmethod
+    def datanewton_column_updates(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Буква колонки -> значение из данных DataNewton; буквы считаются по MANAGER_HEADERS."""
+        letters = cls._col_letters('A', len(MANAGER_HEADERS))
+        return {
+            letters[MANAGER_HEADERS.index(header)]: data.get(field) or ''
+            for header, field in DATANEWTON_COLUMNS.items()
+        }
+
     def _ensure_oauth_files(self) -> None:
         """Если переданы OAuth файлы через переменные окружения, восстанавливаем их на диск."""
         client_b64 = os.getenv("GOOGLE_OAUTH_CLIENT_JSON_B64")
@@ -52,8 +244,8 @@ class GoogleSheetsService:
             except Exception as e:
                 logger.warning(f"Failed to decode GOOGLE_OAUTH_TOKEN_JSON_B64: {e}")
         
-    def _now_str(self) -> str:
-        """Возвращает текущую дату с учётом часового пояса из настроек."""
+    def now_str(self) -> str:
+        """Текущая дата (дд.мм.гг) с учётом часового пояса из настроек — формат дат в таблицах."""
         try:
             from zoneinfo import ZoneInfo
             tz = ZoneInfo(getattr(settings, 'timezone', 'Europe/Moscow'))
@@ -78,6 +270,7 @@ class GoogleSheetsService:
                 sheets_service = oauth_client.get_sheets_service()
                 self.service = sheets_service
                 self.credentials = oauth_client.creds
+                self._service_factory = self._build_sheets_service
                 logger.info("Google Sheets via OAuth")
                 return
             except Exception as oauth_err:
@@ -96,12 +289,15 @@ class GoogleSheetsService:
                     settings.google_sheets_credentials_file,
                     scopes=scopes
                 )
-            self.service = build('sheets', 'v4', credentials=self.credentials)
+            self._service_factory = self._build_sheets_service
             logger.info("Google Sheets via Service Account")
         except Exception as e:
             logger.error(f"Failed to initialize Google Sheets service: {e}")
             raise
 
+    def _build_sheets_service(self):
+        return build('sheets', 'v4', credentials=self.credentials, cache_discovery=False)
+
     def _get_first_sheet_gid(self, spreadsheet_id: str) -> int:
         """Получить gid первого листа (вместо предположения sheetId=0)."""
         meta = self.service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
@@ -122,18 +318,18 @@ class GoogleSheetsService:
                     }
                 }
                 
-                spreadsheet = self.service.spreadsheets().create(
+                spreadsheet = await self._execute(lambda: self.service.spreadsheets().create(
                     body=spreadsheet_body
-                ).execute()
+                ))
                 
                 new_sheet_id = spreadsheet.get('spreadsheetId')
             else:
                 # Service Account - копируем шаблон
-                drive_service = build('drive', 'v3', credentials=self.credentials)
-                copy_response = drive_service.files().copy(
+                # Drive-клиент потока пула: discovery и HTTP-клиент не трогают event loop
+                copy_response = await self._execute(lambda: self.drive.files().copy(
                     fileId=settings.manager_sheet_template_id,
                     body={'name': f'CRM - {manager_name}'}
-                ).execute()
+                ))
                 
                 new_sheet_id = copy_response.get('id')
             
@@ -163,46 +359,27 @@ class GoogleSheetsService:
         - J: капитал и резервы за прошлый год
         - далее все показатели за прошлый год
         """
-        headers = [
-            [
-                "Наименование компании",  # A
-                "ИНН",  # B
-                "ФИО ЛПР",  # C
-                "Телефон",  # D
-                "Дата звонка будущая",  # E
-                "История звонков (все комментарии)",  # F
-                "Финансы (выручка позапрошлый год) тыс рублей",  # G
-                "Финансы (выручка прошлый год) тыс рублей",  # H
-                "Чистая прибыль за прошлый год (тыс рублей)",  # I
-                "Капитал и резервы за прошлый год (тыс рублей)",  # J
-                "Основные средства за прошлый год (тыс рублей)",  # K
-                "Дебеторская задолженность за прошлый год (тыс рублей)",  # L
-                "Кредиторская задолженность за прошлый год (тыс рублей)",  # M
-                "Госконтракты, сумма заключенных за всё время",  # N
-                "ОКВЭД (основной)",  # O
-                "Наименование ОКПД",  # P
-                "Дата первого звонка",  # Q
-            ]
-        ]
+        headers = [MANAGER_HEADERS]
         
         request = {
             'values': headers
         }
         
         # Обновляем заголовки с запасом по ширине (A-AZ)
-        self.service.spreadsheets().values().update(
+        await self._execute(lambda: self.service.spreadsheets().values().update(
             spreadsheetId=sheet_id,
             range='A1:AZ1',
             valueInputOption='RAW',
             body=request
-        ).execute()
+        ))
         
+        first_gid = await self._run(self._get_first_sheet_gid, sheet_id)
         # Формат заголовков
         format_request = {
             'requests': [{
                 'repeatCell': {
                     'range': {
-                        'sheetId': self._get_first_sheet_gid(sheet_id),
+                        'sheetId': first_gid,
                         'startRowIndex': 0,
                         'endRowIndex': 1
                     },
@@ -221,7 +398,6 @@ class GoogleSheetsService:
         
         # Скрываем финансовые/служебные колонки по умолчанию (не меняем индексы)
         hidden_columns = list(range(6, 12)) + list(range(12, 17))
-        first_gid = self._get_first_sheet_gid(sheet_id)
         for col_index in hidden_columns:
             format_request['requests'].append({
                 'updateDimensionProperties': {
@@ -238,14 +414,14 @@ class GoogleSheetsService:
                 }
             })
         
-        self.service.spreadsheets().batchUpdate(
+        await self._execute(lambda: self.service.spreadsheets().batchUpdate(
             spreadsheetId=sheet_id,
             body=format_request
-        ).execute()
+        ))
         # Применяем валютное форматирование к нужным колонкам:
         # G,H,I,J,K,L,M,N (финансы + госконтракты) - индексы 6-13
-        gid = self._get_first_sheet_gid(sheet_id)
-        self._apply_currency_format(sheet_id, gid, [6,7,8,9,10,11,12,13])
+        await self._run(self._apply_currency_format, sheet_id, first_gid, [6,7,8,9,10,11,12,13])
+        self._headers_verified[sheet_id] = MANAGER_SCHEMA_VERSION
 
     def _apply_currency_format(self, spreadsheet_id: str, sheet_gid: int, column_indices: List[int]) -> None:
         """Применить формат валюты (₽) к указанным колонкам, начиная со 2-й строки."""
@@ -279,47 +455,36 @@ class GoogleSheetsService:
 
     async def _setup_supervisor_headers(self, sheet_id: str):
         """Настроить заголовки сводной таблицы руководителя - АКТУАЛЬНАЯ СХЕМА (с колонкой Менеджер)."""
-        headers = [
-            [
-                "Наименование компании",  # A
-                "ИНН",  # B
-                "ФИО ЛПР",  # C
-                "Телефон",  # D
-                "Дата звонка будущая",  # E
-                "История звонков (все комментарии)",  # F
-                "Финансы (выручка позапрошлый год) тыс рублей",  # G
-                "Финансы (выручка прошлый год) тыс рублей",  # H
-                "Чистая прибыль за прошлый год (тыс рублей)",  # I
-                "Капитал и резервы за прошлый год (тыс рублей)",  # J
-                "Основные средства за прошлый год (тыс рублей)",  # K
-                "Дебеторская задолженность за прошлый год (тыс рублей)",  # L
-                "Кредиторская задолженность за прошлый год (тыс рублей)",  # M
-                "Госконтракты, сумма заключенных за всё время",  # N
-                "ОКВЭД (основной)",  # O
-                "Наименование ОКПД",  # P
-                "Дата первого звонка",  # Q
-                "Менеджер",  # R
-            ]
-        ]
-        self.service.spreadsheets().values().update(
+        headers = [SUPERVISOR_HEADERS]
+        await self._execute(lambda: self.service.spreadsheets().values().update(
             spreadsheetId=sheet_id,
             range='A1:R1',
             valueInputOption='RAW',
             body={'values': headers}
-        ).execute()
+        ))
         # Формат валюты для: G,H,I,J,K,L,M,N (финансы + госконтракты)
-        gid = self._get_first_sheet_gid(sheet_id)
-        self._apply_currency_format(sheet_id, gid, [6,7,8,9,10,11,12,13])
+        gid = await self._run(self._get_first_sheet_gid, sheet_id)
+        await self._run(self._apply_currency_format, sheet_id, gid, [6,7,8,9,10,11,12,13])
+        self._headers_verified[sheet_id] = SUPERVISOR_SCHEMA_VERSION
+
+    async def _ensure_supervisor_headers(self, sheet_id: str) -> None:
+        """Заголовки и формат сводной таблицы — один раз за процесс (или при смене схемы)."""
+        if self._headers_verified.get(sheet_id) == SUPERVISOR_SCHEMA_VERSION:
+            return
+        async with self._header_locks.setdefault(sheet_id, asyncio.Lock()):
+            if self._headers_verified.get(sheet_id) == SUPERVISOR_SCHEMA_VERSION:
+                return
+            await self._setup_supervisor_headers(sheet_id)
 
     async def delete_columns_by_titles(self, sheet_id: str, titles: List[str]) -> None:
         """Удалить колонки по заголовкам (точное совпадение названия).
         Делает безопасно: сначала определяет индексы, затем удаляет по убыванию индексов.
         """
         try:
-            result = self.service.spreadsheets().values().get(
+            result = await self._execute(lambda: self.service.spreadsheets().values().get(
                 spreadsheetId=sheet_id,
                 range='A1:AZ1'
-            ).execute()
+            ))
             headers_row = (result.get('values') or [[]])[0]
             to_delete_indices = []
             for idx, title in enumerate(headers_row):
@@ -329,7 +494,7 @@ class GoogleSheetsService:
                 logger.info(f"No columns to delete in {sheet_id} for titles {titles}")
                 return
             to_delete_indices.sort(reverse=True)
-            gid = self._get_first_sheet_gid(sheet_id)
+            gid = await self._run(self._get_first_sheet_gid, sheet_id)
             requests = []
             for idx in to_delete_indices:
                 requests.append({
@@ -342,123 +507,117 @@ class GoogleSheetsService:
                         }
                     }
                 })
-            self.service.spreadsheets().batchUpdate(
+            await self._execute(lambda: self.service.spreadsheets().batchUpdate(
                 spreadsheetId=sheet_id,
                 body={'requests': requests}
-            ).execute()
+            ))
             logger.info(f"Deleted columns {to_delete_indices} from {sheet_id}")
+            # Структура листа изменилась — заголовки надо будет проверить заново
+            self._headers_verified.pop(sheet_id, None)
         except Exception as e:
             logger.error(f"Error deleting columns in {sheet_id}: {e}")
 
     async def _ensure_headers(self, sheet_id: str) -> None:
-        """Проверяет заголовки листа менеджера и при несовпадении приводит к актуальному виду - АКТУАЛЬНАЯ СХЕМА."""
+        """Проверяет заголовки листа менеджера и при несовпадении приводит к актуальному виду - АКТУАЛЬНАЯ СХЕМА.
+        Результат запоминается на процесс: повторные вызовы для той же версии схемы не ходят в API.
+        """
+        if self._headers_verified.get(sheet_id) == MANAGER_SCHEMA_VERSION:
+            return
         try:
-            expected = [
-                "Наименование компании",  # A
-                "ИНН",  # B
-                "ФИО ЛПР",  # C
-                "Телефон",  # D
-                "Дата звонка будущая",  # E
-                "История звонков (все комментарии)",  # F
-                "Финансы (выручка позапрошлый год) тыс рублей",  # G
-                "Финансы (выручка прошлый год) тыс рублей",  # H
-                "Чистая прибыль за прошлый год (тыс рублей)",  # I
-                "Капитал и резервы за прошлый год (тыс рублей)",  # J
-                "Основные средства за прошлый год (тыс рублей)",  # K
-                "Дебеторская задолженность за прошлый год (тыс рублей)",  # L
-                "Кредиторская задолженность за прошлый год (тыс рублей)",  # M
-                "Госконтракты, сумма заключенных за всё время",  # N
-                "ОКВЭД (основной)",  # O
-                "Наименование ОКПД",  # P
-                "Дата первого звонка",  # Q
-            ]
+            async with self._header_locks.setdefault(sheet_id, asyncio.Lock()):
+                if self._headers_verified.get(sheet_id) == MANAGER_SCHEMA_VERSION:
+                    return
+                result = await self._execute(lambda: self.service.spreadsheets().values().get(
+                    spreadsheetId=sheet_id,
+                    range='A1:Q1'
+                ))
+                current = (result.get('values') or [[]])[0]
 
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=sheet_id,
-                range='A1:Q1'
-            ).execute()
-            current = (result.get('values') or [[]])[0]
-
-            if current != expected:
-                logger.info("Sheet headers mismatch detected — updating to the latest structure")
-                await self._setup_sheet_headers(sheet_id)
+                if current != MANAGER_HEADERS:
+                    logger.info("Sheet headers mismatch detected — updating to the latest structure")
+                    await self._setup_sheet_headers(sheet_id)
+                self._headers_verified[sheet_id] = MANAGER_SCHEMA_VERSION
         except Exception as e:
             logger.warning(f"Unable to verify/update headers: {e}")
     
+    def _manager_row(self, call_data: Dict[str, Any]) -> List[Any]:
+        """Новая строка листа менеджера (A:Q)."""
+        # Префиксуем комментарий датой, чтобы история была читабельной
+        comment_prefixed = call_data.get('comment', '')
+        if comment_prefixed:
+            comment_prefixed = f"[{self.now_str()}] {comment_prefixed}"
+        return [
+            call_data.get('company_name', ''),  # A
+            call_data.get('inn', ''),  # B
+            call_data.get('contact_name', ''),  # C
+            call_data.get('phone', ''),  # D
+            call_data.get('next_call_date', ''),  # E
+            comment_prefixed,  # F
+            call_data.get('revenue_previous', ''),  # G (позапрошлый год)
+            call_data.get('revenue', ''),  # H (прошлый год)
+            call_data.get('net_profit', ''),  # I
+            call_data.get('capital', ''),  # J
+            call_data.get('assets', ''),  # K
+            call_data.get('debit', ''),  # L
+            call_data.get('credit', ''),  # M
+            call_data.get('gov_contracts', ''),  # N
+            call_data.get('okved_main', ''),  # O
+            call_data.get('okpd_name', ''),  # P
+            self.now_str()  # Q
+        ]
+
+    async def _append_manager_rows(self, sheet_id: str, calls: List[Dict[str, Any]]) -> None:
+        await self._ensure_headers(sheet_id)
+        index = await self._get_row_index(sheet_id)
+        row_num = index.next_row
+        request = {'values': [self._manager_row(call_data) for call_data in calls]}
+        response = await self._execute(lambda: self.service.spreadsheets().values().append(
+            spreadsheetId=sheet_id,
+            range=f'A{row_num}:Q{row_num}',
+            valueInputOption='USER_ENTERED',
+            insertDataOption='INSERT_ROWS',
+            body=request
+        ))
+        # Фактические строки сообщает сам API (параллельные записи могли сдвинуть конец таблицы)
+        self._remember_appended_rows(sheet_id, [call_data.get('inn', '') for call_data in calls], response)
+
     async def add_new_call(self, sheet_id: str, call_data: Dict[str, Any]) -> bool:
         """Добавить данные о новом звонке"""
         try:
-            await self._ensure_headers(sheet_id)
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=sheet_id,
-                range='A:AZ'
-            ).execute()
-            values = result.get('values', [])
-            row_num = 2 if len(values) <= 1 else len(values) + 1
-            # Префиксуем комментарий датой, чтобы история была читабельной
-            comment_prefixed = call_data.get('comment', '')
-            if comment_prefixed:
-                comment_prefixed = f"[{self._now_str()}] {comment_prefixed}"
-            new_row = [
-                call_data.get('company_name', ''),  # A
-                call_data.get('inn', ''),  # B
-                call_data.get('contact_name', ''),  # C
-                call_data.get('phone', ''),  # D
-                call_data.get('next_call_date', ''),  # E
-                comment_prefixed,  # F
-                call_data.get('revenue_previous', ''),  # G (позапрошлый год)
-                call_data.get('revenue', ''),  # H (прошлый год)
-                call_data.get('net_profit', ''),  # I
-                call_data.get('capital', ''),  # J
-                call_data.get('assets', ''),  # K
-                call_data.get('debit', ''),  # L
-                call_data.get('credit', ''),  # M
-                call_data.get('gov_contracts', ''),  # N
-                call_data.get('okved_main', ''),  # O
-                call_data.get('okpd_name', ''),  # P
-                self._now_str()  # Q
-            ]
-            request = {'values': [new_row]}
-            self.service.spreadsheets().values().append(
-                spreadsheetId=sheet_id,
-                range=f'A{row_num}:Q{row_num}',
-                valueInputOption='USER_ENTERED',
-                insertDataOption='INSERT_ROWS',
-                body=request
-            ).execute()
+            await self._append_manager_rows(sheet_id, [call_data])
             return True
         except Exception as e:
             logger.error(f"Error adding new call: {e}")
             return False
+
+    async def add_new_calls(self, sheet_id: str, calls: List[Dict[str, Any]]) -> int:
+        """Добавить пачку новых компаний одним append (импорт CSV). Ошибки API пробрасываются."""
+        if not calls:
+            return 0
+        await self._append_manager_rows(sheet_id, calls)
+        return len(calls)
+
+    async def existing_inns(self, sheet_id: str) -> Set[str]:
+        """ИНН, которые уже есть в листе (индекс перестраивается по колонке B)."""
+        index = await self._get_row_index(sheet_id, refresh=True)
+        return set(index.rows)
     
     async def update_repeat_call(self, sheet_id: str, inn: str, call_data: Dict[str, Any]) -> bool:
         """Обновить данные о повторном звонке"""
         try:
-            # Ищем строку с нужным ИНН
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=sheet_id,
-                range='A:AZ'
-            ).execute()
-            
-            values = result.get('values', [])
-            row_index = None
-            
-            for i, row in enumerate(values):
-                if len(row) > 1 and row[1] == inn:  # ИНН в колонке B
-                    row_index = i + 1
-                    break
+            # Ищем строку с нужным ИНН (по индексу, читаем только A:F этой строки)
+            row_index, current_row = await self._locate_row(sheet_id, inn, last_col='F')
             
             if row_index is None:
                 logger.error(f"Company with INN {inn} not found")
                 return False
             
             # Получаем текущую историю комментариев
-            current_row = values[row_index - 1]
             existing_comments = current_row[5] if len(current_row) > 5 else ''
             
             # Добавляем новый комментарий к истории
             raw_comment = call_data.get('comment', '')
-            new_comment = f"[{self._now_str()}] {raw_comment}" if raw_comment else ""
+            new_comment = f"[{self.now_str()}] {raw_comment}" if raw_comment else ""
             if existing_comments:
                 # Добавляем новый комментарий в начало истории
                 updated_comments = f"{new_comment}\n---\n{existing_comments}"
@@ -493,10 +652,10 @@ class GoogleSheetsService:
                 'data': updates
             }
             
-            self.service.spreadsheets().values().batchUpdate(
+            await self._execute(lambda: self.service.spreadsheets().values().batchUpdate(
                 spreadsheetId=sheet_id,
                 body=body
-            ).execute()
+            ))
             
             return True
             
@@ -504,105 +663,204 @@ class GoogleSheetsService:
             logger.error(f"Error updating repeat call: {e}")
             return False
     
-    async def get_today_calls(self, sheet_id: str) -> List[Dict[str, Any]]:
-        """Получить список звонков на сегодня"""
+    async def ensure_headers(self, sheet_id: str) -> None:
+        """Привести заголовки листа менеджера к актуальной схеме (для скриптов обслуживания)."""
+        await self._ensure_headers(sheet_id)
+
+    async def batch_update_cells(
+        self, sheet_id: str, data: List[Dict[str, Any]], value_input_option: str = 'RAW'
+    ) -> None:
+        """Один values.batchUpdate по списку ValueRange ({'range': 'G5', 'values': [[...]]}). Ошибки пробрасываются."""
+        await self._execute(lambda: self.service.spreadsheets().values().batchUpdate(
+            spreadsheetId=sheet_id,
+            body={'valueInputOption': value_input_option, 'data': data}
+        ))
+
+    async def read_sheet_rows(self, sheet_id: str, last_col: str = 'Q') -> List[Tuple[int, List[Any]]]:
+        """Весь лист менеджера (A:last_col) одним запросом: (номер строки, значения) для строк с ИНН."""
+        result = await self._execute(lambda: self.service.spreadsheets().values().get(
+            spreadsheetId=sheet_id,
+            range=f'A:{last_col}'
+        ))
+        rows = []
+        for i, row in enumerate(result.get('values', [])[1:], start=2):  # Пропускаем заголовок
+            if len(row) > 1 and str(row[1]).strip():
+                rows.append((i, row))
+        return rows
+
+    async def sheet_modified_time(self, sheet_id: str) -> Optional[str]:
+        """Время последнего изменения таблицы (Drive API, RFC 3339) — дешёвая проверка перед чтением листа.
+        None, если Drive недоступен: тогда лист просто читается целиком.
+        """
         try:
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=sheet_id,
-                range='A:Z'
-            ).execute()
-            
-            values = result.get('values', [])
-            today = self._now_str()
-            today_calls = []
-            
-            for i, row in enumerate(values[1:], start=2):  # Пропускаем заголовок
-                if len(row) > 4 and row[4] == today:  # E: Дата следующего звонка
-                    today_calls.append({
-                        'row_number': i,
-                        'company_name': row[0] if len(row) > 0 else '',
-                        'inn': row[1] if len(row) > 1 else '',
-                        'contact_name': row[2] if len(row) > 2 else '',
-                        'phone': row[3] if len(row) > 3 else '',
-                        'last_comment': row[5] if len(row) > 5 else ''
-                    })
-            
-            return today_calls
-            
+            meta = await self._execute(lambda: self.drive.files().get(fileId=sheet_id, fields='modifiedTime'))
+            return meta.get('modifiedTime')
         except Exception as e:
-            logger.error(f"Error getting today calls: {e}")
-            return []
-    
+            logger.debug(f"modifiedTime unavailable for {sheet_id}: {e}")
+            return None
+
+    @staticmethod
+    def _supervisor_comment(manager_name: str, call_data: Dict[str, Any], current_date: str) -> str:
+        return f"[{manager_name}] [{current_date}] {call_data.get('comment', '')}"
+
+    def _supervisor_row(self, manager_name: str, call_data: Dict[str, Any], current_date: str) -> List[Any]:
+        """Новая строка сводной таблицы (A:R)."""
+        return [
+            call_data.get('company_name', ''),  # A
+            call_data.get('inn', ''),  # B
+            call_data.get('contact_name', ''),  # C
+            call_data.get('phone', ''),  # D
+            call_data.get('next_call_date', ''),  # E
+            self._supervisor_comment(manager_name, call_data, current_date),  # F
+            call_data.get('revenue_previous', ''),  # G (позапрошлый год)
+            call_data.get('revenue', ''),  # H (прошлый год)
+            call_data.get('net_profit', ''),  # I
+            call_data.get('capital', ''),  # J
+            call_data.get('assets', ''),  # K
+            call_data.get('debit', ''),  # L
+            call_data.get('credit', ''),  # M
+            call_data.get('gov_contracts', ''),  # N
+            call_data.get('okved_main', ''),  # O
+            call_data.get('okpd_name', ''),  # P
+            current_date,  # Q
+            manager_name  # R
+        ]
+
     async def update_supervisor_sheet(self, manager_name: str, call_data: Dict[str, Any]):
         """Обновить сводную таблицу руководителя"""
         try:
             if not settings.supervisor_sheet_id:
                 logger.warning("Supervisor sheet ID not configured")
                 return
-            # Обеспечиваем корректные заголовки с колонкой Менеджер
-            try:
-                self.service.spreadsheets().values().get(
-                    spreadsheetId=settings.supervisor_sheet_id,
-                    range='A1:R1'
-                ).execute()
-            except Exception:
-                pass
-            await self._setup_supervisor_headers(settings.supervisor_sheet_id)
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=settings.supervisor_sheet_id,
-                range='A:R'
-            ).execute()
-            values = result.get('values', [])
-            next_row = 2 if len(values) < 2 else len(values) + 1
-            company_row = None
-            if len(values) > 1:
-                for i in range(1, len(values)):
-                    if len(values[i]) > 1 and values[i][1] == call_data.get('inn'):
-                        company_row = i + 1
-                        break
-            current_date = self._now_str()
+            # Обеспечиваем корректные заголовки с колонкой Менеджер (один раз за процесс)
+            await self._ensure_supervisor_headers(settings.supervisor_sheet_id)
+            company_row, company_values = await self._locate_row(
+                settings.supervisor_sheet_id, call_data.get('inn'), last_col='F'
+            )
+            current_date = self.now_str()
             if company_row:
                 updates = []
                 updates.append({'range': f'E{company_row}', 'values': [[call_data.get('next_call_date', '')]]})
-                existing_comments = values[company_row - 1][5] if len(values[company_row - 1]) > 5 else ''
-                new_comment = f"[{manager_name}] [{current_date}] {call_data.get('comment', '')}"
-                updated_comments = f"{new_comment}\n---\n{existing_comments}" if existing_comments else new_comment
+                existing_comments = company_values[5] if len(company_values) > 5 else ''
+                new_comment = self._supervisor_comment(manager_name, call_data, current_date)
+                updated_comments = f"{new_comment}{SUPERVISOR_SEPARATOR}{existing_comments}" if existing_comments else new_comment
                 updates.append({'range': f'F{company_row}', 'values': [[updated_comments]]})
                 # Колонка менеджера убрана из структуры — не пишем в Y
-                self.service.spreadsheets().values().batchUpdate(
+                await self._execute(lambda: self.service.spreadsheets().values().batchUpdate(
                     spreadsheetId=settings.supervisor_sheet_id,
                     body={'valueInputOption': 'USER_ENTERED', 'data': updates}
-                ).execute()
+                ))
             else:
-                row_data = [
-                    call_data.get('company_name', ''),  # A
-                    call_data.get('inn', ''),  # B
-                    call_data.get('contact_name', ''),  # C
-                    call_data.get('phone', ''),  # D
-                    call_data.get('next_call_date', ''),  # E
-                    f"[{manager_name}] [{current_date}] {call_data.get('comment', '')}",  # F
-                    call_data.get('revenue_previous', ''),  # G (позапрошлый год)
-                    call_data.get('revenue', ''),  # H (прошлый год)
-                    call_data.get('net_profit', ''),  # I
-                    call_data.get('capital', ''),  # J
-                    call_data.get('assets', ''),  # K
-                    call_data.get('debit', ''),  # L
-                    call_data.get('credit', ''),  # M
-                    call_data.get('gov_contracts', ''),  # N
-                    call_data.get('okved_main', ''),  # O
-                    call_data.get('okpd_name', ''),  # P
-                    current_date,  # Q
-                    manager_name  # R
-                ]
-                self.service.spreadsheets().values().append(
+                row_data = self._supervisor_row(manager_name, call_data, current_date)
+                response = await self._execute(lambda: self.service.spreadsheets().values().append(
                     spreadsheetId=settings.supervisor_sheet_id,
                     range='A:R',
                     valueInputOption='USER_ENTERED',
                     body={'values': [row_data]}
-                ).execute()
+                ))
+                self._remember_appended_rows(settings.supervisor_sheet_id, [call_data.get('inn', '')], response)
             logger.info(f"Updated supervisor sheet for {call_data.get('company_name')}")
         except Exception as e:
             logger.error(f"Error updating supervisor sheet: {e}")
+
+    async def apply_supervisor_updates(self, items: List[Dict[str, Any]]) -> None:
+        """Записать пачку обновлений сводной таблицы (для очереди write-behind).
+
+        items: [{'manager_name', 'call_data', 'call_date'}] в порядке поступления.
+        Обновления одного ИНН применяются по порядку: дата следующего звонка берётся из последнего,
+        комментарии добавляются в начало истории один за другим. Итого на пачку:
+        batchGet существующих строк (по google_sheets_batch_get_ranges диапазонов), один values.batchUpdate
+        и один append новых строк.
+        Ошибки API пробрасываются — очередь повторит пачку позже. Повтор идемпотентен: комментарий,
+        уже стоящий в истории колонки F, не добавляется, а дописанные строки находятся по ИНН.
+        """
+        sheet_id = settings.supervisor_sheet_id
+        if not sheet_id:
+            logger.warning("Supervisor sheet ID not configured")
+            return
+        await self._ensure_supervisor_headers(sheet_id)
+        existing = await self._locate_rows(
+            sheet_id, [item['call_data'].get('inn') for item in items], last_col='F'
+        )
+
+        # ИНН -> [дата следующего звонка, комментарии пачки по порядку] для строк, которые уже есть в листе
+        changed: Dict[str, List[Any]] = {}
+        new_rows: List[List[Any]] = []
+        new_row_inns: List[str] = []
+        new_by_inn: Dict[str, List[Any]] = {}
+        for item in items:
+            manager_name, call_data, call_date = item['manager_name'], item['call_data'], item['call_date']
+            inn = str(call_data.get('inn') or '').strip()
+            comment = self._supervisor_comment(manager_name, call_data, call_date)
+            if inn in existing:
+                state = changed.setdefault(inn, ['', []])
+                state[0] = call_data.get('next_call_date', '')
+                state[1].append(comment)
+            elif inn in new_by_inn:
+                row = new_by_inn[inn]
+                row[4] = call_data.get('next_call_date', '')
+                row[5] = f"{comment}{SUPERVISOR_SEPARATOR}{row[5]}"
+            else:
+                row = self._supervisor_row(manager_name, call_data, call_date)
+                new_rows.append(row)
+                new_row_inns.append(inn)
+                if inn:
+                    new_by_inn[inn] = row
+
+        if changed:
+            data = []
+            for inn, (next_call_date, comments) in changed.items():
+                row_num, values = existing[inn]
+                history = values[5] if len(values) > 5 else ''
+                data.append({'range': f'E{row_num}', 'values': [[next_call_date]]})
+                data.append({'range': f'F{row_num}', 'values': [[self._prepend_comments(history, comments)]]})
+            await self._execute(lambda: self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=sheet_id,
+                body={'valueInputOption': 'USER_ENTERED', 'data': data}
+            ))
+        if new_rows:
+            try:
+                response = await self._execute(lambda: self.service.spreadsheets().values().append(
+                    spreadsheetId=sheet_id,
+                    range='A:R',
+                    valueInputOption='USER_ENTERED',
+                    body={'values': new_rows}
+                ))
+            except Exception:
+                # Строки могли дописаться несмотря на ошибку: при повторе их найдёт перестроенный индекс,
+                # и они пойдут как существующие (без повторного append и дублей комментариев)
+                self.invalidate_row_index(sheet_id)
+                raise
+            self._remember_appended_rows(sheet_id, new_row_inns, response)
+        logger.info(f"Supervisor sheet: {len(items)} updates -> {len(changed)} rows updated, {len(new_rows)} appended")
+
+    @staticmethod
+    def _prepend_comments(history: str, comments: List[str]) -> str:
+        """Добавить комментарии пачки (от старых к новым) в начало истории колонки F.
+
+        Повтор пачки после частичного успеха (запись прошла, ответ API — ошибка) не дублирует историю:
+        если первые k комментариев пачки уже стоят в начале истории (новые сверху), они пропускаются.
+        """
+        head = history.split(SUPERVISOR_SEPARATOR) if history else []
+        applied = 0
+        for k in range(len(comments), 0, -1):
+            if head[:k] == comments[:k][::-1]:
+                applied = k
+                break
+        entries = comments[applied:][::-1] + ([history] if history else [])
+        return SUPERVISOR_SEPARATOR.join(entries)
+
+    def _remember_appended_rows(self, sheet_id: str, inns: List[str], response: Optional[Dict[str, Any]]) -> None:
+        """Учесть в индексе строки, дописанные append (номер первой строки — из ответа API)."""
+        index = self._row_indexes.get(sheet_id)
+        if index is None:
+            return
+        first_row = row_from_updated_range((response or {}).get('updates', {}).get('updatedRange', ''))
+        if first_row is None:
+            self.invalidate_row_index(sheet_id)
+            return
+        for offset, inn in enumerate(inns):
+            index.add(inn, first_row + offset)
             
     async def update_specific_columns(self, sheet_id: str, inn: str, updates: Dict[str, Any]) -> bool:
         """
@@ -614,20 +872,8 @@ class GoogleSheetsService:
         Это экономит токены - обновляем только нужные ячейки.
         """
         try:
-            # Получаем все данные
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=sheet_id,
-                range='A:Z'
-            ).execute()
-            
-            values = result.get('values', [])
-            
-            # Ищем строку с нужным ИНН
-            row_index = None
-            for i, row in enumerate(values):
-                if len(row) > 1 and row[1] == inn:
-                    row_index = i + 1
-                    break
+            # Ищем строку с нужным ИНН по индексу (без чтения всего листа)
+            row_index, _ = await self._locate_row(sheet_id, inn)
             
             if row_index is None:
                 logger.warning(f"Company with INN {inn} not found in sheet {sheet_id}")
@@ -642,10 +888,10 @@ class GoogleSheetsService:
                 })
             
             # Выполняем пакетное обновление
-            self.service.spreadsheets().values().batchUpdate(
+            await self._execute(lambda: self.service.spreadsheets().values().batchUpdate(
                 spreadsheetId=sheet_id,
                 body={'valueInputOption': 'RAW', 'data': update_requests}
-            ).execute()
+            ))
             
             logger.info(f"Updated columns {list(updates.keys())} for INN {inn} in sheet {sheet_id}")
             return True
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import weakref
+from datetime import datetime
+from typing import List, Optional, Tuple
+from loguru import logger
+from openai import AsyncOpenAI
+from sqlalchemy import select
+from config import settings
+from models import database
+from models.database import CommentSummary
+
+# Грубая оценка для русского текста: токенизаторы GPT дают ~2.5-4 символа на токен, берём с запасом
+CHARS_PER_TOKEN = 2.5
+
+# Одна пересборка сводки на компанию менеджера одновременно (прогрев и /ai_hint могут совпасть)
+_locks: "weakref.WeakValueDictionary[Tuple[int, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    limit = int(max_tokens * CHARS_PER_TOKEN)
+    return text if len(text) <= limit else text[: max(0, limit - 1)].rstrip() + "…"
+
+
+def _source_hash(comments: List[str]) -> str:
+    return hashlib.sha1("\x1e".join(comments).encode("utf-8")).hexdigest()
+
+
+def split_history(comments: List[str], recent: int, budget: int) -> int:
+    """Индекс, с которого комментарии идут в промпт дословно: не больше recent последних
+    и в пределах budget токенов. Последний комментарий берётся всегда."""
+    start, used = len(comments), 0
+    while start > 0 and len(comments) - start < recent:
+        cost = estimate_tokens(comments[start - 1])
+        if used + cost > budget and start < len(comments):
+            break
+        used += cost
+        start -= 1
+    return start
+
+
+def _extract(older: List[str], max_tokens: int) -> str:
+    """Сводка без модели: сколько было комментариев и самые свежие из них, сколько влезет."""
+    lines: List[str] = []
+    used = 0
+    for comment in reversed(older):
+        used += estimate_tokens(comment)
+        if used > max_tokens and lines:
+            break
+        lines.append(comment)
+    return f"Ранее комментариев: {len(older)}. Последние из них: " + " | ".join(reversed(lines))
+
+
+async def _summarize(client: AsyncOpenAI, previous: Optional[str], comments: List[str]) -> str:
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "Ты ведёшь краткую сводку истории B2B-звонков с компанией для менеджера по продажам. "
+                "Дополни сводку новыми комментариями: договорённости, интересы и возражения, ЛПР, "
+                "переносы и сроки, текущий статус. Только факты из комментариев, по-русски, без воды, "
+                "одним абзацем. Верни только обновлённую сводку."
+            ),
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Текущая сводка:\n{previous or 'пока нет'}\n\n"
+                f"Новые комментарии (от старых к новым):\n" + "\n".join(comments)
+            ),
+        },
+    ]
+    completion = await client.chat.completions.create(
+        model=settings.openai_model,
+        messages=messages,
+        temperature=0.2,
+        max_tokens=settings.ai_summary_max_tokens,
+    )
+    return completion.choices[0].message.content.strip()
+
+
+async def _load_summary(manager_id: int, inn: str) -> Optional[CommentSummary]:
+    async with database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(CommentSummary).where(CommentSummary.manager_id == manager_id, CommentSummary.company_inn == inn)
+        )
+        return result.scalar_one_or_none()
+
+
+async def _save_summary(manager_id: int, inn: str, summary: str, older: List[str]) -> None:
+    async with database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(CommentSummary).where(CommentSummary.manager_id == manager_id, CommentSummary.company_inn == inn)
+        )
+        row = result.scalar_one_or_none()
+        if row is None:
+            row = CommentSummary(manager_id=manager_id, company_inn=inn)
+            session.add(row)
+        row.summary = summary
+        row.summarized_count = len(older)
+        row.source_hash = _source_hash(older)
+        row.model = settings.openai_model
+        row.updated_at = datetime.utcnow()
+        await session.commit()
+
+
+async def summarize_older(
+    client: Optional[AsyncOpenAI], manager_id: int, inn: str, older: List[str]
+) -> Optional[str]:
+    """Сводка комментариев older (от старых к новым) из comment_summaries.
+
+    Сохранённая сводка дополняется только новыми комментариями — пачками по ai_summary_batch,
+    так что длинная история сворачивается один раз, а дальше стоит один короткий запрос на новые
+    звонки. Если старые комментарии изменились, сводка собирается заново.
+    """
+    if not older:
+        return None
+    key = (manager_id, inn)
+    lock = _locks.get(key)
+    if lock is None:
+        lock = _locks[key] = asyncio.Lock()
+    async with lock:
+        summary, done = None, 0
+        try:
+            row = await _load_summary(manager_id, inn)
+        except Exception as e:
+            logger.warning(f"Comment summary read failed for {inn}: {e}")
+            row = None
+        if row is not None and row.summarized_count <= len(older) \
+                and row.source_hash == _source_hash(older[:row.summarized_count]):
+            summary, done = row.summary, row.summarized_count
+        if done == len(older):
+            return summary
+        if client is None:
+            return summary or _extract(older, settings.ai_summary_max_tokens)
+
+        folded = done
+        try:
+            while folded < len(older):
+                chunk = older[folded:folded + max(1, settings.ai_summary_batch)]
+                summary = await _summarize(client, summary, chunk)
+                folded += len(chunk)
+        except Exception as e:
+            logger.warning(f"Comment summary update failed for {inn} ({folded}/{len(older)} folded): {e}")
+        if folded > done:
+            try:
+                await _save_summary(manager_id, inn, summary, older[:folded])
+            except Exception as e:
+                logger.warning(f"Comment summary write failed for {inn}: {e}")
+        if folded < len(older):
+            # Не всё свернулось: недостающее — выдержкой, чтобы не потерять последние события
+            tail = _extract(older[folded:], settings.ai_summary_max_tokens // 2)
+            return f"{summary}\n{tail}" if summary else tail
+        return summary
+
+
+async def build_comment_context(
+    client: Optional[AsyncOpenAI], manager_id: int, inn: str, comments: List[str]
+) -> Tuple[List[str], Optional[str]]:
+    """История комментариев для промпта в пределах ai_prompt_history_budget_tokens.
+
+    Последние ai_prompt_recent_comments комментариев (сколько влезет в бюджет) идут дословно,
+    более старые — сводкой из summarize_older. Размер промпта не растёт вместе с историей.
+    """
+    budget = settings.ai_prompt_history_budget_tokens
+    summary_budget = min(settings.ai_summary_max_tokens, budget // 2)
+    start = split_history(comments, settings.ai_prompt_recent_comments, budget)
+    if start > 0:
+        # Есть что сворачивать — оставляем место под сводку
+        start = split_history(comments, settings.ai_prompt_recent_comments, budget - summary_budget)
+    recent_budget = budget - summary_budget if start > 0 else budget
+    # Обрезка касается только одиночного комментария длиннее всего бюджета
+    recent = [clip_to_tokens(comment, recent_budget) for comment in comments[start:]]
+    summary = await summarize_older(client, manager_id, inn, comments[:start])
+    return recent, clip_to_tokens(summary, summary_budget) if summary else None
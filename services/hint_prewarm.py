@@ -0,0 +1,85 @@
+import time
+import asyncio
+from datetime import date
+from typing import Dict, Optional, Tuple
+from loguru import logger
+from config import settings
+from models import database
+from models.agenda import list_agenda_for_day, today_local
+from services import ai_advisor
+
+# Сколько подсказок подготовлено менеджеру: manager_id -> (день, число компаний); читает утренняя рассылка
+prepared: Dict[int, Tuple[date, int]] = {}
+
+_prewarm_lock = asyncio.Lock()
+
+
+def prepared_today(manager_id: int) -> int:
+    day, count = prepared.get(manager_id, (None, 0))
+    return count if day == today_local() else 0
+
+
+async def _prewarm_one(semaphore: asyncio.Semaphore, manager_id: int, inn: str) -> str:
+    async with semaphore:
+        try:
+            async with database.AsyncSessionLocal() as session:
+                inputs = await ai_advisor.collect_hint_inputs(session, manager_id, inn)
+            if inputs is None:
+                return "no_history"
+            # Ошибка API не кэшируется: подсказку сгенерирует /ai_hint или следующий прогрев
+            await ai_advisor.generate_ai_notification(raise_on_error=True, **inputs)
+            return "ready"
+        except Exception as e:
+            logger.warning(f"Hint prewarm failed for manager {manager_id}, INN {inn}: {e}")
+            return "failed"
+
+
+async def prewarm_today_hints() -> Optional[dict]:
+    """Заранее подготовить AI-инфоповоды по всем звонкам на сегодня.
+
+    Входные данные собираются так же, как в /ai_hint, поэтому результат ложится в тот же кэш
+    (память + ai_hints) по хэшу промпта: команда отвечает сразу, а если история комментариев
+    не менялась, кэш попадает и здесь — модель повторно не вызывается.
+    К модели одновременно не больше ai_hint_prewarm_concurrency запросов.
+    """
+    if ai_advisor._get_openai_client() is None:
+        logger.info("Hint prewarm skipped: OpenAI is not configured")
+        return None
+    if _prewarm_lock.locked():
+        logger.warning("Hint prewarm is still running, skipping this run")
+        return None
+    async with _prewarm_lock:
+        started = time.perf_counter()
+        day = today_local()
+        async with database.AsyncSessionLocal() as session:
+            rows = await list_agenda_for_day(session, day)
+
+        generated_before = ai_advisor.hint_stats["generated"]
+        semaphore = asyncio.Semaphore(max(1, settings.ai_hint_prewarm_concurrency))
+        results = await asyncio.gather(*[
+            _prewarm_one(semaphore, manager_id, inn) for manager_id, inn in rows
+        ])
+
+        ready: Dict[int, int] = {}
+        for (manager_id, _), outcome in zip(rows, results):
+            if outcome == "ready":
+                ready[manager_id] = ready.get(manager_id, 0) + 1
+        prepared.clear()
+        prepared.update({manager_id: (day, count) for manager_id, count in ready.items()})
+
+        stats = {
+            "companies": len(rows),
+            "ready": sum(ready.values()),
+            # Параллельные /ai_hint тоже попадут в счётчик — для лога это допустимо
+            "generated": ai_advisor.hint_stats["generated"] - generated_before,
+            "no_history": results.count("no_history"),
+            "failed": results.count("failed"),
+            "total_ms": round((time.perf_counter() - started) * 1000),
+        }
+        stats["cached"] = max(0, stats["ready"] - stats["generated"])
+        logger.info(
+            f"Hint prewarm: {stats['ready']}/{stats['companies']} ready "
+            f"({stats['generated']} generated, {stats['cached']} from cache), "
+            f"no history {stats['no_history']}, failed {stats['failed']} in {stats['total_ms']}ms"
+        )
+        return stats
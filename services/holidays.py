@@ -0,0 +1,119 @@
+import csv
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+
+class Holiday:
+    def __init__(self, month: int, day: int, title: str, okved: Optional[List[str]] = None):
+        self.month = month
+        self.day = day
+        self.title = title
+        # Префиксы ОКВЭД отрасли ("43", "49.1"); пусто — праздник для всех
+        self.okved = okved or []
+
+    def date_for_year(self, year: int) -> Optional[date]:
+        try:
+            return date(year, self.month, self.day)
+        except ValueError:
+            return None  # 29.02 в невисокосный год
+
+
+HOLIDAYS: List[Holiday] = [
+    # Гос праздники
+    Holiday(1, 1, "Новый год"),
+    Holiday(2, 23, "День защитника Отечества"),
+    Holiday(3, 8, "Международный женский день"),
+    Holiday(5, 1, "Праздник Весны и Труда"),
+    Holiday(5, 9, "День Победы"),
+    Holiday(6, 12, "День России"),
+    Holiday(11, 4, "День народного единства"),
+    # Отраслевые (минимальный набор примеров; полный список — industry_holidays_file)
+    Holiday(8, 12, "День строителя", okved=["41", "42", "43"]),
+    Holiday(8, 2, "День железнодорожника", okved=["49.1", "49.2", "52.21.1"]),
+]
+
+Slots = Dict[int, List[Tuple[date, str]]]
+
+
+def okved_prefixes(okved_code: Optional[str]) -> List[str]:
+    """Все префиксы кода: "69.10" -> ["69", "69.1", "69.10"] (группа 69.10 входит в подкласс 69.1)."""
+    code = (okved_code or "").strip()
+    return [code[:i] for i in range(2, len(code) + 1) if code[i - 1] != "."]
+
+
+class HolidayCalendar:
+    """Праздники, разложенные по дням (ключ — date.toordinal()) на три года вокруг текущего.
+
+    Запрос "праздники ±N дней" — N*2+1 обращений к словарю на общий календарь и на каждый уровень
+    ОКВЭД компании, независимо от числа праздников в справочнике. Окно переходит через границу года.
+    """
+
+    def __init__(self, holidays: Iterable[Holiday] = ()):
+        self.holidays: List[Holiday] = list(holidays)
+        self.years: Tuple[int, int] = (0, -1)
+        self._slots: Dict[str, Slots] = {}  # "" — общие праздники, иначе префикс ОКВЭД
+
+    def add(self, holidays: Iterable[Holiday]) -> None:
+        self.holidays.extend(holidays)
+        self.years = (0, -1)  # пересобрать при следующем запросе
+
+    def load_csv(self, path: str) -> int:
+        """Загрузить отраслевые праздники: CSV с колонками month, day, title, okved (префиксы через ';')."""
+        with open(path, encoding="utf-8", newline="") as f:
+            loaded = [
+                Holiday(
+                    int(row["month"]), int(row["day"]), row["title"].strip(),
+                    okved=[code.strip() for code in (row.get("okved") or "").split(";") if code.strip()],
+                )
+                for row in csv.DictReader(f)
+                if row.get("month") and row.get("day") and row.get("title")
+            ]
+        self.add(loaded)
+        return len(loaded)
+
+    def _build(self, year: int) -> None:
+        slots: Dict[str, Slots] = {}
+        for holiday in self.holidays:
+            for y in (year - 1, year, year + 1):
+                day = holiday.date_for_year(y)
+                if day is None:
+                    continue
+                for key in holiday.okved or [""]:
+                    slots.setdefault(key, {}).setdefault(day.toordinal(), []).append((day, holiday.title))
+        self._slots = slots
+        self.years = (year - 1, year + 1)
+
+    def near(self, target: date, window_days: int = 7, okved_code: Optional[str] = None) -> List[Tuple[date, str]]:
+        first, last = target - timedelta(days=window_days), target + timedelta(days=window_days)
+        if first.year < self.years[0] or last.year > self.years[1]:
+            self._build(target.year)
+        tables = [self._slots[key] for key in ["", *okved_prefixes(okved_code)] if key in self._slots]
+        found: List[Tuple[date, str]] = []
+        for ordinal in range(first.toordinal(), last.toordinal() + 1):
+            for table in tables:
+                found.extend(table.get(ordinal, ()))
+        return found
+
+
+holiday_calendar = HolidayCalendar(HOLIDAYS)
+
+
+def load_industry_holidays(path: Optional[str]) -> None:
+    """Один раз при запуске: дополнить календарь отраслевыми праздниками из файла."""
+    if not path:
+        return
+    if not Path(path).exists():
+        logger.warning(f"Industry holidays file not found: {path}")
+        return
+    try:
+        count = holiday_calendar.load_csv(path)
+        logger.info(f"Industry holidays loaded: {count} from {path}")
+    except Exception as e:
+        logger.error(f"Industry holidays not loaded from {path}: {e}")
+
+
+def get_near_holidays(target: date, window_days: int = 7, okved_code: Optional[str] = None) -> List[str]:
+    """Вернуть список праздников в окне +/- window_days от заданной даты (общие и по ОКВЭД компании)."""
+    return [f"{title} ({day.strftime('%d.%m')})" for day, title in holiday_calendar.near(target, window_days, okved_code)]
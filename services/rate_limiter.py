@@ -0,0 +1,33 @@
+import time
+import asyncio
+
+
+class TokenBucket:
+    """Асинхронный token bucket: в среднем rate операций в секунду, пики до capacity подряд.
+
+    rate <= 0 отключает ограничение.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Дождаться и забрать токены. Ожидающие обслуживаются по очереди (FIFO через lock)."""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
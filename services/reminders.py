@@ -0,0 +1,97 @@
+import time
+import asyncio
+from typing import Optional, Tuple
+from loguru import logger
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from config import settings
+from models import database
+from models.agenda import count_agenda_by_manager
+from services.rate_limiter import TokenBucket
+from services.hint_prewarm import prepared_today
+
+# Общий лимит исходящих сообщений бота (Telegram: ~30 сообщений в секунду на бота)
+telegram_limiter = TokenBucket(settings.telegram_rate_limit_rps, settings.telegram_rate_limit_burst)
+
+# Не даёт рассылке наложиться на саму себя, даже если её запустили в обход планировщика
+_reminders_lock = asyncio.Lock()
+# Сколько самых медленных менеджеров попадает в итоговую строку лога рассылки
+REMINDER_SLOWEST_LOGGED = 5
+
+
+async def send_limited(bot: Bot, chat_id: int, text: str, **kwargs):
+    """Отправить сообщение через общий token bucket; при 429 (RetryAfter) подождать и повторить один раз."""
+    await telegram_limiter.acquire()
+    try:
+        return await bot.send_message(chat_id, text, **kwargs)
+    except TelegramRetryAfter as e:
+        logger.warning(f"Telegram flood control for chat {chat_id}: retry after {e.retry_after}s")
+        await asyncio.sleep(e.retry_after)
+        await telegram_limiter.acquire()
+        return await bot.send_message(chat_id, text, **kwargs)
+
+
+async def _remind_manager(
+    bot: Bot, semaphore: asyncio.Semaphore, manager_id: int, chat_id: int, calls: int
+) -> Tuple[int, bool, float]:
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            text = f"📅 Напоминание: на сегодня запланировано звонков: {calls}"
+            hints = prepared_today(manager_id)
+            if hints:
+                text += f"\n🧠 AI-инфоповоды уже готовы для {hints} из них — /ai_hint"
+            await send_limited(bot, chat_id, text)
+            ok = True
+        except Exception as e:
+            logger.debug(f"Reminder for manager {manager_id} not sent: {e}")
+            ok = False
+        return manager_id, ok, time.perf_counter() - started
+
+
+async def send_daily_reminders(bot: Bot) -> Optional[dict]:
+    """Разослать менеджерам число звонков на сегодня.
+
+    Счётчики берутся одним запросом к плану звонков, сообщения уходят параллельно
+    (не больше reminder_concurrency одновременно) в пределах лимита Telegram.
+    Если предыдущая рассылка ещё идёт, новая пропускается.
+    """
+    if _reminders_lock.locked():
+        logger.warning("Reminder job is still running, skipping this run")
+        return None
+    async with _reminders_lock:
+        started = time.perf_counter()
+        async with database.AsyncSessionLocal() as session:
+            rows = await count_agenda_by_manager(session)
+        query_time = time.perf_counter() - started
+
+        semaphore = asyncio.Semaphore(max(1, settings.reminder_concurrency))
+        results = await asyncio.gather(*[
+            _remind_manager(bot, semaphore, manager_id, chat_id, calls)
+            for manager_id, chat_id, sheet_id, calls in rows
+            if chat_id and sheet_id
+        ])
+
+        for manager_id, ok, elapsed in results:
+            logger.debug(f"Reminder: manager {manager_id} {'sent' if ok else 'failed'} in {elapsed * 1000:.0f}ms")
+        stats = {
+            "managers": len(results),
+            "sent": sum(1 for _, ok, _ in results if ok),
+            "query_ms": round(query_time * 1000),
+            "total_ms": round((time.perf_counter() - started) * 1000),
+            "slowest_ms": round(max((elapsed for _, _, elapsed in results), default=0) * 1000),
+        }
+        # Одна строка на рассылку на уровне info: итог и самые медленные менеджеры
+        slowest = sorted(results, key=lambda r: r[2], reverse=True)[:REMINDER_SLOWEST_LOGGED]
+        stats["slowest"] = [
+            {"manager_id": manager_id, "ok": ok, "ms": round(elapsed * 1000)}
+            for manager_id, ok, elapsed in slowest
+        ]
+        slowest_text = ", ".join(
+            f"#{item['manager_id']} {item['ms']}ms{'' if item['ok'] else ' (failed)'}" for item in stats["slowest"]
+        ) or "—"
+        logger.info(
+            f"Reminders: sent {stats['sent']}/{stats['managers']} in {stats['total_ms']}ms "
+            f"(query {stats['query_ms']}ms); slowest: {slowest_text}"
+        )
+        return stats
@@ -0,0 +1,48 @@
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+
+_A1_ROW_RE = re.compile(r"![A-Z]+(\d+)")
+
+
+def row_from_updated_range(updated_range: str) -> Optional[int]:
+    """Номер первой строки из A1-диапазона ответа append ('Лист1!A15:Q15' -> 15)."""
+    match = _A1_ROW_RE.search(updated_range or "")
+    return int(match.group(1)) if match else None
+
+
+class SheetRowIndex:
+    """Индекс листа: ИНН (колонка B) -> номер строки и номер первой свободной строки.
+
+    Строится по одной колонке B, дальше обновляется нашими же записями.
+    Перед записью строка всё равно сверяется точечным чтением, поэтому ручные правки
+    листа (удаление/сортировка строк) обнаруживаются и приводят к перестроению.
+    """
+
+    def __init__(self, column_b: List[List[Any]]):
+        self.rows: Dict[str, int] = {}
+        # column_b - ответ values().get(range='B:B'), первая строка - заголовок
+        for i, cell in enumerate(column_b[1:], start=2):
+            inn = str(cell[0]).strip() if cell else ""
+            if inn:
+                # Как и при линейном поиске, побеждает первое вхождение ИНН
+                self.rows.setdefault(inn, i)
+        self.next_row = max(len(column_b) + 1, 2)
+        self.built_at = time.monotonic()
+
+    def get(self, inn: str) -> Optional[int]:
+        return self.rows.get(str(inn).strip())
+
+    def add(self, inn: str, row: int) -> None:
+        """Учесть строку, которую мы только что дописали."""
+        inn = str(inn).strip()
+        if inn:
+            self.rows.setdefault(inn, row)
+        self.next_row = max(self.next_row, row + 1)
+
+    def is_stale(self, ttl: float) -> bool:
+        return time.monotonic() - self.built_at > ttl
+
+    def __len__(self) -> int:
+        return len(self.rows)
@@ -0,0 +1,97 @@
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Optional
+from loguru import logger
+from sqlalchemy import select
+from config import settings
+from models import database
+from models.database import Manager, SheetSyncState
+from models.agenda import replace_from_sheet
+from models.sheet_mirror import apply_snapshot, values_to_call
+from services.google_sheets import get_google_sheets_service
+
+
+# Инкрементальная синхронизация листов менеджеров в БД.
+#
+# Менеджеры правят листы руками, поэтому по расписанию каждый лист сверяется с зеркалом sheet_rows
+# по хэшам строк: записываются только изменившиеся строки, а по ним обновляется план звонков
+# (call_agenda). Перед чтением листа сверяется modifiedTime таблицы из Drive: если он совпадает
+# с водяным знаком sheet_sync_state, лист не читается вовсе.
+
+
+async def sync_manager_sheet(manager_id: int, sheet_id: str, force: bool = False) -> Dict[str, Any]:
+    """Синхронизировать лист менеджера с зеркалом и планом звонков. Возвращает статистику."""
+    started = time.perf_counter()
+    google_sheets = get_google_sheets_service()
+    async with database.AsyncSessionLocal() as session:
+        state = await session.get(SheetSyncState, sheet_id)
+        if state is None:
+            state = SheetSyncState(sheet_id=sheet_id, manager_id=manager_id)
+            session.add(state)
+
+        # modifiedTime берётся до чтения: правка во время чтения даст новый modifiedTime и перечитку
+        modified_time = await google_sheets.sheet_modified_time(sheet_id)
+        if not force and modified_time and modified_time == state.modified_time:
+            state.last_synced_at = datetime.utcnow()
+            await session.commit()
+            return {"skipped": True}
+
+        # Метка до чтения листа: записи плана, которые бот обновит во время чтения, синхронизация не перетрёт
+        synced_before = datetime.utcnow()
+        try:
+            rows = await google_sheets.read_sheet_rows(sheet_id)
+        except Exception as e:
+            state.last_error = str(e)[:1000]
+            await session.commit()
+            raise
+
+        stats: Dict[str, Any] = await apply_snapshot(session, sheet_id, rows, synced_before)
+        changed = stats["inserted"] + stats["updated"] + stats["deleted"]
+        stats["agenda"] = 0
+        if changed or state.last_synced_at is None:
+            calls: Dict[str, Dict[str, Any]] = {}
+            for _, values in rows:
+                call = values_to_call(values)
+                calls.setdefault(call['inn'], call)  # повтор ИНН в листе — как в зеркале, первая строка
+            stats["agenda"] = await replace_from_sheet(session, manager_id, list(calls.values()), synced_before)
+            state.last_changed_at = synced_before
+        state.manager_id = manager_id
+        state.modified_time = modified_time
+        state.last_synced_at = synced_before
+        state.row_count = len(rows)
+        state.last_error = None
+        await session.commit()
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(f"Sheet sync: manager {manager_id}, {len(rows)} rows: {stats}")
+    return stats
+
+
+async def _sync_one(semaphore: asyncio.Semaphore, manager_id: int, sheet_id: str) -> Optional[Dict[str, Any]]:
+    async with semaphore:
+        try:
+            return await sync_manager_sheet(manager_id, sheet_id)
+        except Exception as e:
+            logger.error(f"Sheet sync failed for manager {manager_id}: {e}")
+            return None
+
+
+async def sync_all_sheets() -> None:
+    """Синхронизировать листы всех менеджеров (ошибка одного листа не останавливает остальных)."""
+    started = time.perf_counter()
+    async with database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Manager.id, Manager.google_sheet_id).where(Manager.google_sheet_id.isnot(None))
+        )
+        managers = result.all()
+    semaphore = asyncio.Semaphore(max(1, settings.sheet_sync_concurrency))
+    results = await asyncio.gather(*[
+        _sync_one(semaphore, manager_id, sheet_id) for manager_id, sheet_id in managers
+    ])
+    skipped = sum(1 for stats in results if stats and stats.get("skipped"))
+    failed = sum(1 for stats in results if stats is None)
+    logger.info(
+        f"Sheet sync: {len(managers)} sheets, {skipped} unchanged, {failed} failed "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
@@ -0,0 +1,196 @@
+import json
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from sqlalchemy import select, delete, update, func
+from config import settings
+from models import database
+from models.database import SupervisorUpdate
+from services.google_sheets import get_google_sheets_service
+
+
+class SupervisorWriteQueue:
+    """Очередь write-behind для сводной таблицы руководителя.
+
+    Хендлеры только кладут обновление в таблицу supervisor_updates (это и есть бэклог —
+    он переживает рестарты). Фоновая задача выгружает накопленное раз в supervisor_flush_interval
+    секунд или сразу, как только набралось supervisor_flush_max_items записей, одной пачкой
+    (GoogleSheetsService.apply_supervisor_updates). Записи применяются строго по id,
+    поэтому порядок обновлений одного ИНН сохраняется; при ошибке пачка остаётся в БД
+    и повторяется с растущей паузой. Пачка, не прошедшая supervisor_max_attempts раз, применяется
+    по одной записи: не проходящие записи помечаются failed_at (dead letter) и больше не блокируют
+    очередь — их можно вернуть, обнулив failed_at и attempts.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._pending = 0  # примерное число записей в бэклоге (для досрочной выгрузки)
+        self._enqueue_only = False  # процесс только пишет бэклог, выгружает другой (воркеры webhook)
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.dead_letters = 0
+
+    @property
+    def running(self) -> bool:
+        return self._enqueue_only or (self._task is not None and not self._task.done())
+
+    async def start(self, consumer: bool = True) -> None:
+        """Запустить фоновую выгрузку. Бэклог, оставшийся с прошлого запуска, уйдёт первым же циклом.
+
+        consumer=False — только складывать обновления в бэклог (выгружает основной процесс).
+        """
+        if not settings.supervisor_write_behind or self.running or database.AsyncSessionLocal is None:
+            return
+        if not consumer:
+            self._enqueue_only = True
+            return
+        async with database.AsyncSessionLocal() as session:
+            self._pending = (await session.execute(
+                select(func.count(SupervisorUpdate.id)).where(SupervisorUpdate.failed_at.is_(None))
+            )).scalar() or 0
+            dead = (await session.execute(
+                select(func.count(SupervisorUpdate.id)).where(SupervisorUpdate.failed_at.is_not(None))
+            )).scalar() or 0
+        if dead:
+            logger.warning(f"Supervisor queue: {dead} updates in dead letter (supervisor_updates.failed_at is set)")
+        if self._pending:
+            logger.info(f"Supervisor queue: {self._pending} pending updates from previous run")
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Остановить фоновую задачу и попытаться выгрузить остаток."""
+        if self._enqueue_only:
+            self._enqueue_only = False
+            return
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"Supervisor queue: final flush failed, backlog kept in DB: {e}")
+
+    async def enqueue(self, manager_name: str, call_data: Dict[str, Any], call_date: Optional[str] = None) -> None:
+        """Поставить обновление сводной таблицы в очередь.
+        Если очередь не запущена (скрипты, отключено в настройках, нет БД) — пишем сразу.
+        call_date — дата из уже сделанной попытки записи: с ней повтор узнает свой комментарий в истории.
+        """
+        gs = get_google_sheets_service()
+        if not self.running:
+            await gs.update_supervisor_sheet(manager_name, call_data)
+            return
+        try:
+            async with database.AsyncSessionLocal() as session:
+                session.add(SupervisorUpdate(
+                    manager_name=manager_name,
+                    inn=str(call_data.get('inn') or '').strip(),
+                    call_date=call_date or gs.now_str(),
+                    payload=json.dumps(call_data, ensure_ascii=False, default=str),
+                ))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Supervisor queue: enqueue failed, writing directly: {e}")
+            await gs.update_supervisor_sheet(manager_name, call_data)
+            return
+        self._pending += 1
+        if self._pending >= settings.supervisor_flush_max_items:
+            self._wakeup.set()
+
+    async def _loop(self) -> None:
+        delay = settings.supervisor_flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                delay = settings.supervisor_flush_interval
+            except Exception as e:
+                self.failed_flushes += 1
+                # Пауза растёт (до supervisor_retry_max_delay), чтобы сбой API не сжигал попытки пачки
+                delay = min(delay * 2, settings.supervisor_retry_max_delay)
+                logger.warning(f"Supervisor queue: flush failed, will retry in {delay:.0f}s: {e}")
+
+    async def flush(self) -> int:
+        """Выгрузить весь бэклог пачками по supervisor_flush_max_items. Возвращает число записей."""
+        if database.AsyncSessionLocal is None:
+            return 0
+        total = 0
+        async with self._flush_lock:
+            while True:
+                async with database.AsyncSessionLocal() as session:
+                    result = await session.execute(
+                        select(SupervisorUpdate)
+                        .where(SupervisorUpdate.failed_at.is_(None))
+                        .order_by(SupervisorUpdate.id)
+                        .limit(max(1, settings.supervisor_flush_max_items))
+                    )
+                    rows: List[SupervisorUpdate] = list(result.scalars().all())
+                if not rows:
+                    self._pending = 0
+                    return total
+                ids = [row.id for row in rows]
+                items = [
+                    {'manager_name': row.manager_name, 'call_data': json.loads(row.payload), 'call_date': row.call_date}
+                    for row in rows
+                ]
+                try:
+                    await get_google_sheets_service().apply_supervisor_updates(items)
+                except Exception as e:
+                    async with database.AsyncSessionLocal() as session:
+                        await session.execute(
+                            update(SupervisorUpdate)
+                            .where(SupervisorUpdate.id.in_(ids))
+                            .values(attempts=SupervisorUpdate.attempts + 1)
+                        )
+                        await session.commit()
+                    if max(row.attempts for row in rows) + 1 < settings.supervisor_max_attempts:
+                        raise
+                    # Пачка раз за разом не проходит — ищем виноватые записи, остальные выгружаем
+                    logger.error(f"Supervisor queue: batch of {len(rows)} failed {settings.supervisor_max_attempts} times, applying one by one: {e}")
+                    done = await self._apply_one_by_one(rows, items)
+                else:
+                    await self._delete(ids)
+                    done = len(rows)
+                total += done
+                self.flushed += done
+                self._pending = max(0, self._pending - len(rows))
+
+    async def _delete(self, ids: List[int]) -> None:
+        async with database.AsyncSessionLocal() as session:
+            await session.execute(delete(SupervisorUpdate).where(SupervisorUpdate.id.in_(ids)))
+            await session.commit()
+
+    async def _apply_one_by_one(self, rows: List[SupervisorUpdate], items: List[Dict[str, Any]]) -> int:
+        """Применить записи по одной; не прошедшие — в dead letter (failed_at). Возвращает число выгруженных."""
+        done = 0
+        for row, item in zip(rows, items):
+            try:
+                await get_google_sheets_service().apply_supervisor_updates([item])
+            except Exception as e:
+                logger.error(
+                    f"Supervisor queue: update #{row.id} (INN {row.inn}, {row.manager_name}) moved to dead letter: {e}"
+                )
+                async with database.AsyncSessionLocal() as session:
+                    await session.execute(
+                        update(SupervisorUpdate).where(SupervisorUpdate.id == row.id).values(failed_at=datetime.utcnow())
+                    )
+                    await session.commit()
+                self.dead_letters += 1
+                continue
+            await self._delete([row.id])
+            done += 1
+        return done
+
+
+supervisor_queue = SupervisorWriteQueue()
@@ -93,6 +93,7 @@ async def test_all_endpoints():
     logger.info("\n" + "=" * 80)
     logger.info("TESTING COMPLETED")
     logger.info("=" * 80)
+    await datanewton_api.close()
 
 
 if __name__ == "__main__":